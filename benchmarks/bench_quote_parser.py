@@ -0,0 +1,66 @@
+"""
+Micro-benchmarks the parsing of a GetQuote.jsp page: the single pass parser (utils.parse_quote_payload)
+against the previous regex, js_adaptor, ast.literal_eval and clean_server_response path.
+
+Usage: python benchmarks/bench_quote_parser.py [iterations]
+"""
+import os
+import re
+import sys
+import ast
+import json
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from nsetools import Nse
+from nsetools.utils import parse_quote_payload
+
+
+def quote_page(fields=70):
+    """
+    :returns: a synthetic GetQuote.jsp page with about as many fields as the real one
+    """
+    quote = {'symbol': 'INFY', 'companyName': 'Infosys Limited', 'isExDateFlag': False, 'series': 'EQ'}
+    for i in range(fields - len(quote)):
+        quote['field%d' % i] = '-' if i % 7 == 0 else '{:,.2f}'.format(1234.5 * (i + 1))
+    payload = json.dumps({'futLink': '/live_market/futures.jsp', 'otherSeries': ['EQ'], 'data': [quote],
+                          'optLink': '/live_market/options.jsp', 'lastUpdateTime': '17-OCT-2026 15:30:00'})
+    filler = '<div class="content">%s</div>\n' % ('x' * 200)
+    return '<html><body>%s{<div id="responseDiv" style="display:none">\n%s\n</div>%s</body></html>' % (
+        filler * 50, payload, filler * 300)
+
+
+def js_adaptor(buffer):
+    # The substitutions utils.js_adaptor made before it was deprecated
+    buffer = re.sub('true', 'True', buffer)
+    buffer = re.sub('false', 'False', buffer)
+    buffer = re.sub('none', 'None', buffer)
+    buffer = re.sub('NaN', '"NaN"', buffer)
+    return buffer
+
+
+def previous(page, nse):
+    match = re.search(r'\{<div\s+id="responseDiv"\s+style="display:none">\s+(\{.*?\{.*?\}.*?\})', page, re.S)
+    return nse.clean_server_response(ast.literal_eval(js_adaptor(match.group(1)))['data'][0])
+
+
+def single_pass(page):
+    return parse_quote_payload(page)['data'][0]
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    page = quote_page()
+    nse = Nse()
+    assert previous(page, nse) == single_pass(page)
+    results = {'page_bytes': len(page), 'iterations': iterations}
+    for name, statement in [('previous', lambda: previous(page, nse)), ('single_pass', lambda: single_pass(page))]:
+        seconds = min(timeit.repeat(statement, number=iterations, repeat=5))
+        results[name] = {'microseconds_per_quote': seconds / iterations * 1e6}
+    results['speedup'] = results['previous']['microseconds_per_quote'] / results['single_pass']['microseconds_per_quote']
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+"""
+Benchmarks the construction of the equity master (EQUITY_L.csv) by Nse.get_stock_codes
+against the previous cell by cell construction.
+
+Usage: python benchmarks/bench_stock_codes.py [number of symbols]
+"""
+import io
+import os
+import sys
+import json
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd
+
+from nsetools import Nse
+
+
+def equity_list(count):
+    """
+    :returns: bytes of a synthetic EQUITY_L.csv with count symbols
+    """
+    lines = ['SYMBOL,NAME OF COMPANY, SERIES, DATE OF LISTING, PAID UP VALUE, MARKET LOT, ISIN NUMBER, FACE VALUE']
+    for i in range(count):
+        lines.append('SYM%d,Company %d Limited,%s,%02d-JAN-2008,10,1,INE%09dA,10' % (i, i, 'EQ' if i % 5 else 'BE', i % 28 + 1, i))
+    return ('\n'.join(lines) + '\n').encode('latin-1')
+
+
+class InMemoryTransport():
+    """
+    Serves the same payload for every url
+    """
+    def __init__(self, payload):
+        self.payload = payload
+
+    def fetch(self, url, headers=None):
+        return self.payload
+
+    def open(self, url, headers=None):
+        return io.BufferedReader(io.BytesIO(self.payload))
+
+
+def cell_by_cell(payload):
+    """
+    The previous implementation, with DataFrame.set_value replaced by DataFrame.at
+    """
+    res_dataframe = pd.DataFrame()
+    column_dict = dict(enumerate(['Symbol', 'Name', 'Series', 'Date of Listing', 'Paid up Value', 'Market Lot', 'ISIN Number', 'Face Value']))
+    for i, line in enumerate(payload.decode('latin-1').split('\n')):
+        if i != 0 and line != '':
+            for index, item in enumerate(line.split(',')):
+                res_dataframe.at[i, column_dict[index]] = item
+    return res_dataframe
+
+
+def measure(function, repeat):
+    """
+    :returns: dict with the best wall clock time, peak traced memory and size of the resulting frame
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    tracemalloc.start()
+    result = function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'seconds': min(timings),
+        'peak_bytes': peak,
+        'frame_bytes': int(result.memory_usage(deep=True).sum())
+    }
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    payload = equity_list(count)
+    nse = Nse(transport=InMemoryTransport(payload))
+    # Bypass the response cache so that every run parses the payload
+    vectorized = lambda: Nse.get_stock_codes.__wrapped__(nse)
+    results = {
+        'symbols': count,
+        'vectorized': measure(vectorized, 5),
+        'cell_by_cell': measure(lambda: cell_by_cell(payload), 1)
+    }
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
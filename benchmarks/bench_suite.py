@@ -0,0 +1,203 @@
+"""
+Benchmarks the public APIs end to end against a local stand-in for nseindia.com (see stand_in.py),
+along with the parsers and cleaners on their own. Every benchmark reports its latency percentiles,
+throughput and peak traced memory, and the results are emitted as JSON to track regressions.
+
+Usage: python benchmarks/bench_suite.py [--latency MS] [--repeat N] [--symbols N] [--workers N] [--processes N]
+       [--output FILE] [names...]
+"""
+import io
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import tracemalloc
+
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import pandas as pd
+
+from nsetools import Nse, ShardedNse
+from nsetools.net_utils import Transport
+from nsetools.throttle import Throttle
+from nsetools.indices import IndexSnapshot
+from nsetools.nse import set_trading_calendar
+from nsetools.trading_calendar import TradingCalendar
+from stand_in import NseStandIn, symbols, equity_list, quote_page, index_list, top_list, peer_companies, history_page
+
+
+def percentile(timings, fraction):
+    """
+    :returns: the value below which the fraction of the sorted timings fall, interpolated linearly
+    """
+    position = (len(timings) - 1) * fraction
+    lower = int(position)
+    upper = min(lower + 1, len(timings) - 1)
+    return timings[lower] + (timings[upper] - timings[lower]) * (position - lower)
+
+
+def measure(function, repeat, items=1, before=None):
+    """
+    Runs the function repeat times, and once more under tracemalloc for the peak memory
+    :Parameters:
+    function: callable taking no arguments
+    repeat: int
+        Number of timed runs
+    items: int
+        Number of items (symbols, records, pages) handled by every run, for the throughput
+    before: callable
+        (optional) Called before every run, outside of the timings. Used to reset the caches.
+    :returns: dict of the latency percentiles in milliseconds, throughput in items per second and peak bytes
+    """
+    timings = []
+    for _ in range(repeat):
+        if before is not None:
+            before()
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    if before is not None:
+        before()
+    tracemalloc.start()
+    function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    timings.sort()
+    return {
+        'runs': repeat,
+        'items': items,
+        'latency_ms': {
+            'min': timings[0] * 1000,
+            'p50': percentile(timings, 0.5) * 1000,
+            'p90': percentile(timings, 0.9) * 1000,
+            'p99': percentile(timings, 0.99) * 1000,
+            'max': timings[-1] * 1000,
+            'mean': sum(timings) / len(timings) * 1000
+        },
+        'items_per_second': items * len(timings) / sum(timings),
+        'peak_bytes': peak
+    }
+
+
+def network_benchmarks(nse, count, repeat):
+    """
+    :returns: list of (name, function, repeat, items, before) tuples for the APIs requesting the stand-in
+    """
+    def cold():
+        nse.cache.clear()
+
+    def cold_quotes():
+        # Only the quotes are measured, not the validation of the symbols
+        nse.cache.clear()
+        nse.get_symbol_index()
+
+    listed = symbols(count)
+    benchmarks = [
+        ('get_stock_codes', nse.get_stock_codes, repeat, count, cold),
+        ('get_index_list', nse.get_index_list, repeat, 1, cold),
+        ('get_top_gainers', nse.get_top_gainers, repeat, 1, cold),
+        ('get_peer_companies', lambda: nse.get_peer_companies('SYM1'), repeat, 1, cold_quotes),
+        ('get_history_3_years', lambda: nse.get_history(('SYM1', date(2014, 1, 1), date(2016, 12, 31))),
+         repeat, 1, cold_quotes),
+    ]
+    for size in sorted({1, min(50, count), count}):
+        benchmarks.append(('get_quote_%d' % size, lambda size=size: nse.get_quote(*listed[:size]),
+                           repeat if size <= 50 else max(1, repeat // 3), size, cold_quotes))
+    benchmarks.append(('snapshot_all_%d' % count, nse.snapshot_all, max(1, repeat // 3), count, cold_quotes))
+    return benchmarks
+
+
+def parser_benchmarks(nse, count, repeat):
+    """
+    :returns: list of (name, function, repeat, items, before) tuples for the parsers and cleaners on their own
+    """
+    iterations = 200
+    page = quote_page()
+    quote = nse.parse_quote(page)
+    raw_quote = {key: value if not isinstance(value, float) else '{:,.2f}'.format(value) for key, value in quote.items()}
+    csv = equity_list(count)
+    indices = index_list()
+    gainers = top_list()
+    peers = peer_companies().decode('latin-1')
+    # A single window of the history
+    history = [history_page('SYM1', date(2016, 1, 1), date(2016, 4, 9)).decode('latin-1')]
+
+    def repeated(function):
+        def run():
+            for _ in range(iterations):
+                function()
+        return run
+
+    return [
+        ('clean_server_response', repeated(lambda: nse.clean_server_response(raw_quote)), repeat, iterations, None),
+        ('parse_quote', repeated(lambda: nse.parse_quote(page)), repeat, iterations, None),
+        ('parse_stock_codes', lambda: nse.parse_stock_codes(io.BytesIO(csv)), repeat, count, None),
+        ('parse_index_snapshot', repeated(lambda: IndexSnapshot.from_json(indices)), repeat, iterations, None),
+        ('parse_top_list', repeated(lambda: nse.parse_top_list(gainers, 'symbol')), repeat, iterations, None),
+        ('parse_peer_companies', repeated(lambda: nse.parse_peer_companies(peers)), repeat, iterations, None),
+        ('parse_history', lambda: nse.parse_history(history), repeat, 1, None),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--latency', type=float, default=20, help='milliseconds the stand-in delays every response by')
+    parser.add_argument('--repeat', type=int, default=5, help='timed runs of every benchmark')
+    parser.add_argument('--symbols', type=int, default=2000, help='symbols listed by the stand-in')
+    parser.add_argument('--workers', type=int, default=16, help='max_workers of the Nse instance')
+    parser.add_argument('--processes', type=int, default=os.cpu_count(), help='worker processes of the sharded benchmarks')
+    parser.add_argument('--output', help='file to write the JSON results to, instead of stdout')
+    parser.add_argument('names', nargs='*', help='run only the benchmarks whose name starts with one of these')
+    arguments = parser.parse_args()
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'pandas': pd.__version__,
+            'latency_ms': arguments.latency,
+            'symbols': arguments.symbols,
+            'workers': arguments.workers,
+            'processes': arguments.processes
+        },
+        'benchmarks': {}
+    }
+    with NseStandIn(arguments.symbols, arguments.latency / 1000) as stand_in:
+        transport = Transport(base_url=stand_in.url, throttle=Throttle(max_concurrency=arguments.workers))
+        # The market hours would otherwise need the holiday page of the live site
+        set_trading_calendar(TradingCalendar([]))
+        with Nse(transport=transport, max_workers=arguments.workers) as nse:
+            benchmarks = network_benchmarks(nse, arguments.symbols, arguments.repeat)
+            benchmarks += parser_benchmarks(nse, arguments.symbols, arguments.repeat)
+            # The same limits as the single Nse, split between the processes
+            sharded = ShardedNse(arguments.processes, max_concurrency=arguments.workers,
+                                 transport_options={'base_url': stand_in.url}, symbol_index=nse.get_symbol_index(),
+                                 calendar=TradingCalendar([]))
+            benchmarks.append(('sharded_snapshot_all_%d' % arguments.symbols, sharded.snapshot_all,
+                               max(1, arguments.repeat // 3), arguments.symbols,
+                               # Starting the worker processes is not measured
+                               lambda: sharded.snapshot_all(*symbols(1))))
+            with sharded:
+                for name, function, repeat, items, before in benchmarks:
+                    if arguments.names and not any(name.startswith(prefix) for prefix in arguments.names):
+                        continue
+                    served = stand_in.requests
+                    results['benchmarks'][name] = measure(function, repeat, items, before)
+                    results['benchmarks'][name]['requests'] = stand_in.requests - served
+
+    output = json.dumps(results, indent=2)
+    if arguments.output:
+        with open(arguments.output, 'w') as output_file:
+            output_file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
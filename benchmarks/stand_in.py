@@ -0,0 +1,209 @@
+"""
+Local stand-in for nseindia.com, serving synthetic payloads shaped like the recorded ones
+with a configurable latency. It runs in a child process so that it does not compete with
+the client being measured for the interpreter.
+
+Usage: python benchmarks/stand_in.py [number of symbols] [latency in ms]
+"""
+import os
+import sys
+import gzip
+import json
+import time
+import multiprocessing
+
+from datetime import datetime, timedelta
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit, parse_qs
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_stock_codes import equity_list
+from bench_quote_parser import quote_page
+
+
+def symbols(count):
+    """
+    :returns: list of the symbols listed in equity_list(count)
+    """
+    return ['SYM%d' % i for i in range(count)]
+
+
+def index_list(count=50):
+    """
+    :returns: bytes of a synthetic Indices1.json with count indices
+    """
+    return json.dumps({'data': [
+        {'name': 'NIFTY INDEX %d' % i, 'lastPrice': '{:,.2f}'.format(10000 + i * 17.5),
+         'change': '-' if i % 9 == 0 else '%.2f' % (i * 1.5 - 30), 'pChange': '%.2f' % (i / 10 - 2.5),
+         'imgFileName': 'nifty%d_open.png' % i} for i in range(count)
+    ]}).encode()
+
+
+def top_list(count=10, symbol_key='symbol'):
+    """
+    :returns: bytes of a synthetic top gainers/losers list
+    """
+    return json.dumps({'data': [
+        {symbol_key: 'SYM%d' % i, 'series': 'EQ', 'openPrice': '{:,.2f}'.format(1000 + i), 'highPrice': '{:,.2f}'.format(1050 + i),
+         'lowPrice': '{:,.2f}'.format(990 + i), 'ltp': '{:,.2f}'.format(1040 + i), 'previousPrice': '-' if i % 4 == 0 else '1,000.00',
+         'netPrice': '%.2f' % (4 - i / 10), 'tradedQuantity': '{:,}'.format(100000 * (i + 1)),
+         'turnoverInLakhs': '{:,.2f}'.format(1234.5 * (i + 1)), 'lastCorpAnnouncementDate': '17-Oct-2026',
+         'lastCorpAnnouncement': 'Dividend - Rs 5 Per Share'} for i in range(count)
+    ], 'time': 'Oct 17, 2026 15:30:00'}).encode()
+
+
+def peer_companies(count=10):
+    """
+    :returns: bytes of a synthetic ajaxPeerCompanies.jsp payload, in its javascript object notation
+    """
+    records = ['{"symbol":"SYM%d","industry":"Computers - Software","ltP":"%s","change":"%s","mktCap":"%s"}' % (
+        i, '{:,.2f}'.format(1000 + i), '-' if i % 3 == 0 else '1.25', '{:,.2f}'.format(250000.5 * (i + 1)))
+        for i in range(count)]
+    return ('{success:"true" ,results:%d,data:[%s]}' % (count, ','.join(records))).encode()
+
+
+def history_page(symbol, start, end):
+    """
+    :returns: bytes of a synthetic productsSymbolMapping.jsp table with a row for every weekday in the range
+    """
+    header = ['Date', 'Symbol', 'Series', 'Open Price', 'High Price', 'Low Price', 'Close Price', 'Total Traded Quantity']
+    rows = ['<tr>%s</tr>' % ''.join('<th>%s</th>' % column for column in header)]
+    day = start
+    while day <= end:
+        if day.weekday() < 5:
+            price = 1000 + day.toordinal() % 250
+            cells = [day.strftime('%d-%b-%Y'), symbol, 'EQ', '{:,.2f}'.format(price), '{:,.2f}'.format(price + 12.5),
+                     '{:,.2f}'.format(price - 8.25), '{:,.2f}'.format(price + 3.5), '{:,}'.format(price * 1000)]
+            rows.append('<tr>%s</tr>' % ''.join('<td>%s</td>' % cell for cell in cells))
+        day += timedelta(days=1)
+    return ('<table>%s</table>' % ''.join(rows)).encode()
+
+
+class NseStandIn():
+    """
+    Serves EQUITY_L.csv, GetQuote.jsp, Indices1.json, the top lists, the history table and peer companies
+    """
+    def __init__(self, count=2000, latency=0.0):
+        """
+        :Parameters:
+        count: int
+            Number of symbols listed in EQUITY_L.csv
+        latency: float
+            Seconds every response is delayed by
+        """
+        self.count = count
+        self.latency = latency
+        self.__requests__ = multiprocessing.Value('l', 0)
+        self.__process__ = None
+        self.url = None
+
+    @property
+    def requests(self):
+        """
+        number of requests served so far
+        """
+        return self.__requests__.value
+
+    def start(self):
+        """
+        Starts serving in a child process
+        :returns: the base url of the stand-in
+        """
+        receiver, sender = multiprocessing.Pipe(duplex=False)
+        self.__process__ = multiprocessing.Process(target=serve, args=(self.count, self.latency, self.__requests__, sender),
+                                                   daemon=True)
+        self.__process__.start()
+        self.url = receiver.recv()
+        return self.url
+
+    def close(self):
+        if self.__process__ is not None:
+            self.__process__.terminate()
+            self.__process__.join()
+            self.__process__ = None
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def serve(count, latency, requests, sender):
+    """
+    Serves the payloads till the process is terminated, sending the base url over the pipe once listening
+    """
+    static = {
+        '/content/equities/EQUITY_L.csv': equity_list(count),
+        '/homepage/Indices1.json': index_list(),
+        '/live_market/dynaContent/live_analysis/gainers/niftyGainers1.json': top_list(),
+        '/live_market/dynaContent/live_analysis/losers/niftyLosers1.json': top_list(),
+        '/live_market/dynaContent/live_analysis/volume_spurts/volume_spurts.json': top_list(symbol_key='sym'),
+        '/live_market/dynaContent/live_analysis/most_active/allTopValue1.json': top_list(),
+        '/live_market/dynaContent/live_watch/get_quote/ajaxPeerCompanies.jsp': peer_companies(),
+    }
+    compressed = {path: gzip.compress(body) for path, body in static.items()}
+    page = quote_page()
+
+    def dynamic(path, query):
+        if path == '/live_market/dynaContent/live_watch/get_quote/GetQuote.jsp':
+            symbol = query.get('symbol', ['INFY'])[0]
+            return page.replace('"symbol": "INFY"', '"symbol": "%s"' % symbol).encode()
+        if path == '/products/dynaContent/common/productsSymbolMapping.jsp':
+            start = datetime.strptime(query['fromDate'][0], '%d-%m-%Y').date()
+            end = datetime.strptime(query['toDate'][0], '%d-%m-%Y').date()
+            return history_page(query['symbol'][0], start, end)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def do_GET(self):
+            with requests.get_lock():
+                requests.value += 1
+            if latency:
+                time.sleep(latency)
+            path, query = urlsplit(self.path).path, parse_qs(urlsplit(self.path).query)
+            accepts_gzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+            if path in static:
+                body = compressed[path] if accepts_gzip else static[path]
+            else:
+                body = dynamic(path, query)
+                if body is not None and accepts_gzip:
+                    body = gzip.compress(body, compresslevel=1)
+            if body is None:
+                self.send_response(404)
+                self.send_header('Content-Length', '0')
+                self.end_headers()
+                return
+            self.send_response(200)
+            if accepts_gzip:
+                self.send_header('Content-Encoding', 'gzip')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    httpd.daemon_threads = True
+    sender.send('http://127.0.0.1:%d' % httpd.server_address[1])
+    httpd.serve_forever()
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    latency = float(sys.argv[2]) / 1000 if len(sys.argv) > 2 else 0.0
+    with NseStandIn(count, latency) as stand_in:
+        print('Serving %d symbols at %s, press Ctrl+C to stop' % (count, stand_in.url))
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
@@ -7,11 +7,27 @@ import os
 import logging
 import json
 import re
+import ast
 import six
+import subprocess
+import sys
 from nsetools import Nse
-from nsetools.utils import js_adaptor, byte_adaptor, save_file
-from nsetools.nse import market_status
+from nsetools.utils import js_adaptor, byte_adaptor, save_file, parse_quote_payload
+from nsetools.nse import market_status, next_session_start
+from nsetools.cache import ResponseCache, instance_cache
+from nsetools.trading_calendar import TradingCalendar
+from nsetools.net_utils import Transport, AsyncTransport
+from nsetools import AsyncNse
+import asyncio
+from datetime import datetime, date, timedelta
+from unittest import mock
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+import gzip
+import hashlib
+import threading
+from time import monotonic
 from tempfile import gettempdir
+from urllib.parse import urlsplit, parse_qsl
 
 log = logging.getLogger('nse')
 logging.basicConfig(level=logging.DEBUG)
@@ -98,6 +114,20 @@ class TestCoreAPIs(unittest.TestCase):
         ret_dict = self.nse.clean_server_response(test_dict)
         self.assertDictEqual(ret_dict, expected_dict)
 
+    def test_records_cleaner(self):
+        records = [
+            {'symbol': 'INFY', 'ltp': '1,100.50', 'change': '-', 'name': 'A-1', 'mixed': '1,000', 'flag': True},
+            {'symbol': 'TCS', 'ltp': '2,000', 'change': '-1.5', 'name': '-', 'mixed': 'abc', 'flag': False}
+        ]
+        frame = self.nse.clean_records(records)
+        self.assertListEqual(list(frame['ltp']), [1100.50, 2000.0])
+        self.assertTrue(pd.api.types.is_float_dtype(frame['change']))
+        self.assertTrue(pd.isna(frame['change'][0]))
+        # Text columns keep their text, with '-' as None
+        self.assertListEqual(list(frame['name']), ['A-1', None])
+        self.assertListEqual(list(frame['mixed']), ['1,000', 'abc'])
+        self.assertListEqual(list(frame['flag']), [True, False])
+
     def test_get_stock_codes(self):
         sc = self.nse.get_stock_codes()
         self.assertIsNotNone(sc)
@@ -224,8 +254,41 @@ class TestCoreAPIs(unittest.TestCase):
     def test_jsadptor(self):
         buffer = 'abc:true, def:false, ghi:NaN, jkl:none'
         expected_buffer = 'abc:True, def:False, ghi:"NaN", jkl:None'
-        ret = js_adaptor(buffer)
+        with self.assertWarns(DeprecationWarning):
+            ret = js_adaptor(buffer)
         self.assertEqual(ret, expected_buffer)
+        # Values that merely contain a literal are left alone
+        with self.assertWarns(DeprecationWarning):
+            ret = js_adaptor('{"symbol": "TRUENONE", "name": "Attrue NaNa", "flag": true, "value": null, "pe": NaN}')
+        self.assertDictEqual(ast.literal_eval(ret),
+                             {'symbol': 'TRUENONE', 'name': 'Attrue NaNa', 'flag': True, 'value': None, 'pe': 'NaN'})
+        with self.assertWarns(DeprecationWarning):
+            ret = js_adaptor("abc:'is true', def:true")
+        self.assertEqual(ret, "abc:'is true', def:True")
+
+    def test_parse_quote_payload(self):
+        page = ('<html>{<div id="responseDiv" style="display:none">\n'
+                '{"data":[{"symbol":"TRUENONE","companyName":"Attrue NaNa","lastPrice":"1,100.50",'
+                '"change":"-","pChange":"-0.25","isExDateFlag":true,"faceValue":null}],"optLink":"}"}'
+                '</div><div>{"data":[]}</div></html>')
+        quote = parse_quote_payload(page)['data'][0]
+        # Substrings looking like javascript literals are left alone
+        self.assertEqual(quote['symbol'], 'TRUENONE')
+        self.assertEqual(quote['companyName'], 'Attrue NaNa')
+        self.assertEqual(quote['lastPrice'], 1100.50)
+        self.assertEqual(quote['pChange'], -0.25)
+        self.assertIsNone(quote['change'])
+        self.assertIs(quote['isExDateFlag'], True)
+        with self.assertRaises(ValueError):
+            parse_quote_payload('<html>Symbol not traded</html>')
+
+    def test_parse_peer_payload(self):
+        from nsetools.utils import parse_peer_payload
+        page = '{success:"true",data:[{"symbol":"A","ltP":"1"},{"symbol":"B",broken},{"symbol":"C"}]}'
+        # Broken entries are skipped
+        self.assertListEqual([r['symbol'] for r in parse_peer_payload(page)], ['A', 'C'])
+        with self.assertRaises(ValueError):
+            parse_peer_payload('no peers')
 
     def test_byte_adaptor(self):
         from io import BytesIO
@@ -257,5 +320,987 @@ class TestCoreAPIs(unittest.TestCase):
         if not os.path.exists(path):
             self.fail()
 
+class TestResponseCache(unittest.TestCase):
+    def test_hits_misses_and_expiry(self):
+        cache = ResponseCache(maxsize=4)
+        self.assertIsNone(cache.get('a'))
+        cache.put('a', 1)
+        cache.put('b', 2, expires_at=0)
+        self.assertEqual(cache.get('a'), 1)
+        # Already expired
+        self.assertIsNone(cache.get('b'))
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['misses'], stats['expirations']), (1, 2, 1))
+        self.assertEqual(stats['entries'], 1)
+
+    def test_eviction_bounds(self):
+        cache = ResponseCache(maxsize=2)
+        for key in 'abc':
+            cache.put(key, key)
+        # The least recently used entry is evicted first
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.stats()['evictions'], 1)
+
+        cache = ResponseCache(maxsize=10, max_bytes=3000)
+        cache.put('small', 'x')
+        cache.put('large', 'x' * 2000)
+        cache.put('larger', 'x' * 2500)
+        self.assertEqual(len(cache), 1)
+        self.assertLessEqual(cache.stats()['bytes'], 3000)
+        # Values bigger than the whole cache are never stored
+        cache.put('huge', 'x' * 5000)
+        self.assertIsNone(cache.get('huge'))
+
+    def test_instance_cache(self):
+        class Fetcher():
+            calls = 0
+            def __init__(self):
+                self.cache = ResponseCache()
+            def __cache_expiry__(self, live):
+                return None
+            @instance_cache(live=True)
+            def fetch(self, code, as_json=False):
+                Fetcher.calls += 1
+                return code
+
+        first, second = Fetcher(), Fetcher()
+        first.fetch('infy')
+        first.fetch('infy')
+        first.fetch('infy', as_json=True)
+        # Caches are per instance
+        second.fetch('infy')
+        self.assertEqual(Fetcher.calls, 3)
+        self.assertEqual(first.cache.stats()['hits'], 1)
+
+    def test_single_flight(self):
+        import time
+        from nsetools.cache import SingleFlight
+        flight, calls = SingleFlight(), []
+
+        def slow(result):
+            calls.append(result)
+            time.sleep(0.2)
+            if isinstance(result, Exception):
+                raise result
+            return result
+
+        for result in ['quote', ValueError('bad gateway')]:
+            outcomes = []
+
+            def call():
+                try:
+                    outcomes.append(flight.do('key', lambda: slow(result)))
+                except ValueError as error:
+                    outcomes.append(error)
+            threads = [threading.Thread(target=call) for _ in range(5)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            # Every caller gets the leader's result or exception
+            self.assertListEqual(outcomes, [result] * 5)
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(flight.coalesced, 8)
+        self.assertEqual(len(flight), 0)
+
+        async def check():
+            async def compute():
+                calls.append('async')
+                await asyncio.sleep(0.1)
+                return 'async'
+            return await asyncio.gather(*[flight.do_async('key', compute) for _ in range(3)])
+        self.assertListEqual(asyncio.run(check()), ['async'] * 3)
+        self.assertEqual(calls.count('async'), 1)
+
+    def test_throttle(self):
+        import time
+        from urllib.error import HTTPError
+        from nsetools.throttle import Throttle, parse_retry_after
+        throttle = Throttle(max_concurrency=8, min_concurrency=2, latency_target=1)
+        throttle.acquire()
+        throttle.release(0.1, HTTPError('url', 503, 'Busy', {}, None))
+        self.assertEqual(throttle.stats()['concurrency_limit'], 4)
+        throttle.acquire()
+        throttle.release(5)
+        throttle.acquire()
+        throttle.release(0.1, HTTPError('url', 429, 'Slow down', {}, None))
+        # Never below the minimum
+        self.assertEqual(throttle.stats()['concurrency_limit'], 2)
+        for _ in range(20):
+            throttle.acquire()
+            throttle.release(0.1)
+        # Additive increase, capped at the maximum
+        self.assertGreater(throttle.stats()['concurrency_limit'], 4)
+        self.assertLessEqual(throttle.stats()['concurrency_limit'], 8)
+        # A missing page is not the server being overloaded
+        self.assertIsNone(throttle.retry_delay(0, HTTPError('url', 404, 'Not Found', {}, None)))
+        self.assertIsNone(throttle.retry_delay(3, ConnectionResetError()))
+        self.assertGreaterEqual(throttle.retry_delay(0, HTTPError('url', 503, 'Busy', {'Retry-After': '7'}, None)), 7)
+
+        throttle = Throttle(rate=20, burst=1)
+        started = time.monotonic()
+        for _ in range(5):
+            throttle.acquire()
+            throttle.release(0)
+        self.assertGreaterEqual(time.monotonic() - started, 0.19)
+        self.assertEqual(parse_retry_after('Wed, 21 Oct 2015 07:28:00 GMT'), 0)
+        self.assertEqual(parse_retry_after('junk'), 0)
+
+    def test_next_session_start(self):
+        # 2026-10-16 is a Friday, 2026-10-19 a Monday
+        with mock.patch('nsetools.nse.trading_calendar', return_value=TradingCalendar([date(2026, 10, 19)])):
+            self.assertEqual(next_session_start(datetime(2026, 10, 16, 8, 0)), datetime(2026, 10, 16, 9, 15))
+            self.assertEqual(next_session_start(datetime(2026, 10, 16, 16, 0)), datetime(2026, 10, 20, 9, 15))
+
+class TestQuoteBatch(unittest.TestCase):
+    def test_round_trip(self):
+        import numpy as np
+        from nsetools.quotes import QuoteBatch
+        quotes = [
+            {'symbol': 'INFY', 'lastPrice': 1100.5, 'change': None, 'series': 'EQ', 'isExDateFlag': False},
+            None,
+            {'symbol': 'TCS', 'lastPrice': 2000.0, 'change': 1.5, 'series': 'EQ', 'isExDateFlag': True}
+        ]
+        batch = QuoteBatch.from_quotes(quotes)
+        self.assertEqual(len(batch), 2)
+        self.assertIn('infy', batch)
+        self.assertListEqual(batch.numeric_fields, ['lastPrice', 'change'])
+        self.assertEqual(batch.column('change').dtype, np.float64)
+        # The repeated strings are shared
+        self.assertIs(batch.column('series')[0], batch.column('series')[1])
+        self.assertDictEqual(batch.quote('infy'), quotes[0])
+        self.assertIsNone(batch.quote('junk'))
+        self.assertListEqual([json.loads(quote) for quote in batch.to_json()], [quotes[0], quotes[2]])
+
+        frame = batch.to_frame()
+        expected = pd.DataFrame([quote for quote in quotes if quote]).set_index('symbol')
+        pd.testing.assert_frame_equal(frame, expected)
+        self.assertGreater(batch.memory_usage(), 0)
+
+class TestSaveFile(unittest.TestCase):
+    def setUp(self):
+        self.frame = pd.DataFrame({'SYMBOL': ['INFY', 'TCS', 'SBIN'], 'PRICE': [1100.5, 2000.0, None]})
+        self.path = os.path.join(gettempdir(), 'nsetools_save_file')
+        os.makedirs(self.path, exist_ok=True)
+        for name in os.listdir(self.path):
+            os.remove(os.path.join(self.path, name))
+
+    def test_csv_in_chunks_and_append(self):
+        file_path = save_file(self.frame, 'csv', path=self.path, name='day', chunk_size=2)
+        self.assertEqual(file_path, os.path.join(self.path, 'day.csv'))
+        save_file(self.frame.iloc[:1], 'csv', path=self.path, name='day', append=True)
+        saved = pd.read_csv(file_path)
+        # The header is only written once
+        pd.testing.assert_frame_equal(saved, pd.concat([self.frame, self.frame.iloc[:1]], ignore_index=True))
+        # Without a path the text is returned, the same however it is chunked
+        self.assertEqual(save_file(self.frame, 'csv', chunk_size=1), self.frame.to_csv(index=False))
+
+    def test_ndjson_append(self):
+        save_file(self.frame, 'ndjson', path=self.path, name='day', index=False, chunk_size=2)
+        file_path = save_file(self.frame.iloc[1:], 'ndjson', path=self.path, name='day', index=False, append=True)
+        with open(file_path) as f:
+            lines = [json.loads(line) for line in f]
+        self.assertListEqual([line['SYMBOL'] for line in lines], ['INFY', 'TCS', 'SBIN', 'TCS', 'SBIN'])
+        self.assertIsNone(lines[2]['PRICE'])
+
+    def test_stream_and_errors(self):
+        stream = six.StringIO()
+        self.assertIs(save_file(self.frame, 'html', stream=stream), stream)
+        self.assertIn('<table', stream.getvalue())
+        self.assertIn('"SYMBOL"', save_file(self.frame, 'json'))
+        with self.assertRaises(ValueError):
+            save_file(self.frame, 'xls')
+        with self.assertRaises(ValueError):
+            save_file(self.frame, 'json', path=self.path, name='day', append=True)
+
+    def test_quote_batch(self):
+        from nsetools.quotes import QuoteBatch
+        batch = QuoteBatch.from_quotes([{'symbol': 'INFY', 'lastPrice': 1100.5}, {'symbol': 'TCS', 'lastPrice': 2000.0}])
+        self.assertEqual(save_file(batch, 'csv', index=True), batch.to_frame().to_csv())
+
+    @unittest.skipUnless(__import__('importlib').util.find_spec('pyarrow'), 'pyarrow is not installed')
+    def test_columnar(self):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        file_path = save_file(self.frame, 'parquet', path=self.path, name='day', index=False, chunk_size=2)
+        parquet = pq.ParquetFile(file_path)
+        self.assertEqual(parquet.num_row_groups, 2)
+        pd.testing.assert_frame_equal(parquet.read().to_pandas(), self.frame)
+        feather = save_file(self.frame, 'feather', index=False, chunk_size=2)
+        pd.testing.assert_frame_equal(pa.ipc.open_file(pa.BufferReader(feather)).read_pandas(), self.frame)
+
+class TestTradingCalendar(unittest.TestCase):
+    def setUp(self):
+        # 2026-10-20 is a Tuesday, 2026-11-09 a Monday
+        self.calendar = TradingCalendar([date(2026, 10, 20), date(2026, 11, 9), date(2026, 10, 24)],
+                                        valid_through=date(2026, 12, 31))
+
+    def test_trading_days(self):
+        calendar = self.calendar
+        # Weekends are implied, the saturday passed is dropped
+        self.assertListEqual(calendar.holidays, [date(2026, 10, 20), date(2026, 11, 9)])
+        self.assertFalse(calendar.is_trading_day(date(2026, 10, 20)))
+        self.assertFalse(calendar.is_trading_day(date(2027, 10, 23)))
+        # Weekends are known beyond the current year
+        self.assertTrue(calendar.is_trading_day(date(2027, 10, 25)))
+        self.assertEqual(calendar.next_trading_day(date(2026, 11, 7)), date(2026, 11, 10))
+        self.assertEqual(calendar.previous_trading_day(date(2026, 10, 20)), date(2026, 10, 19))
+        self.assertEqual(calendar.next_trading_day(date(2026, 10, 19), inclusive=False), date(2026, 10, 21))
+        for start, end in [(date(2026, 10, 1), date(2026, 12, 31)), (date(2026, 10, 18), date(2026, 10, 24)),
+                           (date(2026, 11, 9), date(2026, 11, 9)), (date(2025, 1, 3), date(2027, 2, 1))]:
+            self.assertEqual(calendar.trading_days_between(start, end), len(calendar.trading_days(start, end)))
+        self.assertEqual(calendar.trading_days_between(date(2026, 10, 2), date(2026, 10, 1)), 0)
+
+    def test_sessions(self):
+        calendar = self.calendar
+        self.assertTupleEqual(calendar.session_bounds(date(2026, 10, 19)),
+                              (datetime(2026, 10, 19, 9, 15), datetime(2026, 10, 19, 15, 30)))
+        self.assertIsNone(calendar.session_bounds(date(2026, 10, 20)))
+        self.assertTrue(calendar.is_open(datetime(2026, 10, 19, 10, 0)))
+        self.assertFalse(calendar.is_open(datetime(2026, 10, 20, 10, 0)))
+        self.assertEqual(calendar.next_session(datetime(2026, 10, 19, 10, 0)), datetime(2026, 10, 21, 9, 15))
+
+    def test_persistence(self):
+        from tempfile import mkdtemp
+        path = os.path.join(mkdtemp(), 'calendar.json')
+        self.calendar.save(path)
+        loaded = TradingCalendar.load(path)
+        self.assertListEqual(loaded.holidays, self.calendar.holidays)
+        self.assertEqual(loaded.valid_through, date(2026, 12, 31))
+        self.assertEqual(loaded.market_open, self.calendar.market_open)
+
+    def test_history_plan(self):
+        nse = Nse()
+        with mock.patch('nsetools.nse.trading_calendar', return_value=self.calendar):
+            # Friday to the Tuesday holiday only needs the friday and monday
+            (_, _, urls), = nse.history_plan(('infy', date(2026, 10, 16), date(2026, 10, 20)))
+            self.assertIn('fromDate=16-10-2026', urls[0])
+            self.assertIn('toDate=19-10-2026', urls[0])
+            # A weekend has nothing to fetch
+            self.assertListEqual(nse.history_plan(('infy', date(2026, 10, 17), date(2026, 10, 18))),
+                                 [(date(2026, 10, 17), date(2026, 10, 18), [])])
+
+    def test_unreachable_holiday_page(self):
+        from nsetools import nse as nse_module
+        holidays = mock.Mock()
+        holidays.get_trading_holidays.side_effect = OSError('unreachable')
+        try:
+            nse_module.set_trading_calendar(None)
+            with mock.patch('nsetools.nse.nse_holidays', return_value=holidays):
+                # Only the weekends are known, and the page is not requested again right away
+                self.assertListEqual(nse_module.trading_calendar().holidays, [])
+                self.assertFalse(nse_module.trading_calendar().is_trading_day(date(2026, 10, 17)))
+                self.assertEqual(holidays.get_trading_holidays.call_count, 1)
+                with mock.patch('nsetools.nse.monotonic', return_value=monotonic() + nse_module.CALENDAR_RETRY_INTERVAL):
+                    nse_module.trading_calendar()
+                self.assertEqual(holidays.get_trading_holidays.call_count, 2)
+        finally:
+            nse_module.set_trading_calendar(None)
+
+class TestMetrics(unittest.TestCase):
+    def test_spans_counters_and_exporters(self):
+        from nsetools.metrics import Metrics, NULL_METRICS
+        metrics = Metrics(buckets=(0.01, 1))
+        seen = []
+        metrics.subscribe(lambda name, seconds, attributes: seen.append((name, attributes)))
+        with metrics.span('parse', kind='quote') as span:
+            span.set(rows=1)
+        metrics.record('body', 0.5, kind='www.nseindia.com', bytes=100)
+        metrics.increment('requests')
+        metrics.increment('requests')
+        metrics.increment('errors', kind='HTTPError')
+        metrics.register('cache', lambda: {'hits': 3, 'rate': None})
+        self.assertListEqual(seen, [('parse', {'rows': 1, 'kind': 'quote'}),
+                                    ('body', {'bytes': 100, 'kind': 'www.nseindia.com'})])
+
+        snapshot = metrics.snapshot()
+        self.assertDictEqual(snapshot['counters'], {'requests': 2, 'errors:HTTPError': 1})
+        self.assertDictEqual(snapshot['gauges'], {'cache_hits': 3})
+        self.assertDictEqual(snapshot['spans']['body:www.nseindia.com']['buckets'], {0.01: 0, 1: 1, '+Inf': 1})
+        self.assertEqual(snapshot['spans']['parse:quote']['count'], 1)
+
+        text = metrics.prometheus()
+        self.assertIn('nsetools_requests_total 2\n', text)
+        self.assertIn('nsetools_errors_total{kind="HTTPError"} 1\n', text)
+        self.assertIn('nsetools_span_seconds_bucket{span="body",kind="www.nseindia.com",le="1"} 1\n', text)
+        self.assertIn('nsetools_span_seconds_count{span="parse",kind="quote"} 1\n', text)
+        self.assertIn('nsetools_cache_hits 3\n', text)
+
+        metrics.reset()
+        self.assertDictEqual(metrics.snapshot()['counters'], {})
+        # Disabled, spans are a shared no-op
+        self.assertIs(NULL_METRICS.span('parse'), NULL_METRICS.span('clean', kind='dict'))
+
+class StandInServer():
+    """
+    Minimal local stand-in for nseindia.com serving canned payloads by path.
+    A payload can also be a function of the query string.
+    """
+    def __init__(self, routes):
+        self.routes = routes
+        self.client_ports = set()
+        self.cookies = []
+        self.not_modified = 0
+        # path -> list of (status, Retry-After) to fail the next requests with
+        self.failures = {}
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                server.client_ports.add(self.client_address[1])
+                server.cookies.append(self.headers.get('Cookie'))
+                failures = server.failures.get(self.path.split('?')[0])
+                if failures:
+                    status, retry_after = failures.pop(0)
+                    self.send_response(status)
+                    self.send_header('Retry-After', retry_after)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                body = server.routes.get(self.path.split('?')[0])
+                if callable(body):
+                    body = body(urlsplit(self.path).query)
+                if body is None:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+                etag = '"%s"' % hashlib.md5(body).hexdigest()
+                if self.headers.get('If-None-Match') == etag:
+                    server.not_modified += 1
+                    self.send_response(304)
+                    self.send_header('ETag', etag)
+                    self.end_headers()
+                    return
+                self.send_response(200)
+                self.send_header('ETag', etag)
+                if 'gzip' in self.headers.get('Accept-Encoding', ''):
+                    body = gzip.compress(body)
+                    self.send_header('Content-Encoding', 'gzip')
+                self.send_header('Set-Cookie', 'nsesession=abc; Path=/')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.url = 'http://127.0.0.1:%d' % self.httpd.server_address[1]
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+class OpenCalendar(TradingCalendar):
+    """
+    Calendar on which the market never closes, for the tests polling as if it were open
+    """
+    def is_open(self, now=None):
+        return True
+
+def stand_in_quote(query):
+    """
+    :returns: GetQuote.jsp page quoting the symbol asked for, or one without a quote for 3MINDIA
+    """
+    symbol = dict(parse_qsl(query))['symbol']
+    if symbol == '3MINDIA':
+        return b'<html>Not traded</html>'
+    return STAND_IN_ROUTES['/live_market/dynaContent/live_watch/get_quote/GetQuote.jsp'].replace(b'INFY', symbol.encode())
+
+STAND_IN_ROUTES = {
+    '/homepage/Indices1.json': json.dumps({'data': [
+        {'name': 'NIFTY 50', 'lastPrice': '10,000.50', 'change': '-'},
+        {'name': 'NIFTY BANK', 'lastPrice': '25,000.00', 'change': '-12.50'}
+    ]}).encode(),
+    '/content/equities/EQUITY_L.csv': (
+        b'SYMBOL,NAME OF COMPANY, SERIES, DATE OF LISTING, PAID UP VALUE, MARKET LOT, ISIN NUMBER, FACE VALUE\n'
+        b'20MICRONS,20 Microns Limited,EQ,06-OCT-2008,5,1,INE144J01027,5\n'
+        b'INFY,Infosys Limited,EQ,08-FEB-1995,5,1,INE009A01021,5\n'
+        b'3MINDIA,"3M India, Limited",EQ,13-AUG-2004,10,1,INE470A01017,10\n'
+    ),
+    '/live_market/dynaContent/live_watch/get_quote/GetQuote.jsp': (
+        b'<html>{<div id="responseDiv" style="display:none">\n'
+        b'{"futLink":"","data":[{"symbol":"INFY","lastPrice":"1,100.50","change":"-","isExDateFlag":false}],"optLink":""}'
+        b'</div></html>'
+    ),
+    '/live_market/dynaContent/live_analysis/gainers/niftyGainers1.json': json.dumps({'data': [
+        {'symbol': 'INFY', 'ltp': '1,100.50', 'netPrice': '2.5', 'previousPrice': '-'},
+        {'symbol': 'TCS', 'ltp': '2,000.00', 'netPrice': '1.5', 'previousPrice': '1,970.45'}
+    ]}).encode(),
+    '/live_market/dynaContent/live_watch/get_quote/ajaxPeerCompanies.jsp': (
+        b'{success:"true" ,results:2,data:[{"symbol":"INFY","industry":"IT","ltP":"1,100.50"},'
+        b'{"symbol":"20MICRONS","industry":"IT","ltP":"100.00"}]}'
+    ),
+    '/products/dynaContent/common/productsSymbolMapping.jsp': (
+        b'<table><tr><th>Date</th><th>Symbol</th><th>Close Price</th></tr>'
+        b'<tr><td>05-Jan-2010</td><td>INFY</td><td>2,630.00</td></tr>'
+        b'<tr><td>04-Jan-2010</td><td>INFY</td><td>2,620.00</td></tr></table>'
+    )
+}
+
+class TestTransport(unittest.TestCase):
+    def setUp(self):
+        self.server = StandInServer(STAND_IN_ROUTES)
+        self.transport = Transport(timeout=5, base_url=self.server.url)
+
+    def tearDown(self):
+        self.transport.close()
+        self.server.close()
+
+    def test_keep_alive_cookies_and_gzip(self):
+        url = 'http://www.nseindia.com/homepage/Indices1.json'
+        for _ in range(3):
+            body = self.transport.fetch(url)
+            self.assertEqual(json.loads(body.decode())['data'][0]['name'], 'NIFTY 50')
+        # One connection reused for all the requests
+        self.assertEqual(len(self.server.client_ports), 1)
+        # The session cookie is sent back after the first response
+        self.assertEqual(self.server.cookies[0], None)
+        self.assertEqual(self.server.cookies[-1], 'nsesession=abc')
+
+    def test_streaming(self):
+        url = 'http://www.nseindia.com/content/equities/EQUITY_L.csv'
+        with self.transport.open(url) as stream:
+            lines = list(stream)
+        self.assertEqual(len(lines), 4)
+        self.assertTrue(lines[2].startswith(b'INFY,'))
+        # The completely read connection goes back to the pool
+        self.transport.fetch(url)
+        self.assertEqual(len(self.server.client_ports), 1)
+
+    def test_is_valid_code_streams_equity_list(self):
+        nse = Nse(transport=self.transport)
+        self.assertTrue(nse.is_valid_code('infy'))
+        self.assertFalse(nse.is_valid_code('inf'))
+        valid, invalid = nse.validate_codes(['infy', '20MICRONS', 'inf', 'abc'])
+        self.assertSetEqual(valid, {'infy', '20MICRONS'})
+        self.assertSetEqual(invalid, {'inf', 'abc'})
+        index = nse.get_symbol_index()
+        self.assertEqual(index.symbol('ine009a01021'), 'INFY')
+        self.assertEqual(index.isin('3mindia'), 'INE470A01017')
+        self.assertEqual(index.name('3MINDIA'), '3M India, Limited')
+
+    def test_get_stock_codes_types(self):
+        codes = Nse(transport=self.transport).get_stock_codes()
+        self.assertEqual(len(codes), 3)
+        # Quoted names containing commas stay in one column
+        self.assertEqual(codes['Name'].iloc[2], '3M India, Limited')
+        self.assertEqual(codes['Series'].dtype.name, 'category')
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(codes['Date of Listing']))
+        self.assertEqual(codes['Date of Listing'].iloc[1], pd.Timestamp(1995, 2, 8))
+        self.assertTrue(pd.api.types.is_numeric_dtype(codes['Market Lot']))
+        self.assertTrue(pd.api.types.is_numeric_dtype(codes['Face Value']))
+
+    def test_get_quote(self):
+        nse = Nse(transport=self.transport)
+        quotes = nse.get_quote('infy', 'inf')
+        self.assertEqual(list(quotes.index), ['INFY'])
+        self.assertEqual(quotes.loc['INFY', 'lastPrice'], 1100.50)
+        self.assertIsNone(quotes.loc['INFY', 'change'])
+
+    def test_shared_executor(self):
+        from concurrent.futures import ThreadPoolExecutor
+        nse = Nse(transport=self.transport, max_workers=2)
+        nse.get_quote('infy')
+        # A single symbol is fetched inline
+        self.assertIsNone(nse.__executor__)
+        nse.get_quote('infy', '20microns', 'inf')
+        executor = nse.executor
+        nse.get_quote('20microns', 'infy')
+        self.assertIs(nse.executor, executor)
+        nse.close()
+        with self.assertRaises(RuntimeError):
+            executor.submit(print)
+
+        # Executors passed in are left running
+        executor = ThreadPoolExecutor(2)
+        with Nse(transport=self.transport, executor=executor) as nse:
+            nse.get_quote('infy', '20microns')
+        executor.submit(print).result()
+        executor.shutdown()
+
+    def test_get_quote_batch(self):
+        nse = Nse(transport=self.transport)
+        batch = nse.get_quote_batch('infy', 'INFY', 'inf')
+        self.assertListEqual(batch.symbols, ['INFY'])
+        self.assertEqual(batch.column('lastPrice')[0], 1100.50)
+        pd.testing.assert_frame_equal(batch.to_frame(), nse.get_quote('infy'))
+
+    def test_snapshot_all(self):
+        self.server.routes = dict(STAND_IN_ROUTES)
+        self.server.routes['/live_market/dynaContent/live_watch/get_quote/GetQuote.jsp'] = stand_in_quote
+        progress = []
+        with Nse(transport=self.transport, max_workers=2) as nse:
+            snapshot = nse.snapshot_all(chunk_size=2, progress=lambda *done: progress.append(done))
+            self.assertListEqual(snapshot.batch.symbols, ['20MICRONS', 'INFY'])
+            self.assertEqual(snapshot.requested, 3)
+            # The symbol that failed costs nothing but its own quote
+            self.assertListEqual(snapshot.failed, ['3MINDIA'])
+            self.assertFalse(snapshot.complete)
+            self.assertListEqual(progress, [(2, 3, 0), (3, 3, 1)])
+            self.assertEqual(snapshot.to_frame()['lastPrice'].dtype, 'float64')
+
+            snapshot = nse.snapshot_all('infy', 'junk')
+            self.assertListEqual(snapshot.batch.symbols, ['INFY'])
+            self.assertIsInstance(snapshot.errors['junk'], ValueError)
+            # Nothing is quoted once the time is up
+            snapshot = nse.snapshot_all(timeout=0)
+            self.assertEqual(len(snapshot), 0)
+            self.assertTrue(all(isinstance(error, TimeoutError) for error in snapshot.errors.values()))
+
+    def test_history_windows(self):
+        nse = Nse(transport=self.transport)
+        # Short ranges still need one request
+        self.assertEqual(len(nse.history_urls(('infy', '04-01-2010', '30-01-2010'))), 1)
+        self.assertEqual(len(nse.history_urls(('infy', date(2010, 1, 1), datetime(2010, 4, 10)))), 1)
+        urls = nse.history_urls(('infy', date(2010, 1, 1), date(2010, 4, 11)))
+        self.assertEqual(len(urls), 2)
+        self.assertIn('toDate=10-04-2010', urls[0])
+        self.assertIn('fromDate=11-04-2010', urls[1])
+        # Ten years take 37 windows
+        self.assertEqual(len(nse.history_urls(('infy', '01-01-2010', '31-12-2019'))), 37)
+
+    def test_get_history(self):
+        nse = Nse(transport=self.transport)
+        history = nse.get_history(('infy', '01-01-2010', '31-12-2010'))
+        # Every window returns the same two days, which are de-duplicated
+        self.assertEqual(len(history), 2)
+        self.assertTrue(history.index.is_monotonic_increasing)
+        history = nse.get_history(('infy', '01-01-2010', '31-12-2010'), ('inf', '01-01-2010', '31-12-2010'))
+        self.assertIsInstance(history[0], pd.DataFrame)
+        self.assertIsNone(history[1])
+
+    def test_history_store(self):
+        from nsetools.history_store import HistoryStore
+        from tempfile import mkdtemp
+        store = HistoryStore(os.path.join(mkdtemp(), 'history.db'))
+        nse = Nse(transport=self.transport, history_store=store)
+        history = nse.get_history(('infy', '01-01-2010', '31-01-2010'))
+        self.assertEqual(list(history['Close Price']), [2620.0, 2630.0])
+        requests = len(self.server.cookies)
+
+        # Only the dates after the stored range are fetched
+        plan = nse.history_plan(('infy', '01-01-2010', '28-02-2010'))
+        self.assertEqual([(start, end) for start, end, _ in plan], [(date(2010, 2, 1), date(2010, 2, 28))])
+        # Fully stored ranges are served from disk
+        history = nse.get_history(('infy', '02-01-2010', '20-01-2010'))
+        self.assertEqual(len(self.server.cookies), requests)
+        self.assertEqual(list(history.index), [pd.Timestamp(2010, 1, 4), pd.Timestamp(2010, 1, 5)])
+
+    def test_get_top_gainers(self):
+        nse = Nse(transport=self.transport)
+        gainers = nse.get_top_gainers()
+        self.assertEqual(gainers.loc['INFY', 'ltp'], 1100.50)
+        self.assertTrue(pd.api.types.is_float_dtype(gainers['previousPrice']))
+        gainers = json.loads(nse.get_top_gainers(as_json=True))
+        self.assertIsNone(gainers[0]['previousPrice'])
+
+    def test_index_snapshot(self):
+        nse = Nse(transport=self.transport)
+        # Requests the holiday page, if the calendar is not built yet
+        nse.trading_calendar()
+        served = len(self.server.cookies)
+        self.assertTrue(nse.is_valid_index('nifty bank'))
+        self.assertFalse(nse.is_valid_index('junk'))
+        self.assertEqual(nse.get_index_quote('nifty 50')['lastPrice'], 10000.50)
+        self.assertIsNone(nse.get_index_quote('junk'))
+        quotes = nse.get_index_quotes('nifty 50', 'junk', 'NIFTY BANK')
+        self.assertListEqual(list(quotes.index), ['NIFTY 50', 'NIFTY BANK'])
+        self.assertEqual(quotes.loc['NIFTY BANK', 'change'], -12.50)
+        json_quotes = nse.get_index_quotes('nifty 50', 'junk', as_json=True)
+        self.assertIsNone(json_quotes[1])
+        self.assertEqual(json.loads(json_quotes[0])['name'], 'NIFTY 50')
+        # Everything above came from a single download
+        self.assertEqual(len(self.server.cookies) - served, 1)
+        self.assertIsInstance(nse.get_index_snapshot().fetched_at, datetime)
+        # The frame of a snapshot is built once, from the quotes cleaned with it
+        snapshot = nse.get_index_snapshot()
+        with mock.patch('nsetools.utils.clean_dict') as clean_dict:
+            self.assertIs(snapshot.frame(), snapshot.frame())
+            self.assertEqual(nse.get_index_quotes('nifty 50').loc['NIFTY 50', 'lastPrice'], 10000.50)
+        clean_dict.assert_not_called()
+
+    def test_get_peer_companies(self):
+        nse = Nse(transport=self.transport, max_workers=1)
+        nse.trading_calendar()
+        served = len(self.server.cookies)
+        # 20MICRONS is already in the group of INFY, so only 3MINDIA is requested next
+        peers = nse.get_peer_companies_many('infy', '20microns', '3mindia', 'junk')
+        self.assertListEqual(list(peers['symbol']), ['INFY', '20MICRONS'])
+        self.assertListEqual(list(peers['group']), ['INFY', 'INFY'])
+        # The equity list, INFY and 3MINDIA
+        self.assertEqual(len(self.server.cookies) - served, 3)
+
+        peers = nse.get_peer_companies('infy')
+        self.assertListEqual(list(peers['symbol']), ['INFY', '20MICRONS'])
+        self.assertNotIn('industry', peers.columns)
+
+    def test_get_top_concurrently(self):
+        import time
+        nse = Nse(transport=self.transport)
+        results = nse.get_top_all('gainers', 'index list', 'junk')
+        self.assertSetEqual(set(results), {'gainers', 'index list'})
+        self.assertIsInstance(results['gainers'], pd.DataFrame)
+        self.assertListEqual(results['index list'], ['NIFTY 50', 'NIFTY BANK'])
+
+        nse.get_top_losers = lambda as_json: time.sleep(1)
+        results = list(nse.get_top_as_completed('losers', 'gainers', 'volume', timeout=0.5))
+        # The fast option finishes before the slow one, which times out, and the missing route fails
+        order = [option for option, _ in results]
+        self.assertLess(order.index('gainers'), order.index('losers'))
+        results = dict(results)
+        self.assertIsInstance(results['losers'], TimeoutError)
+        from urllib.error import HTTPError
+        self.assertIsInstance(results['volume'], HTTPError)
+        nse.close()
+
+    def test_fetch_if_modified(self):
+        url = 'http://www.nseindia.com/homepage/Indices1.json'
+        body, validators = self.transport.fetch_if_modified(url)
+        self.assertEqual(json.loads(body)['data'][0]['name'], 'NIFTY 50')
+        self.assertIn('ETag', validators)
+        self.assertTupleEqual(self.transport.fetch_if_modified(url, validators=validators), (None, validators))
+        self.assertEqual(self.server.not_modified, 1)
+
+    @mock.patch('nsetools.nse.trading_calendar', return_value=OpenCalendar([]))
+    def test_watch(self, _):
+        path = '/live_market/dynaContent/live_watch/get_quote/GetQuote.jsp'
+        self.server.routes = dict(STAND_IN_ROUTES)
+        nse = Nse(transport=self.transport)
+        watcher = nse.watch('infy', 'junk', interval=0.01)
+        first = next(watcher)
+        self.assertListEqual(list(first), ['INFY'])
+        self.assertEqual(first['INFY']['lastPrice'], 1100.50)
+
+        def change_price():
+            self.server.routes[path] = STAND_IN_ROUTES[path].replace(b'1,100.50', b'1,101.00')
+        threading.Timer(0.2, change_price).start()
+        # Only the field that changed is yielded, the unchanged polls are answered with 304s
+        self.assertDictEqual(next(watcher), {'INFY': {'lastPrice': 1101.0}})
+        self.assertGreater(self.server.not_modified, 0)
+        watcher.close()
+        nse.close()
+
+    def test_holiday_page_over_the_transport(self):
+        from nsetools import nse as nse_module
+        self.server.routes = dict(STAND_IN_ROUTES)
+        self.server.routes['/products/content/equities/equities/mrkt_timing_holidays.htm'] = (
+            b'<tr><td>1</td><td>26-Jan-2026</td><td>Monday</td><td>Republic Day</td></tr>'
+            b'<tr><td>2</td><td>19-Oct-2026</td><td>Monday</td><td>Diwali</td></tr>')
+        try:
+            nse_module.set_trading_calendar(None)
+            with Nse(transport=self.transport) as nse:
+                self.assertListEqual(nse.get_index_list(), ['NIFTY 50', 'NIFTY BANK'])
+                self.assertListEqual(nse.trading_calendar().holidays, [date(2026, 1, 26), date(2026, 10, 19)])
+        finally:
+            nse_module.set_trading_calendar(None)
+
+    def test_holiday_page_of_the_new_year(self):
+        from nsetools import nse as nse_module
+        pages = {2026: b'<tr><td>1</td><td>19-Oct-2026</td><td>Monday</td><td>Diwali</td></tr>',
+                 2027: b'<tr><td>1</td><td>26-Jan-2027</td><td>Tuesday</td><td>Republic Day</td></tr>'}
+        year = [2026]
+        requested = []
+
+        def holiday_page(query):
+            requested.append(year[0])
+            return pages[year[0]]
+
+        def today_is(day):
+            return type('Today', (date,), {'today': classmethod(lambda cls: day)})
+        self.server.routes = dict(STAND_IN_ROUTES)
+        self.server.routes['/products/content/equities/equities/mrkt_timing_holidays.htm'] = holiday_page
+        try:
+            nse_module.set_trading_calendar(None)
+            with mock.patch('nsetools.nse.date', today_is(date(2026, 12, 31))):
+                self.assertListEqual(nse_module.trading_calendar(self.transport).holidays, [date(2026, 10, 19)])
+                nse_module.trading_calendar(self.transport)
+                self.assertListEqual(requested, [2026])
+            # Once the year is over, the page of the new year is requested
+            year[0] = 2027
+            with mock.patch('nsetools.nse.date', today_is(date(2027, 1, 4))):
+                calendar = nse_module.trading_calendar(self.transport)
+            self.assertListEqual(requested, [2026, 2027])
+            self.assertListEqual(calendar.holidays, [date(2027, 1, 26)])
+            self.assertEqual(calendar.valid_through, date(2027, 12, 31))
+        finally:
+            nse_module.set_trading_calendar(None)
+
+    def test_watch_delay(self):
+        nse = Nse(transport=self.transport)
+        # Saturday noon and ten seconds before monday's session
+        self.assertEqual(nse.watch_delay(1, 60, now=datetime(2026, 10, 17, 12, 0)), 60)
+        self.assertEqual(nse.watch_delay(1, 60, now=datetime(2026, 10, 19, 9, 14, 50)), 10)
+        self.assertEqual(nse.watch_delay(1, 60, now=datetime(2026, 10, 19, 10, 0)), 1)
+
+    def test_coalesced_cold_start(self):
+        nse = Nse(transport=self.transport)
+        nse.trading_calendar()
+        served = len(self.server.cookies)
+        barrier = threading.Barrier(8)
+        results = []
+
+        def call():
+            barrier.wait()
+            results.append(nse.get_index_list())
+        threads = [threading.Thread(target=call) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertListEqual(results, [['NIFTY 50', 'NIFTY BANK']] * 8)
+        # A single request served every caller
+        self.assertEqual(len(self.server.cookies) - served, 1)
+        nse.close()
+
+    def test_retries(self):
+        from urllib.error import HTTPError
+        from nsetools.throttle import Throttle
+        throttle = Throttle(retries=2, backoff=0.01)
+        transport = Transport(timeout=5, base_url=self.server.url, throttle=throttle)
+        path = '/homepage/Indices1.json'
+        self.server.failures[path] = [(503, '0'), (429, '0')]
+        body = transport.fetch('http://www.nseindia.com' + path)
+        self.assertEqual(json.loads(body)['data'][0]['name'], 'NIFTY 50')
+        self.server.failures[path] = [(503, '0')] * 3
+        with self.assertRaises(HTTPError) as error:
+            transport.fetch('http://www.nseindia.com' + path)
+        self.assertEqual(error.exception.code, 503)
+        stats = throttle.stats()
+        self.assertEqual((stats['retries'], stats['throttled'], stats['in_flight']), (4, 5, 0))
+        transport.close()
+
+    def test_metrics(self):
+        from nsetools.metrics import Metrics
+        metrics = Metrics()
+        # Requests the holiday page, if the calendar is not built yet, over a transport left out of the metrics
+        Nse(transport=self.transport).trading_calendar()
+        nse = Nse(transport=Transport(timeout=5, base_url=self.server.url, metrics=metrics), metrics=metrics)
+        nse.get_quote('infy')
+        nse.get_quote('infy')
+        snapshot = metrics.snapshot()
+        self.assertEqual(snapshot['counters']['requests'], 2)
+        self.assertGreater(snapshot['counters']['body_bytes'], 0)
+        host = urlsplit(self.server.url).netloc
+        for span in ['dns:' + host, 'connect:' + host, 'ttfb:' + host, 'body:' + host, 'parse:quote', 'frame:quote']:
+            self.assertIn(span, snapshot['spans'])
+        self.assertEqual(snapshot['spans']['connect:' + host]['count'], 1)
+        self.assertEqual(snapshot['spans']['dns:' + host]['count'], 1)
+        self.assertEqual(snapshot['gauges']['cache_hits:' + nse.name], 1)
+        self.assertEqual(snapshot['gauges']['throttle_in_flight:' + nse.name], 0)
+        self.assertIn('nsetools_cache_hits{kind="%s"} 1\n' % nse.name, metrics.prometheus())
+        nse.close()
+        self.assertDictEqual(metrics.snapshot()['gauges'], {})
+
+    def test_metrics_do_not_keep_instances_alive(self):
+        import gc
+        import weakref
+        from nsetools.metrics import Metrics
+        metrics = Metrics()
+        instances = []
+        for _ in range(3):
+            nse = Nse(transport=self.transport, metrics=metrics)
+            instances.append(weakref.ref(nse))
+            del nse
+        gc.collect()
+        self.assertListEqual([instance() for instance in instances], [None] * 3)
+        self.assertDictEqual(metrics.snapshot()['gauges'], {})
+
+    def test_error_status(self):
+        from urllib.error import HTTPError
+        with self.assertRaises(HTTPError):
+            self.transport.fetch('http://www.nseindia.com/missing.json')
+
+    def test_nse_uses_transport(self):
+        nse = Nse(transport=self.transport)
+        self.assertEqual(nse.get_index_list(), ['NIFTY 50', 'NIFTY BANK'])
+
+class TestAsyncNse(unittest.TestCase):
+    def setUp(self):
+        self.server = StandInServer(STAND_IN_ROUTES)
+
+    def tearDown(self):
+        self.server.close()
+
+    def run_with_client(self, coroutine_function):
+        async def runner():
+            async with AsyncNse(transport=AsyncTransport(timeout=5, base_url=self.server.url), max_concurrency=2) as nse:
+                return await coroutine_function(nse)
+        return asyncio.run(runner())
+
+    def test_get_quote(self):
+        quotes = self.run_with_client(lambda nse: nse.get_quote('infy', 'INFY', 'inf'))
+        self.assertIsInstance(quotes, pd.DataFrame)
+        self.assertEqual(len(quotes), 2)
+        self.assertEqual(quotes.loc['INFY', 'lastPrice'].iloc[0], 1100.50)
+        json_quotes = self.run_with_client(lambda nse: nse.get_quote('infy', 'inf', as_json=True))
+        self.assertIsInstance(json_quotes[0], str)
+        self.assertIsNone(json_quotes[1])
+        # All the requests share one keep-alive connection per concurrent slot
+        self.assertLessEqual(len(self.server.client_ports), 4)
+
+    def test_transport_spans(self):
+        from nsetools.metrics import Metrics
+        metrics = Metrics()
+
+        async def fetch():
+            transport = AsyncTransport(timeout=5, base_url=self.server.url, metrics=metrics)
+            await transport.fetch('http://www.nseindia.com/homepage/Indices1.json')
+            await transport.close()
+        asyncio.run(fetch())
+        spans = metrics.snapshot()['spans']
+        host = urlsplit(self.server.url).netloc
+        # Resolving the host is timed apart from the connection
+        for span in ['dns:' + host, 'connect:' + host, 'ttfb:' + host, 'body:' + host]:
+            self.assertEqual(spans[span]['count'], 1)
+
+    def test_get_top_all(self):
+        results = self.run_with_client(lambda nse: nse.get_top_all('gainers', 'index list', 'volume', timeout=5))
+        self.assertIsInstance(results['gainers'], pd.DataFrame)
+        self.assertListEqual(results['index list'], ['NIFTY 50', 'NIFTY BANK'])
+        from urllib.error import HTTPError
+        self.assertIsInstance(results['volume'], HTTPError)
+
+    def test_retries(self):
+        self.server.failures['/homepage/Indices1.json'] = [(503, '0')]
+
+        async def check(nse):
+            self.assertEqual(await nse.get_index_list(), ['NIFTY 50', 'NIFTY BANK'])
+            return nse.throttle_stats()
+        stats = self.run_with_client(check)
+        self.assertEqual((stats['retries'], stats['throttled'], stats['in_flight']), (1, 1, 0))
+        # Halved from the default of 16
+        self.assertEqual(stats['concurrency_limit'], 8)
+
+    def test_watch(self):
+        async def check(nse):
+            watcher = nse.watch('INFY', 'junk', interval=0.01)
+            first = await watcher.__anext__()
+            self.assertEqual(first['INFY']['lastPrice'], 1100.50)
+            polled = asyncio.ensure_future(watcher.__anext__())
+            await asyncio.sleep(0.2)
+            # Nothing changed, so nothing is yielded
+            self.assertFalse(polled.done())
+            polled.cancel()
+            with self.assertRaises(asyncio.CancelledError):
+                await polled
+            await watcher.aclose()
+        with mock.patch.object(AsyncNse, 'trading_calendar', return_value=OpenCalendar([])):
+            self.run_with_client(check)
+        self.assertGreater(self.server.not_modified, 0)
+
+    def test_snapshot_all(self):
+        self.server.routes = dict(STAND_IN_ROUTES)
+        self.server.routes['/live_market/dynaContent/live_watch/get_quote/GetQuote.jsp'] = stand_in_quote
+        progress = []
+        snapshot = self.run_with_client(lambda nse: nse.snapshot_all(chunk_size=2, progress=lambda *done: progress.append(done)))
+        self.assertListEqual(snapshot.batch.symbols, ['20MICRONS', 'INFY'])
+        self.assertListEqual(snapshot.failed, ['3MINDIA'])
+        self.assertListEqual(progress, [(2, 3, 0), (3, 3, 1)])
+        snapshot = self.run_with_client(lambda nse: nse.snapshot_all('infy', 'junk', timeout=0))
+        self.assertIsInstance(snapshot.errors['INFY'], TimeoutError)
+        self.assertIsInstance(snapshot.errors['junk'], ValueError)
+
+    def test_trading_calendar(self):
+        from nsetools import nse as nse_module
+        self.server.routes = dict(STAND_IN_ROUTES)
+        self.server.routes['/products/content/equities/equities/mrkt_timing_holidays.htm'] = (
+            b'<tr><td>1</td><td>19-Oct-2026</td><td>Monday</td><td>Diwali</td></tr>')
+
+        async def check(nse):
+            # The holiday page is requested over the AsyncTransport, not by the blocking trading_calendar
+            with mock.patch('nsetools.nse.trading_calendar', side_effect=AssertionError('blocking call')):
+                self.assertListEqual(await nse.get_index_list(), ['NIFTY 50', 'NIFTY BANK'])
+                return nse.trading_calendar()
+        try:
+            nse_module.set_trading_calendar(None)
+            self.assertListEqual(self.run_with_client(check).holidays, [date(2026, 10, 19)])
+        finally:
+            nse_module.set_trading_calendar(None)
+        with self.assertRaises(TypeError):
+            with AsyncNse():
+                pass
+
+    def test_index(self):
+        async def check(nse):
+            self.assertEqual(await nse.get_index_list(), ['NIFTY 50', 'NIFTY BANK'])
+            self.assertTrue(await nse.is_valid_index('nifty 50'))
+            quote = await nse.get_index_quote('nifty 50')
+            self.assertEqual(quote['lastPrice'], 10000.50)
+            self.assertIsNone(await nse.get_index_quote('junk'))
+        self.run_with_client(check)
+
+class TestShardedNse(unittest.TestCase):
+    def setUp(self):
+        self.server = StandInServer(dict(STAND_IN_ROUTES))
+        self.server.routes['/live_market/dynaContent/live_watch/get_quote/GetQuote.jsp'] = stand_in_quote
+
+    def tearDown(self):
+        self.server.close()
+
+    def test_concat(self):
+        import numpy as np
+        from nsetools.quotes import QuoteBatch
+        first = QuoteBatch.from_quotes([{'symbol': 'INFY', 'lastPrice': 1100.5, 'change': None, 'series': 'EQ'}])
+        second = QuoteBatch.from_quotes([{'symbol': 'TCS', 'lastPrice': 2000.0, 'change': 'NA', 'series': 'EQ'}])
+        batch = QuoteBatch.concat([first, QuoteBatch.from_quotes([]), second])
+        self.assertListEqual(batch.symbols, ['INFY', 'TCS'])
+        self.assertEqual(batch.column('lastPrice').dtype, np.float64)
+        # Numeric in one batch, text in the other
+        self.assertListEqual(batch.column('change'), [None, 'NA'])
+        self.assertIs(batch.column('series')[0], batch.column('series')[1])
+
+    def test_sharded_fetch(self):
+        from nsetools.sharding import ShardedNse
+        progress = []
+        options = {'timeout': 5, 'base_url': self.server.url}
+        with ShardedNse(processes=2, transport_options=options) as sharded:
+            snapshot = sharded.snapshot_all(shard_size=1, progress=lambda *done: progress.append(done))
+            self.assertListEqual(snapshot.batch.symbols, ['20MICRONS', 'INFY'])
+            self.assertListEqual(snapshot.failed, ['3MINDIA'])
+            self.assertEqual(snapshot.batch.column('lastPrice')[1], 1100.50)
+            self.assertListEqual([done for done, _, _ in progress], [1, 2, 3])
+
+            snapshot = sharded.snapshot_all('infy', 'junk')
+            self.assertListEqual(snapshot.batch.symbols, ['INFY'])
+            self.assertIsInstance(snapshot.errors['junk'], ValueError)
+
+            peers = sharded.get_peer_companies_many('infy', 'junk', '20microns')
+            self.assertListEqual(list(peers['symbol']), ['INFY', '20MICRONS'])
+
+            history = sharded.get_history(('infy', '01-01-2010', '31-01-2010'), ('junk', '01-01-2010', '31-01-2010'))
+            self.assertEqual(len(history[0]), 2)
+            self.assertIsNone(history[1])
+
+    def test_sharded_limits(self):
+        from nsetools.sharding import ShardedNse
+        options = {'timeout': 5, 'base_url': self.server.url}
+        with ShardedNse(processes=2, max_concurrency=8, rate=10, transport_options=options) as sharded:
+            # The limits are those of the whole pool, every worker gets half
+            self.assertDictEqual(sharded.throttle_options, {'max_concurrency': 4, 'rate': 5.0})
+            self.assertEqual(sharded.nse_options['max_workers'], 4)
+        with ShardedNse(processes=4, max_concurrency=2, transport_options=options) as sharded:
+            # More processes than requests in flight would go over max_concurrency
+            self.assertEqual(sharded.processes, 2)
+            self.assertEqual(sharded.throttle_options['max_concurrency'], 1)
+
+class TestImport(unittest.TestCase):
+    def test_import_is_lazy_and_offline(self):
+        # Importing the package must neither touch the network nor load the heavy dependencies
+        script = (
+            "import socket, sys\n"
+            "def fail(*args, **kwargs): raise AssertionError('network access during import')\n"
+            "socket.socket.connect = fail\n"
+            "import nsetools\n"
+            "print(','.join(m for m in ('pandas', 'numpy', 'bs4', 'dateutil') if m in sys.modules))\n"
+        )
+        output = subprocess.check_output([sys.executable, '-c', script],
+                                         cwd=os.path.dirname(os.path.abspath(__file__)))
+        self.assertEqual(output.decode().strip(), '')
+
 if __name__ == '__main__':
     unittest.main()
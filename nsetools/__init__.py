@@ -25,3 +25,5 @@ __VERSION__='1.1.1'
 __author__ = 'Arkoprabho Chakraborti'
 project_url = 'https://github.com/Arkoprabho/nsetools3'
 from .nse import Nse
+from .async_nse import AsyncNse
+from .sharding import ShardedNse
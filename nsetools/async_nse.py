@@ -0,0 +1,383 @@
+"""
+Contains the asyncio version of the core APIs
+"""
+import io
+import asyncio
+
+from time import monotonic
+
+from nsetools.nse import Nse, nse_holidays, calendar_is_stale, install_trading_holidays, loaded_trading_calendar
+from nsetools.cache import instance_cache
+from nsetools.symbols import SymbolIndex
+from nsetools.quotes import QuoteBatch
+from nsetools.net_utils import AsyncTransport
+from nsetools.throttle import Throttle
+from nsetools.trading_calendar import TradingCalendar
+
+
+class AsyncNse(Nse):
+    """
+    asyncio client for National Stock Exchange.
+    The methods making network requests are coroutines mirroring those of Nse,
+    while building urls, parsing and cleaning the responses is shared with Nse.
+    """
+    def __init__(self, cache_size=64, cache_memory=64 * 1024 * 1024, cache_ttl=5, transport=None, max_concurrency=16,
+                 history_store=None, throttle=None, metrics=None, name=None):
+        """
+        Initializes a new instance of the AsyncNse class.
+        :Parameters:
+            cache_size, cache_memory, cache_ttl: (optional) same as for Nse
+            transport: (optional) net_utils.AsyncTransport to send the requests over.
+            Defaults to a new transport owned by this instance.
+            max_concurrency: (optional) maximum number of requests in flight at any time
+            history_store: (optional) same as for Nse
+            throttle: (optional) same as for Nse, defaulting to one allowing max_concurrency requests in flight
+            metrics: (optional) same as for Nse
+            name: (optional) same as for Nse
+        """
+        transport = transport or AsyncTransport(throttle=throttle or Throttle(max_concurrency=max_concurrency), metrics=metrics)
+        super().__init__(cache_size, cache_memory, cache_ttl, transport=transport, history_store=history_store,
+                         metrics=metrics, name=name)
+        self.max_concurrency = max_concurrency
+        self.__semaphore__ = asyncio.Semaphore(max_concurrency)
+        self.__calendar_lock__ = asyncio.Lock()
+
+    async def read(self, url):
+        """
+        Requests the url, waiting while max_concurrency requests are already in flight
+        :returns: bytes of the response
+        """
+        async with self.__semaphore__:
+            return await self.transport.fetch(url, self.headers)
+
+    async def read_text(self, url):
+        """
+        :returns: the response decoded the same way as net_utils.read_url
+        """
+        return (await self.read(url)).decode('latin-1')
+
+    async def close(self):
+        """
+        Closes the connections kept alive by the transport
+        """
+        self.metrics.unregister(self.cache_stats)
+        self.metrics.unregister(self.throttle_stats)
+        await self.transport.close()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    def __enter__(self):
+        raise TypeError('AsyncNse is closed by a coroutine, use async with instead of with')
+
+    def __exit__(self, *exc_info):
+        pass
+
+    async def get_trading_calendar(self):
+        """
+        Loads the trading calendar, requesting the holiday page over the AsyncTransport
+        instead of blocking the event loop. See nse.trading_calendar
+        :returns: trading_calendar.TradingCalendar
+        """
+        if calendar_is_stale():
+            async with self.__calendar_lock__:
+                if calendar_is_stale():
+                    holidays = nse_holidays()
+                    try:
+                        async with self.__semaphore__:
+                            page = await self.transport.fetch(holidays.holiday_url, holidays.headers)
+                        trading_holidays = holidays.parse_trading_holidays(holidays.parse_holiday_page(page))
+                    except Exception:
+                        trading_holidays = None
+                    install_trading_holidays(trading_holidays)
+        return self.trading_calendar()
+
+    def trading_calendar(self):
+        """
+        :returns: the trading calendar loaded by get_trading_calendar. Never requests the holiday page,
+            which would block the event loop. Till it is loaded, a calendar knowing only the weekends stands in.
+        """
+        return loaded_trading_calendar() or TradingCalendar([])
+
+    async def __cache_expiry__(self, live):
+        await self.get_trading_calendar()
+        return Nse.__cache_expiry__(self, live)
+
+    async def __off_loop__(self, function, *args):
+        # The history store reads and writes a SQLite file, which is left to the default executor
+        if self.history_store is None:
+            return function(*args)
+        return await asyncio.get_running_loop().run_in_executor(None, function, *args)
+
+    @instance_cache(live=False)
+    async def get_stock_codes(self):
+        """
+        Retreives the equity list from NSE, and stores it in a dataframe.
+        :return: pandas DataFrame
+        """
+        return self.parse_stock_codes(io.BytesIO(await self.read(self.stocks_csv_url)))
+
+    @instance_cache(live=False)
+    async def get_symbol_index(self):
+        """
+        :returns: symbols.SymbolIndex of the equity list
+        """
+        return SymbolIndex.from_csv(io.BytesIO(await self.read(self.stocks_csv_url)))
+
+    async def is_valid_code(self, code):
+        """
+        :param code: a string stock code
+        :return: bool
+        """
+        if code:
+            return (await self.get_symbol_index()).is_valid(code)
+
+    async def validate_codes(self, codes):
+        """
+        :returns: tuple of the set of valid and the set of invalid codes, as they were passed
+        """
+        return (await self.get_symbol_index()).validate(codes)
+
+    @instance_cache(live=True)
+    async def get_quote(self, *codes, as_json=False):
+        """
+        gets the quote for the given stock codes concurrently
+        :return: pandas DataFrame with quotes of all companies codes passed.
+        :raises: HTTPError
+        """
+        valid_codes, _ = await self.validate_codes(codes)
+
+        async def __get_quote__(code):
+            if code in valid_codes:
+                page = await self.read_text(self.build_url_for_quote(code.upper()))
+                return self.parse_quote(page, as_json)
+        quotes = await asyncio.gather(*[__get_quote__(code) for code in codes])
+        return self.render_quotes(quotes, as_json)
+
+    @instance_cache(live=True)
+    async def get_quote_batch(self, *codes):
+        """
+        gets the quotes for the given stock codes concurrently, held compactly column by column
+        :return: quotes.QuoteBatch of the valid codes
+        """
+        valid_codes, _ = await self.validate_codes(codes)
+        symbols = list(dict.fromkeys(code.upper() for code in codes if code in valid_codes))
+
+        async def __get_quote__(symbol):
+            return self.parse_quote(await self.read_text(self.build_url_for_quote(symbol)))
+        return QuoteBatch.from_quotes(await asyncio.gather(*[__get_quote__(symbol) for symbol in symbols]))
+
+    async def watch(self, *codes, interval=1, closed_interval=60):
+        """
+        Polls the quotes of the given stock codes and yields only what changed. See Nse.watch
+        :returns: async generator of dicts of symbol -> dict of the fields that changed since the previous poll
+        """
+        valid_codes, _ = await self.validate_codes(codes)
+        symbols = list(dict.fromkeys(code.upper() for code in codes if code in valid_codes))
+        validators, quotes = {}, {}
+
+        async def __poll__(symbol):
+            async with self.__semaphore__:
+                body, validators[symbol] = await self.transport.fetch_if_modified(
+                    self.build_url_for_quote(symbol), self.headers, validators.get(symbol))
+            if body is not None:
+                return self.parse_watched_quote(body)
+        while True:
+            started = monotonic()
+            await self.get_trading_calendar()
+            changes = self.quote_changes(quotes, symbols, await asyncio.gather(*[__poll__(symbol) for symbol in symbols]))
+            if changes:
+                yield changes
+            await asyncio.sleep(max(0, self.watch_delay(interval, closed_interval) - (monotonic() - started)))
+
+    async def snapshot_all(self, *codes, chunk_size=100, timeout=None, progress=None):
+        """
+        Quotes the whole equity list (or the given stock codes) in chunks, keeping the quotes of the symbols
+        that succeed when others fail. See Nse.snapshot_all
+        :returns: quotes.Snapshot with the quotes fetched and the error of every symbol that was not
+        """
+        started = monotonic()
+        symbols, errors = self.snapshot_symbols(codes, await self.get_symbol_index())
+        deadline = None if timeout is None else started + timeout
+        quotes = {}
+
+        async def __get_quote__(symbol):
+            return self.parse_quote(await self.read_text(self.build_url_for_quote(symbol)))
+        for start in range(0, len(symbols), chunk_size):
+            chunk = symbols[start:start + chunk_size]
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0:
+                self.snapshot_timed_out(errors, symbols[start:], timeout)
+                break
+            tasks = {asyncio.ensure_future(__get_quote__(symbol)): symbol for symbol in chunk}
+            done, pending = await asyncio.wait(tasks, timeout=remaining)
+            for task in done:
+                self.snapshot_result(quotes, errors, tasks[task], task.exception() or task.result())
+            for task in pending:
+                task.cancel()
+            if pending:
+                await asyncio.gather(*pending, return_exceptions=True)
+                self.snapshot_timed_out(errors, [tasks[task] for task in pending], timeout)
+            if progress is not None:
+                progress(min(start + chunk_size, len(symbols)), len(symbols), len(errors))
+        return self.render_snapshot(symbols, quotes, errors, started)
+
+    @instance_cache(live=True)
+    async def get_history(self, *codes_dates, as_json=False):
+        """
+        Gets the historical data between the given date range (inclusive of both).
+        Accepts the same tuples of code, from_date and to_date as Nse.get_history
+        :returns: a pandas dataframe indexed by date containing the history of the symbol in the given date range
+        """
+        valid_codes, _ = await self.validate_codes(code_date[0] for code_date in codes_dates)
+        await self.get_trading_calendar()
+
+        async def __get_history__(code_date):
+            if code_date[0] in valid_codes:
+                plan = await self.__off_loop__(self.history_plan, code_date)
+                gap_pages = await asyncio.gather(*[asyncio.gather(*[self.read_text(url) for url in gap_urls])
+                                                   for _, _, gap_urls in plan])
+                return await self.__off_loop__(self.combine_history, code_date, plan, gap_pages, as_json)
+        quotes = await asyncio.gather(*[__get_history__(code_date) for code_date in codes_dates])
+        if len(quotes) == 1:
+            return quotes[0]
+        return list(quotes)
+
+    @instance_cache(live=False)
+    async def get_peer_companies(self, code, as_json=False):
+        """
+        :returns: pandas DataFrame | json of the peer companies
+        """
+        code = code.upper()
+        if await self.is_valid_code(code):
+            page = await self.read_text(self.peer_companies_url + code)
+            return self.parse_peer_companies(page, as_json)
+
+    async def get_peer_companies_many(self, *codes, as_json=False):
+        """
+        Gets the peer companies of many companies concurrently. See Nse.get_peer_companies_many
+        :returns: pandas DataFrame | json of all the peers
+        """
+        valid_codes, _ = await self.validate_codes(codes)
+        remaining = list(dict.fromkeys(code.upper() for code in codes if code in valid_codes))
+        groups, covered = {}, set()
+        while remaining:
+            wave, remaining = remaining[:self.max_concurrency], remaining[self.max_concurrency:]
+            frames = await asyncio.gather(*[self.get_peer_companies(code) for code in wave])
+            for code, frame in zip(wave, frames):
+                groups[code] = frame
+                if frame is not None and 'symbol' in frame.columns:
+                    covered.update(str(symbol).upper() for symbol in frame['symbol'])
+            remaining = [code for code in remaining if code not in covered]
+        return self.combine_peer_groups(groups, as_json)
+
+    async def get_top(self, *options, as_json=False):
+        """
+        Gets the top list of the arguments specified. See Nse.get_top for the options.
+        :Returns: async generator over the data requested
+        """
+        possible_options = self.top_options()
+        for item in options:
+            function_to_call = possible_options.get(item.upper())
+            if function_to_call is not None:
+                yield await function_to_call(as_json)
+
+    async def get_top_as_completed(self, *options, as_json=False, timeout=None):
+        """
+        Gets the top lists of all the options concurrently. See Nse.get_top_as_completed
+        :Returns: async generator of (option, result) tuples in the order the options finish
+        """
+        async def __get_top__(item, function_to_call):
+            try:
+                return item, await asyncio.wait_for(function_to_call(as_json), timeout)
+            except asyncio.TimeoutError:
+                return item, TimeoutError('%s did not finish within %s seconds' % (item, timeout))
+            except Exception as error:
+                return item, error
+
+        possible_options = self.top_options()
+        calls = [__get_top__(item, possible_options[item.upper()]) for item in options if item.upper() in possible_options]
+        for next_done in asyncio.as_completed(calls):
+            yield await next_done
+
+    async def get_top_all(self, *options, as_json=False, timeout=None):
+        """
+        :Returns: dict of option -> result, or the exception for the options that failed or timed out
+        """
+        return {item: result async for item, result in self.get_top_as_completed(*options, as_json=as_json, timeout=timeout)}
+
+    @instance_cache(live=True)
+    async def get_top_gainers(self, as_json=False):
+        """
+        :return: pandas DataFrame | JSON containing top gainers of the day
+        """
+        return self.parse_top_list(await self.read(self.top_gainer_url), 'symbol', as_json)
+
+    @instance_cache(live=True)
+    async def get_top_losers(self, as_json=False):
+        """
+        :return: pandas DataFrame | JSON containing top losers of the day
+        """
+        return self.parse_top_list(await self.read(self.top_loser_url), 'symbol', as_json)
+
+    @instance_cache(live=True)
+    async def get_top_volume(self, as_json=False):
+        """
+        :return: pandas DataFrame | JSON containing top volume gainers of the day
+        """
+        return self.parse_top_list(await self.read(self.top_volume_url), 'sym', as_json)
+
+    @instance_cache(live=True)
+    async def get_most_active(self, as_json=False):
+        """
+        :return: pandas DataFrame | JSON containing most active equites of the day
+        """
+        return self.parse_top_list(await self.read(self.most_active_url), 'symbol', as_json)
+
+    @instance_cache(live=True)
+    async def get_advances_declines(self, as_json=False):
+        """
+        :return: pandas DataFrame | JSON with advance decline data
+        """
+        return self.parse_top_list(await self.read(self.advances_declines_url), 'indice', as_json)
+
+    @instance_cache(live=True)
+    async def get_index_snapshot(self):
+        """
+        :returns: indices.IndexSnapshot of every index, fetched in a single request
+        """
+        return self.parse_index_snapshot(await self.read(self.index_url))
+
+    async def get_index_list(self, as_json=False):
+        """
+        returns: a list | json of index codes
+        """
+        return self.render_response((await self.get_index_snapshot()).names, as_json)
+
+    async def is_valid_index(self, code):
+        """
+        returns: True | False , based on whether code is valid
+        """
+        return code in await self.get_index_snapshot()
+
+    async def get_index_quote(self, code, as_json=False):
+        """
+        returns: a dict | json quote for the given index
+        """
+        return self.render_index_quote(await self.get_index_snapshot(), code, as_json)
+
+    async def get_index_quotes(self, *codes, as_json=False):
+        """
+        returns: pandas DataFrame indexed by name | list of json quotes, None for invalid codes
+        """
+        return self.render_index_quotes(await self.get_index_snapshot(), codes, as_json)
+
+    def __str__(self):
+        """
+        string representation of object
+        :return: string
+        """
+        return 'Async Driver Class for National Stock Exchange (NSE)'
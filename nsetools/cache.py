@@ -0,0 +1,262 @@
+"""
+Contains the per instance cache used to store responses from NSE
+"""
+import sys
+import time
+import asyncio
+import inspect
+import threading
+
+from collections import OrderedDict
+from concurrent.futures import Future
+from functools import wraps
+
+
+def approximate_size(value):
+    """
+    Approximates the memory held by a cached value
+    :Parameters:
+    value: object
+        The value to measure. DataFrames are measured deeply, containers one level deep.
+    :returns: int size in bytes
+    """
+    # Avoid importing pandas just to check the type
+    if hasattr(value, 'memory_usage'):
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum()) if hasattr(usage, 'sum') else int(usage)
+    size = sys.getsizeof(value)
+    if isinstance(value, dict):
+        size += sum(sys.getsizeof(k) + sys.getsizeof(v) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(sys.getsizeof(item) for item in value)
+    return size
+
+
+class SingleFlight():
+    """
+    Collapses concurrent calls made with the same key into one.
+    The first caller (the leader) makes the call, while the callers arriving before it finishes
+    wait for its result. If the call raises, the exception is raised to every one of them.
+    """
+    def __init__(self):
+        self.__calls__ = {}
+        self.__async_calls__ = {}
+        self.__lock__ = threading.Lock()
+        self.coalesced = 0
+
+    def do(self, key, function):
+        """
+        :Parameters:
+        key: hashable identifying the call
+        function: callable taking no arguments, called by the leader
+        :returns: the return value of the leader's call
+        """
+        with self.__lock__:
+            call = self.__calls__.get(key)
+            leader = call is None
+            if leader:
+                call = self.__calls__[key] = Future()
+            else:
+                self.coalesced += 1
+        if not leader:
+            return call.result()
+        try:
+            result = function()
+        except BaseException as error:
+            call.set_exception(error)
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            with self.__lock__:
+                del self.__calls__[key]
+
+    async def do_async(self, key, coroutine_function):
+        """
+        asyncio counterpart of do, for calls made from the same event loop
+        :Parameters:
+        key: hashable identifying the call
+        coroutine_function: coroutine function taking no arguments, awaited by the leader
+        :returns: the return value of the leader's call
+        """
+        call = self.__async_calls__.get(key)
+        if call is not None:
+            self.coalesced += 1
+            # A follower being cancelled must not cancel the leader's call
+            return await asyncio.shield(call)
+        call = self.__async_calls__[key] = asyncio.get_running_loop().create_future()
+        try:
+            result = await coroutine_function()
+        except asyncio.CancelledError:
+            call.cancel()
+            raise
+        except BaseException as error:
+            call.set_exception(error)
+            # Mark the exception as retrieved, there may be no followers
+            call.exception()
+            raise
+        else:
+            call.set_result(result)
+            return result
+        finally:
+            del self.__async_calls__[key]
+
+    def __len__(self):
+        return len(self.__calls__) + len(self.__async_calls__)
+
+
+class ResponseCache():
+    """
+    A thread safe LRU cache whose entries expire at a given time.
+    The cache is bounded both by the number of entries and the approximate memory of the values.
+    """
+    def __init__(self, maxsize=64, max_bytes=64 * 1024 * 1024):
+        """
+        :Parameters:
+        maxsize: int
+            The maximum number of entries to hold
+        max_bytes: int
+            The maximum approximate memory (in bytes) of all the values held
+        """
+        self.maxsize = maxsize
+        self.max_bytes = max_bytes
+        self.__entries__ = OrderedDict()
+        self.__bytes__ = 0
+        self.__lock__ = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        # Collapses the concurrent computations of a missing entry
+        self.in_flight = SingleFlight()
+
+    def get(self, key, default=None):
+        """
+        :returns: the value stored against the key, or default if it is missing or has expired
+        """
+        with self.__lock__:
+            entry = self.__entries__.get(key)
+            if entry is not None:
+                value, expires_at, _ = entry
+                if expires_at is None or expires_at > time.time():
+                    self.__entries__.move_to_end(key)
+                    self.hits += 1
+                    return value
+                self.__remove__(key)
+                self.expirations += 1
+            self.misses += 1
+            return default
+
+    def peek(self, key, default=None):
+        """
+        :returns: the value stored against the key, or default if it is missing or has expired,
+            without counting a hit or a miss
+        """
+        with self.__lock__:
+            entry = self.__entries__.get(key)
+            if entry is not None and (entry[1] is None or entry[1] > time.time()):
+                return entry[0]
+            return default
+
+    def put(self, key, value, expires_at=None):
+        """
+        Stores the value against the key
+        :Parameters:
+        expires_at: float
+            epoch time after which the entry is no longer served. None means it never expires.
+        """
+        size = approximate_size(value)
+        with self.__lock__:
+            if key in self.__entries__:
+                self.__remove__(key)
+            if size > self.max_bytes or self.maxsize <= 0:
+                # Would evict everything else and still not fit
+                return
+            self.__entries__[key] = (value, expires_at, size)
+            self.__bytes__ += size
+            while len(self.__entries__) > self.maxsize or self.__bytes__ > self.max_bytes:
+                oldest = next(iter(self.__entries__))
+                self.__remove__(oldest)
+                self.evictions += 1
+
+    def clear(self):
+        """
+        Removes all the entries. The statistics are left untouched.
+        """
+        with self.__lock__:
+            self.__entries__.clear()
+            self.__bytes__ = 0
+
+    def stats(self):
+        """
+        :returns: dict with the hits, misses, evictions, expirations, coalesced calls, entries and bytes held
+        """
+        with self.__lock__:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'coalesced': self.in_flight.coalesced,
+                'entries': len(self.__entries__),
+                'bytes': self.__bytes__
+            }
+
+    def __remove__(self, key):
+        _, _, size = self.__entries__.pop(key)
+        self.__bytes__ -= size
+
+    def __len__(self):
+        return len(self.__entries__)
+
+
+__MISSING__ = object()
+
+def instance_cache(live=True):
+    """
+    Caches the return value of a method in the cache owned by the instance (self.cache).
+    The instance decides how long an entry lives through self.__cache_expiry__(live).
+    Concurrent calls missing the same entry are collapsed into one through self.cache.in_flight.
+    :Parameters:
+    live: bool
+        Whether the data changes during market hours. Live data gets a short time to live while the market is open.
+    """
+    def decorator(f):
+        if inspect.iscoroutinefunction(f):
+            @wraps(f)
+            async def async_wrapper(self, *args, **kwargs):
+                key = (f.__name__, args, tuple(sorted(kwargs.items())))
+                value = self.cache.get(key, __MISSING__)
+                if value is __MISSING__:
+                    async def compute():
+                        # The entry may have been stored since it was found missing
+                        value = self.cache.peek(key, __MISSING__)
+                        if value is __MISSING__:
+                            value = await f(self, *args, **kwargs)
+                            expires_at = self.__cache_expiry__(live)
+                            if inspect.isawaitable(expires_at):
+                                # Working out the expiry may need a request of its own
+                                expires_at = await expires_at
+                            self.cache.put(key, value, expires_at)
+                        return value
+                    value = await self.cache.in_flight.do_async(key, compute)
+                return value
+            return async_wrapper
+
+        @wraps(f)
+        def wrapper(self, *args, **kwargs):
+            key = (f.__name__, args, tuple(sorted(kwargs.items())))
+            value = self.cache.get(key, __MISSING__)
+            if value is __MISSING__:
+                def compute():
+                    # The entry may have been stored since it was found missing
+                    value = self.cache.peek(key, __MISSING__)
+                    if value is __MISSING__:
+                        value = f(self, *args, **kwargs)
+                        self.cache.put(key, value, self.__cache_expiry__(live))
+                    return value
+                value = self.cache.in_flight.do(key, compute)
+            return value
+        return wrapper
+    return decorator
@@ -0,0 +1,162 @@
+"""
+Contains the on disk store of the history of symbols, so that only missing dates are fetched
+"""
+import sqlite3
+import threading
+
+from datetime import date, timedelta
+
+
+class HistoryStore():
+    """
+    Stores the daily history of symbols in a SQLite database, one row per symbol and date
+    with a column for every field returned by NSE.
+    Alongside the rows, it remembers which date ranges have been fetched,
+    so that holidays are not mistaken for missing data.
+    """
+    __SYMBOL__ = 'key_symbol'
+    __DATE__ = 'key_date'
+
+    def __init__(self, path):
+        """
+        :Parameters:
+        path: str
+            The SQLite database file. It is created if it does not exist.
+        """
+        self.path = path
+        self.__lock__ = threading.Lock()
+        with self.__connect__() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS history ('
+                               'key_symbol TEXT NOT NULL, key_date TEXT NOT NULL, '
+                               'PRIMARY KEY (key_symbol, key_date))')
+            connection.execute('CREATE TABLE IF NOT EXISTS coverage ('
+                               'key_symbol TEXT NOT NULL, range_start TEXT NOT NULL, range_end TEXT NOT NULL)')
+
+    def missing(self, symbol, start, end):
+        """
+        Works out the date ranges that have not been fetched yet
+        :Parameters:
+        symbol: str
+        start, end: datetime.date
+            The range requested, inclusive of both
+        :returns: list of (start, end) tuples of datetime.date to fetch, in order
+        """
+        gaps = []
+        for covered_start, covered_end in self.coverage(symbol):
+            if covered_end < start:
+                continue
+            if covered_start > end:
+                break
+            if covered_start > start:
+                gaps.append((start, covered_start - timedelta(days=1)))
+            start = max(start, covered_end + timedelta(days=1))
+        if start <= end:
+            gaps.append((start, end))
+        return gaps
+
+    def coverage(self, symbol):
+        """
+        :returns: sorted list of (start, end) tuples of datetime.date that have been fetched for the symbol
+        """
+        with self.__connect__() as connection:
+            rows = connection.execute('SELECT range_start, range_end FROM coverage WHERE key_symbol = ? ORDER BY range_start',
+                                      (symbol.upper(),)).fetchall()
+        return [(date.fromisoformat(start), date.fromisoformat(end)) for start, end in rows]
+
+    def append(self, symbol, history_df, start, end):
+        """
+        Stores the history fetched for a date range, replacing any rows already stored in the range.
+        Today is never marked as fetched, since its data changes till the market closes.
+        :Parameters:
+        symbol: str
+        history_df: pandas DataFrame
+            The history as returned by Nse.parse_history, indexed by date
+        start, end: datetime.date
+            The range that was requested, inclusive of both
+        """
+        symbol = symbol.upper()
+        with self.__lock__, self.__connect__() as connection:
+            connection.execute('DELETE FROM history WHERE key_symbol = ? AND key_date BETWEEN ? AND ?',
+                               (symbol, start.isoformat(), end.isoformat()))
+            if not history_df.empty:
+                rows = history_df.reset_index()
+                rows = rows.rename(columns={rows.columns[0]: self.__DATE__})
+                rows[self.__DATE__] = rows[self.__DATE__].dt.strftime('%Y-%m-%d')
+                rows.insert(0, self.__SYMBOL__, symbol)
+                self.__add_columns__(connection, rows.columns)
+                rows.to_sql('history', connection, if_exists='append', index=False)
+            end = min(end, date.today() - timedelta(days=1))
+            if start <= end:
+                self.__cover__(connection, symbol, start, end)
+
+    def load(self, symbol, start, end):
+        """
+        :Parameters:
+        symbol: str
+        start, end: datetime.date
+            The range to load, inclusive of both
+        :returns: pandas DataFrame indexed by date, in the same shape as Nse.parse_history
+        """
+        import pandas as pd
+
+        with self.__connect__() as connection:
+            history_df = pd.read_sql_query(
+                'SELECT * FROM history WHERE key_symbol = ? AND key_date BETWEEN ? AND ? ORDER BY key_date',
+                connection, params=(symbol.upper(), start.isoformat(), end.isoformat()))
+        history_df = history_df.drop(columns=[self.__SYMBOL__])
+        history_df[self.__DATE__] = pd.to_datetime(history_df[self.__DATE__])
+        history_df = history_df.set_index(self.__DATE__).rename_axis('Date')
+        # Columns added for other symbols are empty for this one
+        return history_df.dropna(axis=1, how='all')
+
+    def __add_columns__(self, connection, columns):
+        """
+        Adds the columns the history table does not have yet
+        """
+        existing = {row[1].lower() for row in connection.execute('PRAGMA table_info(history)')}
+        for column in columns:
+            if column.lower() not in existing:
+                connection.execute('ALTER TABLE history ADD COLUMN "%s"' % column.replace('"', '""'))
+                existing.add(column.lower())
+
+    def __cover__(self, connection, symbol, start, end):
+        """
+        Marks the range as fetched, merging it with the overlapping and adjacent ranges
+        """
+        ranges = [(date.fromisoformat(s), date.fromisoformat(e)) for s, e in connection.execute(
+            'SELECT range_start, range_end FROM coverage WHERE key_symbol = ?', (symbol,))]
+        ranges.append((start, end))
+        ranges.sort()
+        merged = [ranges[0]]
+        for range_start, range_end in ranges[1:]:
+            last_start, last_end = merged[-1]
+            if range_start <= last_end + timedelta(days=1):
+                merged[-1] = (last_start, max(last_end, range_end))
+            else:
+                merged.append((range_start, range_end))
+        connection.execute('DELETE FROM coverage WHERE key_symbol = ?', (symbol,))
+        connection.executemany('INSERT INTO coverage VALUES (?, ?, ?)',
+                               [(symbol, s.isoformat(), e.isoformat()) for s, e in merged])
+
+    def __connect__(self):
+        return _Connection(self.path)
+
+
+class _Connection():
+    """
+    sqlite3 connection that commits (or rolls back) and closes when used as a context manager
+    """
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+
+    def __enter__(self):
+        return self.connection
+
+    def __exit__(self, exc_type, *_):
+        try:
+            if exc_type is None:
+                self.connection.commit()
+            else:
+                self.connection.rollback()
+        finally:
+            self.connection.close()
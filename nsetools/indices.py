@@ -0,0 +1,77 @@
+"""
+Contains the snapshot of all the indices served by NSE in a single payload
+"""
+import json
+
+from datetime import datetime
+
+from nsetools.utils import clean_dict, clean_frame
+
+
+class IndexSnapshot():
+    """
+    Every index quote from one Indices1.json payload, cleaned once and keyed by name
+    """
+    def __init__(self, records, fetched_at=None):
+        """
+        :Parameters:
+        records: list
+            The raw dicts under 'data' in Indices1.json
+        fetched_at: datetime
+            (optional) When the payload was fetched. Defaults to now.
+        """
+        self.fetched_at = fetched_at or datetime.now()
+        self.__records__ = records
+        self.__cleaned__ = [clean_dict(record) for record in records]
+        self.__quotes__ = {str(quote['name']).upper(): quote for quote in self.__cleaned__}
+        self.__frame__ = None
+
+    @classmethod
+    def from_json(cls, body, fetched_at=None):
+        """
+        :Parameters:
+        body: bytes | str of the Indices1.json response
+        :returns: IndexSnapshot
+        """
+        return cls(json.loads(body)['data'], fetched_at)
+
+    @property
+    def names(self):
+        """
+        list of the index names, in the order they were served
+        """
+        return [str(record['name']) for record in self.__records__]
+
+    @property
+    def age(self):
+        """
+        seconds since the payload was fetched
+        """
+        return (datetime.now() - self.fetched_at).total_seconds()
+
+    def quote(self, code):
+        """
+        :returns: dict quote of the index, or None if there is no such index
+        """
+        return self.__quotes__.get(code.upper())
+
+    def quotes(self, *codes):
+        """
+        :returns: list of dict quotes of the indices, None for the codes that are not indices
+        """
+        return [self.quote(code) for code in codes]
+
+    def frame(self):
+        """
+        :returns: pandas DataFrame of every index indexed by name, built once from the cleaned quotes.
+            It is shared by every call, so it must not be modified in place.
+        """
+        if self.__frame__ is None:
+            self.__frame__ = clean_frame(self.__records__, self.__cleaned__).set_index('name')
+        return self.__frame__
+
+    def __contains__(self, code):
+        return isinstance(code, str) and code.upper() in self.__quotes__
+
+    def __len__(self):
+        return len(self.__quotes__)
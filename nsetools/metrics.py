@@ -0,0 +1,254 @@
+"""
+Contains the optional instrumentation of the hot paths: spans, counters and their exporters
+"""
+import threading
+import weakref
+
+from time import perf_counter
+
+
+class Metrics():
+    """
+    Collects the time spent in the spans of the hot paths (resolving the host, connecting, waiting for
+    the first byte, reading the body, parsing, cleaning and building frames) along with counters, and
+    hands every span to the callbacks subscribed.
+    Spans and counters are aggregated by name and kind. Other attributes only reach the callbacks.
+    """
+    enabled = True
+    # Upper bounds (in seconds) of the histogram buckets of the spans
+    BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+
+    def __init__(self, buckets=BUCKETS):
+        """
+        :Parameters:
+        buckets: tuple
+            (optional) Sorted upper bounds of the histogram buckets, in seconds
+        """
+        self.buckets = tuple(buckets)
+        self.__callbacks__ = []
+        self.__collectors__ = []
+        self.__spans__ = {}
+        self.__counters__ = {}
+        self.__lock__ = threading.Lock()
+
+    def subscribe(self, callback):
+        """
+        :Parameters:
+        callback: callable
+            Called with the name, seconds and dict of attributes (including the kind) of every span,
+            on the thread that ran the span
+        """
+        self.__callbacks__ = self.__callbacks__ + [callback]
+
+    def unsubscribe(self, callback):
+        self.__callbacks__ = [subscribed for subscribed in self.__callbacks__ if subscribed is not callback]
+
+    def register(self, prefix, collector, kind=None):
+        """
+        Exports the values returned by the collector as gauges, read whenever a snapshot is taken.
+        Bound methods are held weakly, so that registering one does not keep its object alive.
+        :Parameters:
+        prefix: str
+            Prepended to the names of the values
+        collector: callable
+            returning a dict of name -> number
+        kind: str
+            (optional) Tells apart the gauges of collectors registered with the same prefix, e.g. one per Nse
+        """
+        if hasattr(collector, '__self__') and hasattr(collector, '__func__'):
+            reference = weakref.WeakMethod(collector)
+        else:
+            reference = lambda: collector
+        with self.__lock__:
+            self.__collectors__ = self.__collectors__ + [(prefix, kind, reference)]
+
+    def unregister(self, collector):
+        """
+        Stops exporting the gauges of the collector
+        """
+        with self.__lock__:
+            self.__collectors__ = [(prefix, kind, reference) for prefix, kind, reference in self.__collectors__
+                                   if reference() not in (None, collector)]
+
+    def span(self, name, kind=None, **attributes):
+        """
+        :returns: a context manager timing the code it wraps.
+            More attributes can be added while it runs through its set method.
+        """
+        return _Span(self, name, kind, attributes)
+
+    def record(self, name, seconds, kind=None, **attributes):
+        """
+        Records a span that has already been timed
+        """
+        with self.__lock__:
+            span = self.__spans__.get((name, kind))
+            if span is None:
+                span = self.__spans__[(name, kind)] = [0, 0.0, 0.0, [0] * len(self.buckets)]
+            span[0] += 1
+            span[1] += seconds
+            span[2] = max(span[2], seconds)
+            for position, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    span[3][position] += 1
+                    break
+        if self.__callbacks__:
+            attributes['kind'] = kind
+            for callback in self.__callbacks__:
+                callback(name, seconds, attributes)
+
+    def increment(self, name, value=1, kind=None):
+        """
+        Adds the value to the counter
+        """
+        with self.__lock__:
+            self.__counters__[(name, kind)] = self.__counters__.get((name, kind), 0) + value
+
+    def snapshot(self):
+        """
+        :returns: dict with the counters, spans (count, sum, max and cumulative buckets) and gauges.
+            Keys are the names, suffixed by ':kind' for the values with a kind.
+        """
+        with self.__lock__:
+            counters = dict(self.__counters__)
+            spans = {key: (count, total, longest, list(buckets)) for key, (count, total, longest, buckets) in self.__spans__.items()}
+        snapshot = {'counters': {}, 'spans': {}, 'gauges': {}}
+        for key, value in counters.items():
+            snapshot['counters'][_join(key)] = value
+        for key, (count, total, longest, buckets) in spans.items():
+            cumulative, running = {}, 0
+            for bound, bucket in zip(self.buckets, buckets):
+                running += bucket
+                cumulative[bound] = running
+            cumulative['+Inf'] = count
+            snapshot['spans'][_join(key)] = {'count': count, 'sum': total, 'max': longest, 'buckets': cumulative}
+        for prefix, kind, reference in self.__collectors__:
+            collector = reference()
+            if collector is None:
+                # The object of the method has been collected
+                self.unregister(None)
+                continue
+            for name, value in collector().items():
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    snapshot['gauges'][_join(('%s_%s' % (prefix, name), kind))] = value
+        return snapshot
+
+    def prometheus(self, namespace='nsetools'):
+        """
+        :returns: str of the snapshot in the Prometheus text exposition format
+        """
+        snapshot = self.snapshot()
+        lines = []
+        counters = {}
+        for key, value in snapshot['counters'].items():
+            name, _, kind = key.partition(':')
+            counters.setdefault(name, []).append((kind, value))
+        for name, values in sorted(counters.items()):
+            metric = '%s_%s_total' % (namespace, name)
+            lines.append('# TYPE %s counter' % metric)
+            lines.extend('%s%s %s' % (metric, _labels(kind=kind), _number(value)) for kind, value in values)
+        if snapshot['spans']:
+            metric = '%s_span_seconds' % namespace
+            lines.append('# TYPE %s histogram' % metric)
+            for key, span in sorted(snapshot['spans'].items()):
+                name, _, kind = key.partition(':')
+                for bound, count in span['buckets'].items():
+                    lines.append('%s_bucket%s %d' % (metric, _labels(span=name, kind=kind, le=bound), count))
+                lines.append('%s_sum%s %s' % (metric, _labels(span=name, kind=kind), _number(span['sum'])))
+                lines.append('%s_count%s %d' % (metric, _labels(span=name, kind=kind), span['count']))
+        gauges = {}
+        for key, value in snapshot['gauges'].items():
+            name, _, kind = key.partition(':')
+            gauges.setdefault(name, []).append((kind, value))
+        for name, values in sorted(gauges.items()):
+            metric = '%s_%s' % (namespace, name)
+            lines.append('# TYPE %s gauge' % metric)
+            lines.extend('%s%s %s' % (metric, _labels(kind=kind), _number(value)) for kind, value in values)
+        return '\n'.join(lines) + '\n'
+
+    def reset(self):
+        """
+        Clears the counters and spans. The callbacks and collectors are kept.
+        """
+        with self.__lock__:
+            self.__spans__.clear()
+            self.__counters__.clear()
+
+
+class NullMetrics():
+    """
+    Stands in for Metrics while the instrumentation is disabled, doing nothing at all
+    """
+    enabled = False
+
+    def span(self, name, kind=None, **attributes):
+        return _NULL_SPAN
+
+    def record(self, name, seconds, kind=None, **attributes):
+        pass
+
+    def increment(self, name, value=1, kind=None):
+        pass
+
+    def register(self, prefix, collector, kind=None):
+        pass
+
+    def unregister(self, collector):
+        pass
+
+
+class _Span():
+    """
+    Times the code it wraps and records it to the metrics on exit
+    """
+    __slots__ = ('metrics', 'name', 'kind', 'attributes', 'started')
+
+    def __init__(self, metrics, name, kind, attributes):
+        self.metrics = metrics
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+
+    def __enter__(self):
+        self.started = perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is not None:
+            self.attributes['error'] = exc_type.__name__
+        self.metrics.record(self.name, perf_counter() - self.started, self.kind, **self.attributes)
+
+
+class _NullSpan():
+    __slots__ = ()
+
+    def set(self, **attributes):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_NULL_SPAN = _NullSpan()
+NULL_METRICS = NullMetrics()
+
+
+def _join(key):
+    name, kind = key
+    return name if kind is None else '%s:%s' % (name, kind)
+
+
+def _labels(**labels):
+    labels = ['%s="%s"' % (name, str(value).replace('\\', '\\\\').replace('"', '\\"'))
+              for name, value in labels.items() if value not in (None, '')]
+    return '{%s}' % ','.join(labels) if labels else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
@@ -1,37 +1,703 @@
 """
 Contains utility functions related to the internet
 """
+import io
+import ssl
+import socket
+import asyncio
+import zlib
+import gzip
+import threading
+
+from time import monotonic, perf_counter, sleep
+from http.client import HTTPConnection, HTTPSConnection, HTTPException, parse_headers
+from http.cookiejar import CookieJar
+from urllib.error import HTTPError
+from urllib.parse import urlsplit, urlunsplit, urljoin
+from urllib.request import Request
 
 from nsetools.utils import byte_adaptor
+from nsetools.throttle import Throttle
+from nsetools.metrics import NULL_METRICS
 
-from urllib.request import build_opener, HTTPCookieProcessor, Request
-from http.cookiejar import CookieJar
 
-def __opener__():
+def decode_body(body, encoding):
     """
-    Builds the opener for the url
-    :returns: opener object
+    Decodes a gzip or deflate encoded response body
+    :Parameters:
+    body: bytes
+        The raw body as received
+    encoding: str
+        Value of the Content-Encoding header
+    :returns: bytes of the decoded body
     """
+    encoding = (encoding or '').strip().lower()
+    if encoding in ('gzip', 'x-gzip'):
+        return gzip.decompress(body)
+    if encoding == 'deflate':
+        try:
+            return zlib.decompress(body)
+        except zlib.error:
+            # Some servers send raw deflate streams without the zlib header
+            return zlib.decompress(body, -zlib.MAX_WBITS)
+    return body
 
-    cookie_jar = CookieJar()
-    return build_opener(HTTPCookieProcessor(cookie_jar))
+
+def body_decoder(encoding):
+    """
+    :returns: an incremental zlib decompressor for a gzip or deflate Content-Encoding, None for identity
+    """
+    encoding = (encoding or '').strip().lower()
+    if encoding in ('gzip', 'x-gzip'):
+        return zlib.decompressobj(16 + zlib.MAX_WBITS)
+    if encoding == 'deflate':
+        return zlib.decompressobj()
+    return None
 
 
-def read_url(url, headers):
+def conditional_headers(validators):
     """
-    Reads the url, processes it and returns a StringIO object to aid reading
+    :Parameters:
+    validators: dict
+        The ETag and/or Last-Modified headers of an earlier response
+    :returns: dict of the headers asking the server to respond only if the resource changed since
+    """
+    headers = {}
+    if validators:
+        if validators.get('ETag'):
+            headers['If-None-Match'] = validators['ETag']
+        if validators.get('Last-Modified'):
+            headers['If-Modified-Since'] = validators['Last-Modified']
+    return headers
+
+
+def response_validators(headers):
+    """
+    :Parameters:
+    headers: the headers of a response
+    :returns: dict of the ETag and Last-Modified headers the response carries, empty if it has neither
+    """
+    return {name: headers[name] for name in ('ETag', 'Last-Modified') if headers.get(name)}
+
+
+class ResponseStream(io.RawIOBase):
+    """
+    Binary file like object that decodes a response body incrementally as it is read.
+    The connection goes back to the pool once the body is completely read and the stream is closed.
+    """
+    __CHUNK_SIZE__ = 64 * 1024
+
+    def __init__(self, response, on_close):
+        """
+        :Parameters:
+        response: http.client.HTTPResponse
+            The response whose body is yet to be read
+        on_close: callable
+            Called with a bool indicating whether the body was completely read, when the stream is closed
+        """
+        super().__init__()
+        self.__response__ = response
+        self.__on_close__ = on_close
+        self.__encoding__ = response.getheader('Content-Encoding')
+        self.__decoder__ = body_decoder(self.__encoding__)
+        self.__pending__ = memoryview(b'')
+        self.__eof__ = False
+
+    def readable(self):
+        return True
+
+    def readinto(self, buffer):
+        while not self.__pending__ and not self.__eof__:
+            chunk = self.__response__.read(self.__CHUNK_SIZE__)
+            if not chunk:
+                self.__eof__ = True
+                if self.__decoder__ is not None:
+                    self.__pending__ = memoryview(self.__decoder__.flush())
+            elif self.__decoder__ is not None:
+                self.__pending__ = memoryview(self.__decompress__(chunk))
+            else:
+                self.__pending__ = memoryview(chunk)
+        size = min(len(buffer), len(self.__pending__))
+        buffer[:size] = self.__pending__[:size]
+        self.__pending__ = self.__pending__[size:]
+        return size
+
+    def close(self):
+        if not self.closed:
+            self.__on_close__(self.__eof__ and not self.__pending__)
+        super().close()
+
+    def __decompress__(self, chunk):
+        try:
+            return self.__decoder__.decompress(chunk)
+        except zlib.error:
+            if self.__encoding__.strip().lower() != 'deflate' or self.__decoder__.unused_data:
+                raise
+            # Some servers send raw deflate streams without the zlib header
+            self.__decoder__ = zlib.decompressobj(-zlib.MAX_WBITS)
+            return self.__decoder__.decompress(chunk)
+
+
+class Transport():
+    """
+    Reusable HTTP transport for requesting http://nseindia.com
+    Keeps alive a pool of connections per host, shares one cookie jar across requests
+    and transparently decodes gzip/deflate responses.
+    Requests are paced, and retried on throttling or dropped connections, by a throttle.Throttle.
+    """
+    __REDIRECT_CODES__ = (301, 302, 303, 307, 308)
+
+    def __init__(self, timeout=30, pool_size=10, base_url=None, max_redirects=5, throttle=None, metrics=None):
+        """
+        :Parameters:
+        timeout: float
+            Seconds to wait while connecting and for every read from the socket
+        pool_size: int
+            Maximum number of idle connections kept alive per host
+        base_url: str
+            (optional) Send every request to this scheme and host instead, keeping the path and query.
+            Useful to point the transport at a local stand-in server.
+        max_redirects: int
+            Maximum number of redirects to follow for a request
+        throttle: throttle.Throttle
+            (optional) Paces and retries the requests. Defaults to a Throttle with its default settings.
+        metrics: metrics.Metrics
+            (optional) Records the dns, connect, time to first byte and body spans, and the request counters
+        """
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.base_url = base_url
+        self.max_redirects = max_redirects
+        self.throttle = throttle or Throttle()
+        self.metrics = metrics or NULL_METRICS
+        self.cookie_jar = CookieJar()
+        self.__pool__ = {}
+        self.__lock__ = threading.Lock()
+        self.__ssl_context__ = ssl.create_default_context()
+
+    def fetch(self, url, headers=None):
+        """
+        Requests the url and reads the complete response
+        :Parameters:
+        url: str
+            the url to request and read from
+        headers: dict
+            headers to send along with the request
+        :returns: bytes of the decoded response body
+        :raises: HTTPError for responses with an error status, URLError/OSError on connection failures
+        """
+        url, key, connection, response = self.__send__(url, headers)
+        return self.__read__(key, connection, response)
+
+    def fetch_if_modified(self, url, headers=None, validators=None):
+        """
+        Requests the url conditionally, so that an unchanged resource is not sent again
+        :Parameters:
+        url: str
+            the url to request and read from
+        headers: dict
+            headers to send along with the request
+        validators: dict
+            (optional) The validators returned for an earlier response of the url
+        :returns: tuple of bytes of the decoded body (None if the resource has not been modified)
+            and the validators to send along with the next request
+        :raises: HTTPError for responses with an error status, URLError/OSError on connection failures
+        """
+        headers = dict(headers or {}, **conditional_headers(validators))
+        url, key, connection, response = self.__send__(url, headers)
+        body = self.__read__(key, connection, response)
+        if response.status == 304:
+            return None, response_validators(response.headers) or validators
+        return body, response_validators(response.headers)
+
+    def open(self, url, headers=None):
+        """
+        Requests the url without reading the response body
+        :Parameters:
+        url: str
+            the url to request and read from
+        headers: dict
+            headers to send along with the request
+        :returns: io.BufferedReader over the decoded body. Close it (or use it as a context manager) once done.
+        :raises: HTTPError for responses with an error status, URLError/OSError on connection failures
+        """
+        url, key, connection, response = self.__send__(url, headers)
+
+        def on_close(complete):
+            if complete:
+                self.__finish__(key, connection, response)
+            else:
+                # Unread data is left on the connection, it cannot be reused
+                connection.close()
+
+        return io.BufferedReader(ResponseStream(response, on_close))
+
+    def close(self):
+        """
+        Closes all the idle connections
+        """
+        with self.__lock__:
+            pool, self.__pool__ = self.__pool__, {}
+        for connections in pool.values():
+            for connection in connections:
+                connection.close()
+
+    def __send__(self, url, headers):
+        """
+        Sends the request once the throttle allows, retrying as long as it asks to
+        :returns: tuple of the final url, the pool key, the connection and the response with the body unread
+        """
+        attempt = 0
+        while True:
+            self.throttle.acquire()
+            self.metrics.increment('requests')
+            started = monotonic()
+            try:
+                sent = self.__follow__(url, headers)
+            except BaseException as error:
+                self.throttle.release(monotonic() - started, error)
+                self.metrics.increment('errors', kind=type(error).__name__)
+                delay = self.throttle.retry_delay(attempt, error)
+                if delay is None:
+                    raise
+                self.metrics.increment('retries')
+                sleep(delay)
+                attempt += 1
+            else:
+                self.throttle.release(monotonic() - started)
+                return sent
+
+    def __follow__(self, url, headers):
+        """
+        Sends the request, following redirects
+        :returns: tuple of the final url, the pool key, the connection and the response with the body unread
+        """
+        headers = headers or {}
+        for _ in range(self.max_redirects + 1):
+            key, connection, response = self.__request__(url, headers)
+            location = response.getheader('Location')
+            if response.status in self.__REDIRECT_CODES__ and location:
+                self.__read__(key, connection, response)
+                url = urljoin(url, location)
+                continue
+            if response.status >= 400:
+                body = self.__read__(key, connection, response)
+                raise HTTPError(url, response.status, response.reason, response.headers, io.BytesIO(body))
+            return url, key, connection, response
+        self.__read__(key, connection, response)
+        raise HTTPError(url, response.status, 'Too many redirects', response.headers, None)
+
+    def __read__(self, key, connection, response):
+        """
+        Reads off the complete body of a response, returning the connection to the pool
+        :returns: bytes of the decoded body
+        """
+        try:
+            with self.metrics.span('body', kind=key[1]) as span:
+                body = response.read()
+                span.set(bytes=len(body))
+        except Exception:
+            connection.close()
+            raise
+        self.metrics.increment('body_bytes', len(body))
+        self.__finish__(key, connection, response)
+        return decode_body(body, response.getheader('Content-Encoding'))
+
+    def __finish__(self, key, connection, response):
+        """
+        Returns the connection to the pool once the response has been completely read
+        """
+        if response.will_close:
+            connection.close()
+        else:
+            self.__release__(key, connection)
+
+    def __request__(self, url, headers):
+        """
+        Sends a single GET request over a pooled connection
+        :returns: tuple of the pool key, the connection and the response with the body unread
+        """
+        request = Request(url, headers=headers)
+        if not request.has_header('Accept-encoding'):
+            request.add_header('Accept-encoding', 'gzip, deflate')
+        self.cookie_jar.add_cookie_header(request)
+
+        scheme, netloc, path, query, _ = urlsplit(self.base_url or url)
+        if self.base_url:
+            _, _, path, query, _ = urlsplit(url)
+        key = (scheme, netloc)
+        target = urlunsplit(('', '', path or '/', query, ''))
+
+        request_headers = dict(request.header_items())
+        connection, reused = self.__acquire__(key)
+        try:
+            try:
+                response = self.__exchange__(key, connection, reused, target, request_headers)
+            except (HTTPException, ConnectionError):
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive connection. Retry once on a fresh one.
+                connection.close()
+                connection, reused = self.__connect__(key), False
+                response = self.__exchange__(key, connection, reused, target, request_headers)
+        except Exception:
+            connection.close()
+            raise
+
+        self.cookie_jar.extract_cookies(response, request)
+        return key, connection, response
+
+    def __exchange__(self, key, connection, reused, target, headers):
+        """
+        Sends the request, connecting first if the connection is new
+        :returns: the response with the body unread
+        """
+        if not reused:
+            # Resolved apart, so that a slow resolver can be told from a slow TCP or TLS handshake
+            with self.metrics.span('dns', kind=key[1]):
+                addresses = socket.getaddrinfo(connection.host, connection.port, type=socket.SOCK_STREAM)
+            connection._create_connection = lambda _, timeout, source: connect_resolved(addresses, timeout, source)
+            # Includes the TLS handshake
+            with self.metrics.span('connect', kind=key[1]):
+                connection.connect()
+        with self.metrics.span('ttfb', kind=key[1]):
+            connection.request('GET', target, headers=headers)
+            return connection.getresponse()
+
+    def __acquire__(self, key):
+        """
+        :returns: tuple of an idle connection for the host (or a new one) and whether it was reused
+        """
+        with self.__lock__:
+            idle = self.__pool__.get(key)
+            if idle:
+                return idle.pop(), True
+        return self.__connect__(key), False
+
+    def __release__(self, key, connection):
+        with self.__lock__:
+            idle = self.__pool__.setdefault(key, [])
+            if len(idle) < self.pool_size:
+                idle.append(connection)
+                return
+        connection.close()
+
+    def __connect__(self, key):
+        scheme, netloc = key
+        if scheme == 'https':
+            return HTTPSConnection(netloc, timeout=self.timeout, context=self.__ssl_context__)
+        return HTTPConnection(netloc, timeout=self.timeout)
+
+
+class AsyncTransport():
+    """
+    asyncio counterpart of Transport.
+    Keeps alive a pool of connections per host, shares one cookie jar across requests
+    and transparently decodes gzip/deflate responses, without using any threads.
+    Requests are paced, and retried on throttling or dropped connections, by a throttle.Throttle.
+    """
+    __REDIRECT_CODES__ = (301, 302, 303, 307, 308)
+
+    def __init__(self, timeout=30, pool_size=10, base_url=None, max_redirects=5, throttle=None, metrics=None):
+        """
+        :Parameters:
+        timeout: float
+            Seconds to wait for a complete request, including connecting and reading the body
+        pool_size: int
+            Maximum number of idle connections kept alive per host
+        base_url: str
+            (optional) Send every request to this scheme and host instead, keeping the path and query.
+        max_redirects: int
+            Maximum number of redirects to follow for a request
+        throttle: throttle.Throttle
+            (optional) Paces and retries the requests. Defaults to a Throttle with its default settings.
+        metrics: metrics.Metrics
+            (optional) Records the dns, connect, time to first byte and body spans, and the request counters
+        """
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.base_url = base_url
+        self.max_redirects = max_redirects
+        self.throttle = throttle or Throttle()
+        self.metrics = metrics or NULL_METRICS
+        self.cookie_jar = CookieJar()
+        self.__pool__ = {}
+        self.__ssl_context__ = ssl.create_default_context()
+
+    async def fetch(self, url, headers=None):
+        """
+        Requests the url and reads the complete response
+        :Parameters:
+        url: str
+            the url to request and read from
+        headers: dict
+            headers to send along with the request
+        :returns: bytes of the decoded response body
+        :raises: HTTPError for responses with an error status, OSError/asyncio.TimeoutError on connection failures
+        """
+        _, _, body = await self.__send__(url, headers or {})
+        return body
+
+    async def fetch_if_modified(self, url, headers=None, validators=None):
+        """
+        Requests the url conditionally. See Transport.fetch_if_modified
+        :returns: tuple of bytes of the decoded body (None if the resource has not been modified)
+            and the validators to send along with the next request
+        """
+        headers = dict(headers or {}, **conditional_headers(validators))
+        status, response_headers, body = await self.__send__(url, headers)
+        if status == 304:
+            return None, response_validators(response_headers) or validators
+        return body, response_validators(response_headers)
+
+    async def close(self):
+        """
+        Closes all the idle connections
+        """
+        pool, self.__pool__ = self.__pool__, {}
+        for connections in pool.values():
+            for _, writer in connections:
+                writer.close()
+
+    async def __send__(self, url, headers):
+        """
+        Sends the request once the throttle allows, retrying as long as it asks to
+        :returns: tuple of the status, headers and decoded body of the final response
+        """
+        attempt = 0
+        while True:
+            await self.throttle.acquire_async()
+            self.metrics.increment('requests')
+            started = monotonic()
+            try:
+                sent = await self.__follow__(url, headers)
+            except BaseException as error:
+                self.throttle.release(monotonic() - started, error)
+                self.metrics.increment('errors', kind=type(error).__name__)
+                delay = self.throttle.retry_delay(attempt, error)
+                if delay is None:
+                    raise
+                self.metrics.increment('retries')
+                await asyncio.sleep(delay)
+                attempt += 1
+            else:
+                self.throttle.release(monotonic() - started)
+                return sent
+
+    async def __follow__(self, url, headers):
+        """
+        Sends the request, following redirects
+        :returns: tuple of the status, headers and decoded body of the final response
+        """
+        for _ in range(self.max_redirects + 1):
+            status, reason, response_headers, body = await asyncio.wait_for(
+                self.__request__(url, headers), self.timeout)
+            location = response_headers.get('Location')
+            if status in self.__REDIRECT_CODES__ and location:
+                url = urljoin(url, location)
+                continue
+            if status >= 400:
+                raise HTTPError(url, status, reason, response_headers, io.BytesIO(body))
+            return status, response_headers, body
+        raise HTTPError(url, status, 'Too many redirects', response_headers, None)
+
+    async def __request__(self, url, headers):
+        """
+        Sends a single GET request over a pooled connection
+        :returns: tuple of the status, reason, headers and decoded body of the response
+        """
+        request = Request(url, headers=headers)
+        if not request.has_header('Accept-encoding'):
+            request.add_header('Accept-encoding', 'gzip, deflate')
+        self.cookie_jar.add_cookie_header(request)
+
+        scheme, netloc, path, query, _ = urlsplit(self.base_url or url)
+        if self.base_url:
+            _, _, path, query, _ = urlsplit(url)
+        key = (scheme, netloc)
+        target = urlunsplit(('', '', path or '/', query, ''))
+        request_headers = dict(request.header_items())
+        request_headers.setdefault('Host', netloc)
+        request_headers['Connection'] = 'keep-alive'
+        message = ''.join(['GET %s HTTP/1.1\r\n' % target] +
+                          ['%s: %s\r\n' % item for item in request_headers.items()] + ['\r\n'])
+
+        idle = self.__pool__.get(key)
+        connection, reused = (idle.pop(), True) if idle else (await self.__connect__(key), False)
+        try:
+            try:
+                response = await self.__exchange__(key, connection, message)
+            except (ConnectionError, asyncio.IncompleteReadError, HTTPException):
+                if not reused:
+                    raise
+                # The server closed an idle keep-alive connection. Retry once on a fresh one.
+                connection[1].close()
+                connection = await self.__connect__(key)
+                response = await self.__exchange__(key, connection, message)
+        except BaseException:
+            connection[1].close()
+            raise
+
+        status, reason, response_headers, body, keep_alive = response
+        self.cookie_jar.extract_cookies(_HeaderResponse(response_headers), request)
+        idle = self.__pool__.setdefault(key, [])
+        if keep_alive and len(idle) < self.pool_size:
+            idle.append(connection)
+        else:
+            connection[1].close()
+        return status, reason, response_headers, decode_body(body, response_headers.get('Content-Encoding'))
+
+    async def __exchange__(self, key, connection, message):
+        """
+        Writes the request and reads the response off the connection
+        :returns: tuple of the status, reason, headers, raw body and whether the connection can be reused
+        """
+        reader, writer = connection
+        started = perf_counter()
+        writer.write(message.encode('latin-1'))
+        await writer.drain()
+
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by the server')
+        first_byte = perf_counter()
+        self.metrics.record('ttfb', first_byte - started, kind=key[1])
+        version, status, reason = (status_line.decode('latin-1').rstrip('\r\n').split(' ', 2) + [''])[:3]
+        status = int(status)
+        header_lines = []
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            header_lines.append(line)
+        response_headers = parse_headers(io.BytesIO(b''.join(header_lines) + b'\r\n'))
+
+        connection_header = (response_headers.get('Connection') or '').lower()
+        keep_alive = 'close' not in connection_header and (version != 'HTTP/1.0' or 'keep-alive' in connection_header)
+        if status in (204, 304) or 100 <= status < 200:
+            body = b''
+        elif 'chunked' in (response_headers.get('Transfer-Encoding') or '').lower():
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0].strip(), 16)
+                if size == 0:
+                    # Skip the trailers
+                    while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readline()
+            body = b''.join(chunks)
+        elif response_headers.get('Content-Length') is not None:
+            body = await reader.readexactly(int(response_headers['Content-Length']))
+        else:
+            # The body runs till the server closes the connection
+            body = await reader.read()
+            keep_alive = False
+        self.metrics.record('body', perf_counter() - first_byte, kind=key[1], bytes=len(body))
+        self.metrics.increment('body_bytes', len(body))
+        return status, reason, response_headers, body, keep_alive
+
+    async def __connect__(self, key):
+        scheme, netloc = key
+        host, _, port = netloc.rpartition(':') if ':' in netloc else (netloc, '', '')
+        port = int(port) if port else (443 if scheme == 'https' else 80)
+        context = self.__ssl_context__ if scheme == 'https' else None
+        # Resolved apart, so that a slow resolver can be told from a slow TCP or TLS handshake
+        with self.metrics.span('dns', kind=netloc):
+            addresses = await asyncio.get_running_loop().getaddrinfo(host, port, type=socket.SOCK_STREAM)
+        # Includes the TLS handshake
+        with self.metrics.span('connect', kind=netloc):
+            error = None
+            for *_, address in addresses:
+                try:
+                    return await asyncio.open_connection(address[0], port, ssl=context,
+                                                         server_hostname=host if context else None)
+                except OSError as exc:
+                    error = exc
+            raise error or OSError('%s did not resolve to any address' % host)
+
+
+def connect_resolved(addresses, timeout, source_address=None):
+    """
+    Connects to the first of the addresses that accepts, the way socket.create_connection does,
+    without resolving the host again
+    :Parameters:
+    addresses: list of the tuples returned by socket.getaddrinfo
+    :returns: the connected socket
+    """
+    error = None
+    for *_, address in addresses:
+        try:
+            return socket.create_connection(address[:2], timeout, source_address)
+        except OSError as exc:
+            error = exc
+    raise error or OSError('getaddrinfo returned no address')
+
+
+class _HeaderResponse():
+    """
+    Exposes response headers the way CookieJar.extract_cookies expects them
+    """
+    def __init__(self, headers):
+        self.__headers__ = headers
+
+    def info(self):
+        return self.__headers__
+
+
+__DEFAULT_TRANSPORT__ = None
+
+def default_transport():
+    """
+    :returns: the transport shared by requests that do not bring their own
+    """
+    global __DEFAULT_TRANSPORT__
+    if __DEFAULT_TRANSPORT__ is None:
+        __DEFAULT_TRANSPORT__ = Transport()
+    return __DEFAULT_TRANSPORT__
+
+
+def read_url_bytes(url, headers, transport=None):
+    """
+    Reads the complete response of the url without any decoding or copying
     :Parameters:
     url: str
         the url to request and read from
     headers: dict
         The right set of headers for requesting from http://nseindia.com
-    :returns: _io.StringIO object of the response
+    transport: Transport
+        (optional) The transport to send the request over. Defaults to a shared transport.
+    :returns: bytes of the response
     """
-    request = Request(url, None, headers)
-    response = __opener__().open(request)
+    return (transport or default_transport()).fetch(url, headers)
 
-    if response is not None:
-        return byte_adaptor(response)
-    else:
-        raise Exception('No response received')
 
+def stream_url(url, headers, transport=None):
+    """
+    Opens the url for reading the response incrementally
+    :Parameters:
+    url: str
+        the url to request and read from
+    headers: dict
+        The right set of headers for requesting from http://nseindia.com
+    transport: Transport
+        (optional) The transport to send the request over. Defaults to a shared transport.
+    :returns: binary file like object of the response. Iterating over it yields lines as bytes.
+    """
+    return (transport or default_transport()).open(url, headers)
+
+
+def read_url(url, headers, transport=None):
+    """
+    Reads the url, processes it and returns a StringIO object to aid reading
+    :Parameters:
+    url: str
+        the url to request and read from
+    headers: dict
+        The right set of headers for requesting from http://nseindia.com
+    transport: Transport
+        (optional) The transport to send the request over. Defaults to a shared transport.
+    :returns: _io.StringIO object of the response
+    """
+    return byte_adaptor(io.BytesIO(read_url_bytes(url, headers, transport)))
@@ -1,34 +1,80 @@
 """
 Contains the core APIs
 """
-import ast
-import re
 import json
-import os
+import threading
 import csv
+import io
 
 from urllib.parse import urlencode
-from functools import lru_cache
-from datetime import  timedelta, datetime
-from multiprocessing.pool import ThreadPool
-from dateutil.parser import parse
+from time import monotonic, sleep
+from itertools import count
+from datetime import  timedelta, datetime, date
+from concurrent.futures import ThreadPoolExecutor, as_completed
+# Raised by as_completed on timeout. Only an alias of the builtin TimeoutError from Python 3.11
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 
-from bs4 import BeautifulSoup
-
-import pandas as pd
-
-from nsetools.utils import js_adaptor
-from nsetools.net_utils import read_url
+from nsetools.utils import parse_quote_payload, parse_peer_payload, clean_dict, clean_frame
+from nsetools.net_utils import read_url, read_url_bytes, stream_url, Transport
+from nsetools.cache import ResponseCache, instance_cache
+from nsetools.throttle import Throttle
+from nsetools.metrics import NULL_METRICS
+from nsetools.symbols import SymbolIndex
+from nsetools.indices import IndexSnapshot
+from nsetools.quotes import QuoteBatch, Snapshot
+from nsetools.trading_calendar import TradingCalendar
 
 class NseHolidays():
     """
     Contains methods to parse and extract data about the holidays of NSE
     """
+    holiday_url = 'https://www.nseindia.com/products/content/equities/equities/mrkt_timing_holidays.htm'
+    headers = {'Accept': '*/*',
+               'Accept-Language': 'en-US,en;q=0.5',
+               'Host': 'nseindia.com',
+               'Referer': "https://www.nseindia.com/live_market/dynaContent/live_watch/get_quote/GetQuote.jsp?symbol=INFY&illiquid=0&smeFlag=0&itpFlag=0",
+               'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:28.0) Gecko/20100101 Firefox/28.0',
+               'X-Requested-With': 'XMLHttpRequest'
+               }
+
     def get_holiday_list(self):
+        """
+        :returns: list of the upcoming trading holidays followed by the remaining weekends of the current year
+        """
+        todays_date = datetime.now().date()
+        # The calendar holds the holidays of the year, so that the page is not requested on every call
+        holiday_list = [day for day in trading_calendar().holidays if todays_date <= day]
+
+        # We will now extract the saturdays and sundays
+        date = todays_date
+        date += timedelta(days=6-date.weekday())
+        diff = date - timedelta(days=1)
+        while date.year == todays_date.year:
+            holiday_list.append(diff)
+            holiday_list.append(date)
+            date += timedelta(days=7)
+            diff += timedelta(days=7)
+
+        # This is the final holiday list from the current time.
+        return holiday_list
+
+    def get_trading_holidays(self, transport=None):
         """
         Cleans the holiday list
+        :Parameters:
+        transport: (optional) net_utils.Transport to request the holiday page over
+        :returns: list of datetime.date of all the trading holidays of the current year, including the past ones
+        """
+        return self.parse_trading_holidays(self.__parse_holiday_list__(transport))
+
+    def parse_trading_holidays(self, holiday_list):
         """
-        holiday_list = self.__parse_holiday_list__()
+        :Parameters:
+        holiday_list: list of the rows of the holiday page, as returned by parse_holiday_page
+        :returns: list of datetime.date of the trading holidays
+        """
+        from dateutil.parser import parse
+
         clean_holiday_list = []
         for item in holiday_list:
             individual_data = []
@@ -41,48 +87,32 @@ class NseHolidays():
         previous = 0
         holiday_list = []
         # These are all the holidays excluding saturdays and sundays
-        todays_date = datetime.now().date()
         for  series in clean_holiday_list:
             # We wish to extract only the trading holidays.
             # The serial number resets after trading holidays i.e when it moves to clearing holidays
             if previous < int(series[0][0]):
                 # Convert to datetime format
-                parsed_date = parse(series[1][0])
-                if todays_date <= parsed_date.date():
-                    holiday_list.append(parsed_date.date())
+                holiday_list.append(parse(series[1][0]).date())
                 previous += 1
-
-        # We will now extract the saturdays and sundays
-        date = todays_date
-        date += timedelta(days=6-date.weekday())
-        diff = date - timedelta(days=1)
-        while date.year == todays_date.year:
-            holiday_list.append(diff)
-            holiday_list.append(date)
-            date += timedelta(days=7)
-            diff += timedelta(days=7)
-
-        # This is the final holiday list from the current time.
         return holiday_list
 
-    @lru_cache(maxsize=2)
-    def __parse_holiday_list__(self):
+    def __parse_holiday_list__(self, transport=None):
         """
+        Requests the holiday page on every call. trading_calendar keeps what is parsed from it till the year is over.
         :Returns: a list of all the holidays with the serial number, date and holiday name
         """
-        # Parse the holiday url and extract useful details
-        holiday_url = 'https://www.nseindia.com/products/content/equities/equities/mrkt_timing_holidays.htm'
-        headers = {'Accept': '*/*',
-                   'Accept-Language': 'en-US,en;q=0.5',
-                   'Host': 'nseindia.com',
-                   'Referer': "https://www.nseindia.com/live_market/dynaContent/live_watch/get_quote/GetQuote.jsp?symbol=INFY&illiquid=0&smeFlag=0&itpFlag=0",
-                   'User-Agent': 'Mozilla/5.0 (Windows NT 6.1; WOW64; rv:28.0) Gecko/20100101 Firefox/28.0',
-                   'X-Requested-With': 'XMLHttpRequest'
-                   }
-        res = read_url(holiday_url, headers)
-        res = res.read()
-        
-        soup = BeautifulSoup(res, 'html.parser')
+        res = read_url(self.holiday_url, self.headers, transport)
+        return self.parse_holiday_page(res.read())
+
+    def parse_holiday_page(self, page):
+        """
+        :Parameters:
+        page: the html of the holiday page
+        :Returns: a list of all the holidays with the serial number, date and holiday name
+        """
+        from bs4 import BeautifulSoup
+
+        soup = BeautifulSoup(page, 'html.parser')
         holiday_list = []
         # The data is stored in tables. Extract only the tabular data
         for row in soup.find_all('tr', recursive=False):
@@ -91,55 +121,157 @@ class NseHolidays():
 
         return holiday_list
 
-def conditional_decorator(decorator, condition):
-    def res_decorator(f):
-        if not condition:
-            return f
-        return decorator(f)
-    return res_decorator
+def parse_date(value):
+    """
+    :Parameters:
+    value: a datetime.date, datetime.datetime or a string in the format DD MM YYYY
+    :returns: datetime.date
+    """
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    from dateutil.parser import parse
+    return parse(value, dayfirst=True).date()
 
-def market_status():
+__NSE_HOLIDAYS__ = None
+
+def nse_holidays():
     """
-    Checks whether the market is open or not
-    :returns: bool variable indicating status of market. True -> Open, False -> Closed
+    :returns: the NseHolidays instance shared across calls
+    """
+    global __NSE_HOLIDAYS__
+    if __NSE_HOLIDAYS__ is None:
+        __NSE_HOLIDAYS__ = NseHolidays()
+    return __NSE_HOLIDAYS__
+
+__TRADING_CALENDAR__ = None
+# monotonic time after which the holiday page is requested again, once it has failed to load
+__CALENDAR_RETRY_AT__ = None
+__CALENDAR_LOCK__ = threading.Lock()
+# Seconds the weekends only calendar is used for after the holiday page fails to load
+CALENDAR_RETRY_INTERVAL = 15 * 60
+
+def trading_calendar(transport=None):
     """
-    nse_holidays = NseHolidays()
-    holiday_list = nse_holidays.get_holiday_list()
+    :Parameters:
+    transport: (optional) net_utils.Transport to request the holiday page over
+    :returns: trading_calendar.TradingCalendar used to tell the market hours.
+        Unless one was set through set_trading_calendar, it is built from the holiday page of NSE
+        and built again once the year it was built for is over.
+        While the page cannot be loaded, a calendar knowing only the weekends is returned,
+        and the page is not requested again for CALENDAR_RETRY_INTERVAL seconds.
+    """
+    if calendar_is_stale():
+        with __CALENDAR_LOCK__:
+            if calendar_is_stale():
+                try:
+                    holidays = nse_holidays().get_trading_holidays(transport)
+                except Exception:
+                    holidays = None
+                install_trading_holidays(holidays)
+    return __TRADING_CALENDAR__
 
-    # Check if today is a holiday according to the holiday list.
-    if datetime.now().date() in holiday_list:
-        return False
+def install_trading_holidays(holidays):
+    """
+    Builds the calendar returned by trading_calendar from the trading holidays of the current year
+    :Parameters:
+    holidays: list of datetime.date, None if the holiday page could not be loaded.
+        The calendar then knows only the weekends till CALENDAR_RETRY_INTERVAL passes.
+    """
+    global __TRADING_CALENDAR__, __CALENDAR_RETRY_AT__
+    if holidays is None:
+        __TRADING_CALENDAR__ = TradingCalendar([])
+        __CALENDAR_RETRY_AT__ = monotonic() + CALENDAR_RETRY_INTERVAL
+    else:
+        __TRADING_CALENDAR__ = TradingCalendar(holidays, valid_through=date(date.today().year, 12, 31))
+        __CALENDAR_RETRY_AT__ = None
 
-    current_time = datetime.now().time()
-    # Check if the current time is in the time bracket in which NSE operates.
-    # The market opens at 9:15 am
-    start_time = datetime.now().time().replace(hour=9, minute=15, second=0, microsecond=0)
-    # And ends at 3:30 = 15:30
-    end_time = datetime.now().time().replace(hour=15, minute=30, second=0, microsecond=0)
+def loaded_trading_calendar():
+    """
+    :returns: the calendar trading_calendar last built or was given, None if there is none yet.
+        Never requests the holiday page.
+    """
+    return __TRADING_CALENDAR__
 
-    if current_time > start_time and current_time < end_time:
+def calendar_is_stale():
+    """
+    :returns: bool indicating whether the holiday page needs to be requested to build the calendar
+    """
+    calendar = __TRADING_CALENDAR__
+    if calendar is None:
         return True
+    if __CALENDAR_RETRY_AT__ is not None:
+        return monotonic() >= __CALENDAR_RETRY_AT__
+    return calendar.valid_through is not None and calendar.valid_through < date.today()
 
-    # In case the above condition does not satisfy, the default value (False) is returned
-    return False
+def set_trading_calendar(calendar):
+    """
+    Uses the calendar to tell the market hours, e.g. one loaded with TradingCalendar.load
+    instead of fetching the holiday page. None goes back to fetching it.
+    """
+    global __TRADING_CALENDAR__, __CALENDAR_RETRY_AT__
+    __TRADING_CALENDAR__ = calendar
+    __CALENDAR_RETRY_AT__ = None
+
+def market_status():
+    """
+    Checks whether the market is open or not
+    :returns: bool variable indicating status of market. True -> Open, False -> Closed
+    """
+    return trading_calendar().is_open()
+
+def next_session_start(now=None):
+    """
+    Finds when the next trading session opens
+    :Parameters:
+    now: datetime
+        The time to start looking from. Defaults to the current time.
+    :returns: datetime at which the next session opens
+    """
+    return trading_calendar().next_session(now)
 
 class Nse():
     """
     class which implements all the functionality for
     National Stock Exchange
     """
+    # Maximum number of days of history NSE returns for a single request
+    HISTORY_WINDOW = 100
     __CODECACHE__ = None
     __cache_size__ = 64
+    # Numbers the instances, to name them
+    __instances__ = count(1)
 
 
-    def __init__(self, cache_size=64):
+    def __init__(self, cache_size=64, cache_memory=64 * 1024 * 1024, cache_ttl=5, transport=None,
+                 max_workers=16, executor=None, history_store=None, throttle=None, metrics=None, name=None):
         """
         Initializes a new instance of the Nse class.
         :Parameters:
-            file_caching: (optional) bool variable to indicate whether to use files
-            for caching of non changing data
+            cache_size: (optional) maximum number of responses to cache
+            cache_memory: (optional) maximum approximate memory (in bytes) of the cached responses
+            cache_ttl: (optional) seconds for which live data is cached while the market is open.
+            After the close, responses are cached till the next session opens.
+            transport: (optional) net_utils.Transport to send the requests over.
+            Defaults to a new transport owned by this instance.
+            max_workers: (optional) number of threads used to fetch many symbols at once
+            executor: (optional) concurrent.futures.Executor to fetch on instead of one owned by this instance.
+            It is not shut down by close.
+            history_store: (optional) history_store.HistoryStore consulted by get_history,
+            so that only the dates not stored yet are fetched
+            throttle: (optional) throttle.Throttle pacing and retrying the requests of the transport created by this instance.
+            Defaults to one allowing max_workers requests in flight.
+            metrics: (optional) metrics.Metrics recording the time spent parsing, cleaning and building frames,
+            along with the requests of the transport created by this instance and the cache and throttle statistics.
+            Left out, the instrumentation costs next to nothing.
+            name: (optional) name of the instance, the kind its cache and throttle gauges are labelled with.
+            Defaults to nse-1, nse-2 and so on.
         """
         self.headers = self.nse_headers()
+        self.metrics = metrics or NULL_METRICS
+        self.transport = transport or Transport(throttle=throttle or Throttle(max_concurrency=max_workers),
+                                                metrics=metrics)
         # URL list
         self.get_quote_url = 'https://www.nseindia.com/live_market/dynaContent/live_watch/get_quote/GetQuote.jsp?'
         self.stocks_csv_url = 'http://www.nseindia.com/content/equities/EQUITY_L.csv'
@@ -153,57 +285,105 @@ class Nse():
         self.get_history_url = 'https://www.nseindia.com/products/dynaContent/common/productsSymbolMapping.jsp?'
 
         self.__cache_size__ = cache_size
+        self.cache_ttl = cache_ttl
+        self.cache = ResponseCache(cache_size, cache_memory)
+        self.max_workers = max_workers
+        self.history_store = history_store
+        self.__executor__ = executor
+        self.__owns_executor__ = executor is None
+        self.__executor_lock__ = threading.Lock()
+        self.name = name or 'nse-%d' % next(Nse.__instances__)
+        # Held weakly by the metrics, and unregistered by close
+        self.metrics.register('cache', self.cache_stats, kind=self.name)
+        self.metrics.register('throttle', self.throttle_stats, kind=self.name)
+
+    @property
+    def executor(self):
+        """
+        The executor shared by every call fanning out requests. Created on first use.
+        """
+        if self.__executor__ is None:
+            with self.__executor_lock__:
+                if self.__executor__ is None:
+                    self.__executor__ = ThreadPoolExecutor(self.max_workers, thread_name_prefix='nsetools')
+        return self.__executor__
+
+    def map(self, function, items):
+        """
+        Applies the function to every item on the executor
+        :returns: list of the results, in the order of the items
+        """
+        items = list(items)
+        if len(items) <= 1:
+            # Not worth handing a single item over to another thread
+            return [function(item) for item in items]
+        return list(self.executor.map(function, items))
+
+    def close(self):
+        """
+        Shuts down the executor (if owned by this instance) and closes the connections kept alive
+        """
+        with self.__executor_lock__:
+            executor, self.__executor__ = self.__executor__, None
+        if executor is not None and self.__owns_executor__:
+            executor.shutdown(wait=True)
+        self.metrics.unregister(self.cache_stats)
+        self.metrics.unregister(self.throttle_stats)
+        self.transport.close()
+
+    def __enter__(self):
+        return self
 
-    @lru_cache(maxsize=__cache_size__)
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @instance_cache(live=False)
     def get_stock_codes(self):
         """
         Retreives the equity list from NSE, and stores it in a dataframe.
-        
-        :Parameters:
-        cached: bool
-            Whether to cache the data or not. Prefer keeping this true unless you are running into OOM issues.
+        The csv is parsed in a single pass as it streams in, and every column gets a proper type:
+        Series is categorical, Date of Listing a datetime and the values and lot numeric.
+
         :return: pandas DataFrame
         """
-        res_dataframe = pd.DataFrame()
-        url = self.stocks_csv_url
-        res = read_url(url, self.headers)
-        column_dict = {
-            0: 'Symbol',
-            1: 'Name',
-            2: 'Series',
-            3: 'Date of Listing',
-            4: 'Paid up Value',
-            5: 'Market Lot',
-            6: 'ISIN Number',
-            7: 'Face Value'
-            }
-        for i, line in enumerate(res.read().split('\n')):
-            if i == 0:
-                # This contains the column names
-                pass
-            elif line != '' and re.search(',', line):
-                split_line = line.split(',')
-                for index, items in enumerate(split_line):
-                    res_dataframe.set_value(i, column_dict[index], items)
-
-            # else just skip the evaluation, line may not be a valid csv
-        return res_dataframe
-            
+        with stream_url(self.stocks_csv_url, self.headers, self.transport) as stream:
+            return self.parse_stock_codes(stream)
 
-    @lru_cache(maxsize=__cache_size__)
     def is_valid_code(self, code):
         """
         :param code: a string stock code
         :return: bool
         """
         if code:
-            stock_codes = self.get_stock_codes()
-            search_result = stock_codes[stock_codes['Symbol'] == code.upper()]
-            if not search_result.empty:
-                return True
-            return False
+            return self.get_symbol_index().is_valid(code)
+
+    def validate_codes(self, codes):
+        """
+        Validates many stock codes in a single pass over the symbol index
+        :Parameters:
+        codes: iterable
+            The stock codes to validate
+        :returns: tuple of the set of valid and the set of invalid codes, as they were passed
+        """
+        return self.get_symbol_index().validate(codes)
+
+    @instance_cache(live=False)
+    def get_symbol_index(self):
+        """
+        Reads the equity list into a hashed index by symbol and ISIN. Does not need pandas.
+        :returns: symbols.SymbolIndex
+        """
+        with stream_url(self.stocks_csv_url, self.headers, self.transport) as stream:
+            return SymbolIndex.from_csv(stream)
+
+    def set_symbol_index(self, index):
+        """
+        Serves get_symbol_index (and so the validation of codes) from an index read elsewhere,
+        e.g. by the process handing work to this one, instead of requesting the equity list again
+        """
+        self.cache.put(('get_symbol_index', (), ()), index, Nse.__cache_expiry__(self, False))
 
-    @conditional_decorator(lru_cache(maxsize=__cache_size__), not market_status())
+    @instance_cache(live=True)
     def get_quote(self, *codes, as_json=False):
         """
         gets the quote for a given stock code
@@ -211,39 +391,109 @@ class Nse():
         :return: pandas DataFrame with quotes of all companies codes passed.
         :raises: HTTPError, URLError
         """
+        valid_codes, _ = self.validate_codes(codes)
+
         def __get_quote__(code):
-            code = code.upper()
-            if self.is_valid_code(code):
-                url = self.build_url_for_quote(code)
-                res = read_url(url, self.headers)
-
-                # Now parse the response to get the relevant data
-                match = re.search(
-                    r'\{<div\s+id="responseDiv"\s+style="display:none">\s+(\{.*?\{.*?\}.*?\})',
-                    res.read(), re.S
-                )
-                # ast can raise SyntaxError, let's catch only this error
-                try:
-                    buffer = match.group(1)
-                    buffer = js_adaptor(buffer)
-                    response = self.clean_server_response(
-                        ast.literal_eval(buffer)['data'][0])
-                except Exception:
-                    raise Exception('Symbol Not Traded today')
-                else:
-                    rendered_response = self.render_response(response, as_json)
-                    # Check if the market is open (to avoid repeated network computation)
-                return rendered_response
-        with ThreadPool(os.cpu_count()*2) as pool:
-            quotes = pool.map(__get_quote__, codes)
-        if as_json:
-            return quotes
-        # Filter out all the Nones from the list
-        quotes = [x for x in quotes if x is not None]
-        if quotes:
-            return pd.DataFrame(quotes).set_index('symbol')
+            if code in valid_codes:
+                url = self.build_url_for_quote(code.upper())
+                res = read_url(url, self.headers, self.transport)
+                return self.parse_quote(res.read(), as_json)
+        quotes = self.map(__get_quote__, codes)
+        return self.render_quotes(quotes, as_json)
+
+    @instance_cache(live=True)
+    def get_quote_batch(self, *codes):
+        """
+        gets the quotes for the given stock codes, held compactly column by column
+        :return: quotes.QuoteBatch of the valid codes, converted to a DataFrame or json only when asked for
+        :raises: HTTPError, URLError
+        """
+        valid_codes, _ = self.validate_codes(codes)
+        symbols = list(dict.fromkeys(code.upper() for code in codes if code in valid_codes))
+
+        def __get_quote__(symbol):
+            res = read_url(self.build_url_for_quote(symbol), self.headers, self.transport)
+            return self.parse_quote(res.read())
+        return QuoteBatch.from_quotes(self.map(__get_quote__, symbols))
+
+    def watch(self, *codes, interval=1, closed_interval=60):
+        """
+        Polls the quotes of the given stock codes and yields only what changed.
+        The quotes are requested conditionally, so that the server can skip sending unchanged ones,
+        and bypass the response cache.
+        :Parameters:
+        codes: the stock codes to watch. Invalid codes are ignored.
+        interval: float
+            Seconds between polls while the market is open
+        closed_interval: float
+            Seconds between polls while the market is closed, cut short when the next session opens
+        :returns: generator of dicts of symbol -> dict of the fields that changed since the previous poll.
+            The first dict carries the complete quotes. Polls in which nothing changed are not yielded.
+        :raises: HTTPError, URLError
+        """
+        valid_codes, _ = self.validate_codes(codes)
+        symbols = list(dict.fromkeys(code.upper() for code in codes if code in valid_codes))
+        validators, quotes = {}, {}
+
+        def __poll__(symbol):
+            body, validators[symbol] = self.transport.fetch_if_modified(
+                self.build_url_for_quote(symbol), self.headers, validators.get(symbol))
+            if body is not None:
+                return self.parse_watched_quote(body)
+        while True:
+            started = monotonic()
+            changes = self.quote_changes(quotes, symbols, self.map(__poll__, symbols))
+            if changes:
+                yield changes
+            sleep(max(0, self.watch_delay(interval, closed_interval) - (monotonic() - started)))
     
-    @conditional_decorator(lru_cache(maxsize=__cache_size__), not market_status())
+    def snapshot_all(self, *codes, chunk_size=100, timeout=None, progress=None):
+        """
+        Quotes the whole equity list (or the given stock codes) in chunks, keeping the quotes of the symbols
+        that succeed when others fail. Bypasses the response cache.
+        :Parameters:
+        codes: (optional) the stock codes to quote. Defaults to every symbol of the equity list.
+        chunk_size: int
+            Symbols handed to the executor at a time. The executor and the throttle bound how many are in flight,
+            the chunks how many are queued once the timeout has passed.
+        timeout: float
+            (optional) Seconds the whole snapshot gets. Symbols not quoted by then are reported as TimeoutError.
+        progress: callable
+            (optional) Called after every chunk with the number of symbols done, the total and the number that failed
+        :returns: quotes.Snapshot with the quotes fetched and the error of every symbol that was not
+        """
+        started = monotonic()
+        symbols, errors = self.snapshot_symbols(codes, self.get_symbol_index())
+        deadline = None if timeout is None else started + timeout
+        quotes = {}
+
+        def __get_quote__(symbol):
+            res = read_url(self.build_url_for_quote(symbol), self.headers, self.transport)
+            return self.parse_quote(res.read())
+        for start in range(0, len(symbols), chunk_size):
+            chunk = symbols[start:start + chunk_size]
+            remaining = None if deadline is None else deadline - monotonic()
+            if remaining is not None and remaining <= 0:
+                self.snapshot_timed_out(errors, symbols[start:], timeout)
+                break
+            futures = {self.executor.submit(__get_quote__, symbol): symbol for symbol in chunk}
+            try:
+                for future in as_completed(futures, timeout=remaining):
+                    self.snapshot_result(quotes, errors, futures[future], self.__future_result__(future))
+            except FuturesTimeoutError:
+                for future, symbol in futures.items():
+                    if symbol in quotes or symbol in errors:
+                        continue
+                    if future.done():
+                        self.snapshot_result(quotes, errors, symbol, self.__future_result__(future))
+                    else:
+                        future.cancel()
+                        self.snapshot_timed_out(errors, [symbol], timeout)
+            if progress is not None:
+                progress(min(start + chunk_size, len(symbols)), len(symbols), len(errors))
+        return self.render_snapshot(symbols, quotes, errors, started)
+
+    @instance_cache(live=True)
     def get_history(self, *codes_dates, as_json=False):
         """
         Gets the historical data between the given date range (inclusive of both).
@@ -255,46 +505,25 @@ class Nse():
 
         :returns: a pandas dataframe indexed by date containing the history of the symbol in the given date range
         """
-        # Can we not get data for more than 100 days.
-        # To get data for 365 days, we got to download the csv. The csv does not seem to be downloading from a url
-        # So currently we get the data in batches of 100
-        @conditional_decorator(lru_cache(maxsize=self.__cache_size__), not market_status())
-        def __get_history__(code_date):
-            code = code_date[0].upper()
-            history_df = pd.DataFrame()
-            if self.is_valid_code(code):
-                # Parse the dates in the correct format
-                if not isinstance(code_date[1], datetime):
-                    start = parse(code_date[1], dayfirst=True)
-                if not isinstance(code_date[2], datetime):
-                    end = parse(code_date[2], dayfirst=True)
-                # Find the difference between the dates and generate batches of 100 days till the end date
-                difference = (end - start).days
-                if difference > 100:
-                    curr_end = start + timedelta(days=100)
-                    while curr_end < end:
-                        url = self.build_url_for_history(code_date[0], datetime.strftime(start, '%d-%m-%Y'), datetime.strftime(curr_end, '%d-%m-%Y'))
-                        res = read_url(url, self.headers)
-                        res = res.read()
-                        history_df = history_df.append(pd.read_html(res, header=0, index_col='Date')[0])
-                        start = curr_end + timedelta(days=1)
-                        curr_end += timedelta(days=100)
-                    url = self.build_url_for_history(code_date[0], datetime.strftime(start, '%d-%m-%Y'), datetime.strftime(end, '%d-%m-%Y'))
-                    res = read_url(url, self.headers)
-                    res = res.read()
-                    history_df = history_df.append(pd.read_html(res, header=0, index_col='Date')[0])
-                if as_json:
-                    return history_df.to_json()
-                return history_df
-        
-        with ThreadPool(os.cpu_count() * 2) as pool:
-            quotes = pool.map(__get_history__, codes_dates)
-            if len(quotes) == 1:
-                return quotes[0]
-            return quotes
+        valid_codes, _ = self.validate_codes(code_date[0] for code_date in codes_dates)
+        plans = [self.history_plan(code_date) if code_date[0] in valid_codes else None for code_date in codes_dates]
+
+        # Fetch the windows of every symbol together, so that the executor caps the requests in flight
+        urls = [url for plan in plans if plan is not None for _, _, gap_urls in plan for url in gap_urls]
+        pages = iter(self.map(lambda url: read_url(url, self.headers, self.transport).read(), urls))
+        quotes = []
+        for code_date, plan in zip(codes_dates, plans):
+            if plan is None:
+                quotes.append(None)
+            else:
+                gap_pages = [[next(pages) for _ in gap_urls] for _, _, gap_urls in plan]
+                quotes.append(self.combine_history(code_date, plan, gap_pages, as_json))
+        if len(quotes) == 1:
+            return quotes[0]
+        return quotes
 
             
-    @lru_cache(maxsize=__cache_size__)
+    @instance_cache(live=False)
     def get_peer_companies(self, code, as_json=False):
         """
         :Parameters:
@@ -307,33 +536,31 @@ class Nse():
         code = code.upper()
         if self.is_valid_code(code):
             url = self.peer_companies_url + code
-            res = read_url(url, self.headers)
-
-            # We need to filter the data from this. The data is at an offset of 39 from the beginning and 8 at the end
-            res = res.read()
-            string_index = re.search('data:', res).span()[1]
-            # Everything under 'data'
-            res = res[string_index+1:]
-            # Now comes the tricky batshit crazy part.
-            # We will iteratively filter each company and append them to a list
-            # HACK: the solution is very messy. Would be nice if a better cleaner solution can be found.
-            start = 0
-            data = pd.DataFrame()
-            for item in re.finditer(r'({*})', res):
-                # The second item. We want the curly brace for json parsing
-                end = item.span()[1]
-                # This is the actual data we are interested in
-                string = res[start:end]
-                try:
-                    company_info = json.loads(string)
-                    del(company_info['industry'])
-                    data = data.append(company_info, ignore_index=True)
-                except Exception:
-                    pass
-                # We dont care about this. Throw it out
-                start = end + 1
+            res = read_url(url, self.headers, self.transport)
+            return self.parse_peer_companies(res.read(), as_json)
 
-            return data.to_json() if as_json else data
+    def get_peer_companies_many(self, *codes, as_json=False):
+        """
+        Gets the peer companies of many companies concurrently.
+        Companies in the same industry share a peer group, so a company already returned
+        as the peer of another is not requested again.
+        :Parameters:
+        codes: str
+            The codes of the companies to find peers of
+        :returns: pandas DataFrame | json of all the peers, see combine_peer_groups
+        """
+        valid_codes, _ = self.validate_codes(codes)
+        remaining = list(dict.fromkeys(code.upper() for code in codes if code in valid_codes))
+        groups, covered = {}, set()
+        while remaining:
+            # Request in waves, so that the groups of a wave can rule out the codes of the next
+            wave, remaining = remaining[:self.max_workers], remaining[self.max_workers:]
+            for code, frame in zip(wave, self.map(self.get_peer_companies, wave)):
+                groups[code] = frame
+                if frame is not None and 'symbol' in frame.columns:
+                    covered.update(str(symbol).upper() for symbol in frame['symbol'])
+            remaining = [code for code in remaining if code not in covered]
+        return self.combine_peer_groups(groups, as_json)
 
     def get_top(self, *options, as_json=False):
         """
@@ -345,7 +572,59 @@ class Nse():
             What to get top of. Possible values: gainers, losers, volume, active, advances decline, index list
         :Returns: generator that can be used to iterate over the data requested
         """
-        possible_options = {
+        possible_options = self.top_options()
+        for item in options:
+            function_to_call = possible_options.get(item.upper())
+            if function_to_call is not None:
+                yield function_to_call(as_json)
+
+    def get_top_as_completed(self, *options, as_json=False, timeout=None):
+        """
+        Gets the top lists of all the options concurrently, as accepted by get_top.
+        :Parameters:
+        as_json: bool
+            Whether to return a json like string, or dict.
+        timeout: float
+            (optional) Seconds every option gets to finish, counted from the call
+        :Returns: generator of (option, result) tuples in the order the options finish.
+            For an option that failed or timed out, the result is the exception (TimeoutError on timeout).
+        """
+        possible_options = self.top_options()
+        futures = {}
+        for item in options:
+            function_to_call = possible_options.get(item.upper())
+            if function_to_call is not None:
+                futures[self.executor.submit(function_to_call, as_json)] = item
+        pending = set(futures)
+        try:
+            for future in as_completed(futures, timeout=timeout):
+                pending.discard(future)
+                yield futures[future], self.__future_result__(future)
+        except FuturesTimeoutError:
+            for future in pending:
+                if future.done():
+                    yield futures[future], self.__future_result__(future)
+                else:
+                    future.cancel()
+                    yield futures[future], TimeoutError('%s did not finish within %s seconds' % (futures[future], timeout))
+
+    def get_top_all(self, *options, as_json=False, timeout=None):
+        """
+        Gets the top lists of all the options concurrently, see get_top_as_completed
+        :Returns: dict of option -> result, or the exception for the options that failed or timed out
+        """
+        return dict(self.get_top_as_completed(*options, as_json=as_json, timeout=timeout))
+
+    @staticmethod
+    def __future_result__(future):
+        error = future.exception()
+        return error if error is not None else future.result()
+
+    def top_options(self):
+        """
+        :returns: dict mapping the options accepted by get_top to the methods fetching them
+        """
+        return {
             'GAINERS': self.get_top_gainers,
             'LOSERS': self.get_top_losers,
             'VOLUME': self.get_top_volume,
@@ -353,119 +632,72 @@ class Nse():
             'ADVANCES DECLINE': self.get_advances_declines,
             'INDEX LIST': self.get_index_list
         }
-        for item in options:
-            function_to_call = possible_options.get(item.upper())
-            if function_to_call is not None:
-                yield function_to_call(as_json)
 
-    @conditional_decorator(lru_cache(maxsize=__cache_size__), not market_status())
+    @instance_cache(live=True)
     def get_top_gainers(self, as_json=False):
         """
         :return: pandas DataFrame | JSON containing top gainers of the day
         """
-        url = self.top_gainer_url
-        res = read_url(url, self.headers)
-        res_dict = json.load(res)
-        # clean the output and make appropriate type conversions
-        res_list = [self.clean_server_response(
-            item) for item in res_dict['data']]
-        response = self.render_response(res_list, as_json)
-        if as_json:
-            return response
-        else:
-            return pd.DataFrame(response).set_index('symbol')
+        res = read_url_bytes(self.top_gainer_url, self.headers, self.transport)
+        return self.parse_top_list(res, 'symbol', as_json)
 
-    @conditional_decorator(lru_cache(maxsize=__cache_size__), not market_status())
+    @instance_cache(live=True)
     def get_top_losers(self, as_json=False):
         """
         :return: pandas DataFrame | JSON containing top losers of the day
         """
-        url = self.top_loser_url
-        res = read_url(url, self.headers)
-        res_dict = json.load(res)
-        # clean the output and make appropriate type conversions
-        res_list = [self.clean_server_response(item)
-                    for item in res_dict['data']]
-        response = self.render_response(res_list, as_json)
-        if as_json:
-            return response
-        else:
-            return pd.DataFrame(response).set_index('symbol')
+        res = read_url_bytes(self.top_loser_url, self.headers, self.transport)
+        return self.parse_top_list(res, 'symbol', as_json)
 
-    @conditional_decorator(lru_cache(maxsize=__cache_size__), not market_status())
+    @instance_cache(live=True)
     def get_top_volume(self, as_json=False):
         """
         :return: pandas DataFrame | JSON containing top volume gainers of the day
         """
-        url = self.top_volume_url
-        res = read_url(url, self.headers)
-        res_dict = json.load(res)
-        # clean the output and make appropriate type conversions
-        res_list = [self.clean_server_response(
-            item) for item in res_dict['data']]
-        response = self.render_response(res_list, as_json)
-        if as_json:
-            return response
-        else:
-            return pd.DataFrame(response).set_index('sym')
+        res = read_url_bytes(self.top_volume_url, self.headers, self.transport)
+        return self.parse_top_list(res, 'sym', as_json)
 
-    @conditional_decorator(lru_cache(maxsize=__cache_size__), not market_status())
+    @instance_cache(live=True)
     def get_most_active(self, as_json=False):
         """
         :return: pandas DataFrame | JSON containing most active equites of the day
         """
-        url = self.most_active_url
-        res = read_url(url, self.headers)
-        res_dict = json.load(res)
-        # clean the output and make appropriate type conversions
-        res_list = [self.clean_server_response(
-            item) for item in res_dict['data']]
-        response = self.render_response(res_list, as_json)
-        if as_json:
-            return response
-        else:
-            return pd.DataFrame(response).set_index('symbol')
+        res = read_url_bytes(self.most_active_url, self.headers, self.transport)
+        return self.parse_top_list(res, 'symbol', as_json)
 
-    @conditional_decorator(lru_cache(maxsize=__cache_size__), not market_status())
+    @instance_cache(live=True)
     def get_advances_declines(self, as_json=False):
         """
         :return: pandas DataFrame | JSON with advance decline data
         :raises: URLError, HTTPError
         """
-        url = self.advances_declines_url
-        resp = read_url(url, self.headers)
-        resp_dict = json.load(resp)
-        resp_list = [self.clean_server_response(item)
-                     for item in resp_dict['data']]
-        response = self.render_response(resp_list, as_json)
-        if as_json:
-            return response
-        else:
-            return pd.DataFrame(response).set_index('indice')
+        resp = read_url_bytes(self.advances_declines_url, self.headers, self.transport)
+        return self.parse_top_list(resp, 'indice', as_json)
+
+    @instance_cache(live=True)
+    def get_index_snapshot(self):
+        """
+        Fetches the quotes of every index in a single request.
+        The index list, index validation and index quotes are all served from this snapshot.
+        :returns: indices.IndexSnapshot, with the time it was fetched at in fetched_at
+        """
+        resp = read_url_bytes(self.index_url, self.headers, self.transport)
+        return self.parse_index_snapshot(resp)
 
-    @lru_cache(maxsize=__cache_size__)
     def get_index_list(self, as_json=False):
         """
         get list of indices and codes
         params: as_json: True | False
         returns: a list | json of index codes
         """
-        url = self.index_url
-        resp = read_url(url, self.headers)
-        resp_list = json.load(resp)['data']
-        index_list = [str(item['name']) for item in resp_list]
-        return self.render_response(index_list, as_json)
-        
+        return self.render_response(self.get_index_snapshot().names, as_json)
 
-    @lru_cache(maxsize=__cache_size__)
     def is_valid_index(self, code):
         """
         returns: True | Flase , based on whether code is valid
         """
-        index_list = self.get_index_list()
-        return True if code.upper() in index_list else False
+        return code in self.get_index_snapshot()
 
-    @conditional_decorator(lru_cache(maxsize=__cache_size__), not market_status())
     def get_index_quote(self, code, as_json=False):
         """
         params:
@@ -474,20 +706,346 @@ class Nse():
         returns:
             a dict | json quote for the given index
         """
-        url = self.index_url
-        if self.is_valid_index(code):
-            resp = read_url(url, self.headers)
-            resp_list = json.load(resp)['data']
-            # this is list of dictionaries
-            resp_list = [self.clean_server_response(item)
-                         for item in resp_list]
-            # search the right list element to return
-            search_flag = False
-            for item in resp_list:
-                if item['name'] == code.upper():
-                    search_flag = True
-                    break
-            return self.render_response(item, as_json) if search_flag else None
+        return self.render_index_quote(self.get_index_snapshot(), code, as_json)
+
+    def get_index_quotes(self, *codes, as_json=False):
+        """
+        Gets the quotes of many indices from a single snapshot
+        params:
+            codes : string index codes
+            as_json: True|False
+        returns:
+            pandas DataFrame indexed by name | list of json quotes, None for invalid codes
+        """
+        return self.render_index_quotes(self.get_index_snapshot(), codes, as_json)
+
+    def parse_index_snapshot(self, body):
+        """
+        :returns: indices.IndexSnapshot of the Indices1.json response
+        """
+        with self.metrics.span('parse', kind='index_snapshot'):
+            return IndexSnapshot.from_json(body)
+
+    def parse_stock_codes(self, stream):
+        """
+        Parses the equity list (EQUITY_L.csv) into a typed DataFrame
+        :Parameters:
+        stream: binary file like object of the csv
+        :returns: pandas DataFrame
+        """
+        import pandas as pd
+
+        columns = ['Symbol', 'Name', 'Series', 'Date of Listing', 'Paid up Value', 'Market Lot', 'ISIN Number', 'Face Value']
+        # The span includes reading the rest of the stream off the network
+        with self.metrics.span('parse', kind='stock_codes'):
+            # The header row is replaced by our own column names.
+            # Everything is read as text first so that malformed rows are coerced rather than failing the load
+            res_dataframe = pd.read_csv(stream, header=0, names=columns, dtype=str, encoding='latin-1',
+                                        skipinitialspace=True, skip_blank_lines=True)
+        with self.metrics.span('clean', kind='stock_codes'):
+            res_dataframe['Series'] = res_dataframe['Series'].astype('category')
+            res_dataframe['Date of Listing'] = pd.to_datetime(res_dataframe['Date of Listing'], format='%d-%b-%Y', errors='coerce')
+            for column in ['Paid up Value', 'Market Lot', 'Face Value']:
+                res_dataframe[column] = pd.to_numeric(res_dataframe[column], errors='coerce')
+        return res_dataframe
+
+    def parse_quote(self, page, as_json=False):
+        """
+        Extracts the quote from the GetQuote.jsp page
+        :Parameters:
+        page: str
+            The html of the page
+        :returns: dict | json of the quote
+        :raises: Exception if the symbol was not traded today
+        """
+        # The payload is decoded and cleaned in one pass
+        try:
+            with self.metrics.span('parse', kind='quote'):
+                response = parse_quote_payload(page)['data'][0]
+        except Exception:
+            raise Exception('Symbol Not Traded today')
+        return self.render_response(response, as_json)
+
+    def parse_watched_quote(self, body):
+        """
+        :Parameters:
+        body: bytes of the GetQuote.jsp page
+        :returns: dict of the quote, None if the symbol was not traded
+        """
+        try:
+            return self.parse_quote(body.decode('latin-1'))
+        except Exception:
+            return None
+
+    def quote_changes(self, quotes, symbols, polled):
+        """
+        Updates the last known quotes with those polled
+        :Parameters:
+        quotes: dict
+            symbol -> last known quote, updated in place
+        symbols: list
+            The symbols polled
+        polled: list
+            The quotes polled for the symbols, None for those that did not change
+        :returns: dict of symbol -> dict of the fields that changed
+        """
+        changes = {}
+        for symbol, quote in zip(symbols, polled):
+            if quote is None:
+                continue
+            previous = quotes.get(symbol, {})
+            changed = {field: value for field, value in quote.items()
+                       if field not in previous or previous[field] != value}
+            quotes[symbol] = quote
+            if changed:
+                changes[symbol] = changed
+        return changes
+
+    def watch_delay(self, interval, closed_interval, now=None):
+        """
+        :returns: seconds to wait before polling again, from now (defaults to the current time)
+        """
+        calendar = self.trading_calendar()
+        now = now or datetime.now()
+        if calendar.is_open(now):
+            return interval
+        until_open = (calendar.next_session(now) - now).total_seconds()
+        return max(interval, min(closed_interval, until_open))
+
+    @staticmethod
+    def snapshot_symbols(codes, index):
+        """
+        :Parameters:
+        codes: the stock codes passed to snapshot_all, empty for the whole equity list
+        index: symbols.SymbolIndex of the equity list
+        :returns: tuple of the list of symbols to quote and a dict of code -> ValueError for the invalid codes
+        """
+        if not codes:
+            return list(index), {}
+        valid_codes, invalid_codes = index.validate(codes)
+        symbols = list(dict.fromkeys(code.upper() for code in codes if code in valid_codes))
+        return symbols, {code: ValueError('%s is not a valid stock code' % code) for code in invalid_codes}
+
+    def snapshot_result(self, quotes, errors, symbol, result):
+        """
+        Files the quote, or the exception raised fetching it, of a symbol of a snapshot
+        """
+        if isinstance(result, BaseException):
+            errors[symbol] = result
+        else:
+            quotes[symbol] = result
+        self.metrics.increment('snapshot_quotes', kind='failed' if isinstance(result, BaseException) else 'quoted')
+
+    def snapshot_timed_out(self, errors, symbols, timeout):
+        """
+        Files a TimeoutError for the symbols of a snapshot left out by its timeout
+        """
+        for symbol in symbols:
+            errors[symbol] = TimeoutError('%s was not quoted within %s seconds' % (symbol, timeout))
+        self.metrics.increment('snapshot_quotes', len(symbols), kind='timed_out')
+
+    def render_snapshot(self, symbols, quotes, errors, started):
+        """
+        :returns: quotes.Snapshot of the quotes in the order of the symbols
+        """
+        with self.metrics.span('frame', kind='snapshot'):
+            batch = QuoteBatch.from_quotes(quotes[symbol] for symbol in symbols if symbol in quotes)
+        return Snapshot(batch, errors, len(symbols) + sum(1 for symbol in errors if symbol not in symbols),
+                        monotonic() - started)
+
+    def render_quotes(self, quotes, as_json=False):
+        """
+        Combines the quotes of many symbols
+        :Parameters:
+        quotes: list
+            The quotes as returned by parse_quote, None for invalid codes
+        :returns: list of json quotes | pandas DataFrame indexed by symbol, None if there are no quotes
+        """
+        if as_json:
+            return quotes
+        # Filter out all the Nones from the list
+        quotes = [x for x in quotes if x is not None]
+        if quotes:
+            import pandas as pd
+            with self.metrics.span('frame', kind='quote', rows=len(quotes)):
+                return pd.DataFrame(quotes).set_index('symbol')
+
+    def history_urls(self, code_date):
+        """
+        Plans the requests for the history of one symbol. Every request covers at most HISTORY_WINDOW days.
+        :Parameters:
+        code_date: tuple of code, from_date and to_date as accepted by get_history
+        :returns: list of urls to request, in the order of the dates
+        """
+        # NSE does not return more than 100 days of data at once.
+        # To get data for 365 days, we got to download the csv. The csv does not seem to be downloading from a url
+        # So currently we get the data in windows of 100 days
+        start, end = parse_date(code_date[1]), parse_date(code_date[2])
+        urls = []
+        while start <= end:
+            window_end = min(start + timedelta(days=self.HISTORY_WINDOW - 1), end)
+            urls.append(self.build_url_for_history(code_date[0], start.strftime('%d-%m-%Y'), window_end.strftime('%d-%m-%Y')))
+            start = window_end + timedelta(days=1)
+        return urls
+
+    def history_plan(self, code_date):
+        """
+        Plans the requests for the history of one symbol, skipping the dates already in the history store
+        :Parameters:
+        code_date: tuple of code, from_date and to_date as accepted by get_history
+        :returns: list of (start, end, urls) tuples, one for every date range to fetch
+        """
+        start, end = parse_date(code_date[1]), parse_date(code_date[2])
+        gaps = self.history_store.missing(code_date[0], start, end) if self.history_store else [(start, end)]
+        calendar = self.trading_calendar()
+        plan = []
+        for gap_start, gap_end in gaps:
+            # There is nothing to fetch for the weekends and holidays at the ends of a range,
+            # nor for a range without any trading day
+            first, last = calendar.next_trading_day(gap_start), calendar.previous_trading_day(gap_end)
+            urls = self.history_urls((code_date[0], first, last)) if first <= last else []
+            plan.append((gap_start, gap_end, urls))
+        return plan
+
+    def combine_history(self, code_date, plan, gap_pages, as_json=False):
+        """
+        Parses the pages fetched for a plan made by history_plan.
+        With a history store, the new ranges are saved to it and the whole range is read back from it.
+        :Parameters:
+        gap_pages: list
+            The pages fetched for every range in the plan
+        :returns: pandas DataFrame indexed by date | json
+        """
+        if self.history_store is None:
+            return self.parse_history([page for pages in gap_pages for page in pages], as_json)
+        for (gap_start, gap_end, _), pages in zip(plan, gap_pages):
+            self.history_store.append(code_date[0], self.parse_history(pages), gap_start, gap_end)
+        history_df = self.history_store.load(code_date[0], parse_date(code_date[1]), parse_date(code_date[2]))
+        return history_df.to_json() if as_json else history_df
+
+    def parse_history(self, pages, as_json=False):
+        """
+        Combines the history tables of the pages requested for one symbol
+        :Parameters:
+        pages: list
+            The html of each of the pages
+        :returns: pandas DataFrame indexed by date | json
+        """
+        import pandas as pd
+
+        with self.metrics.span('parse', kind='history', pages=len(pages)):
+            frames = [pd.read_html(io.StringIO(page), header=0, index_col='Date')[0] for page in pages]
+        with self.metrics.span('frame', kind='history'):
+            history_df = pd.concat(frames) if frames else pd.DataFrame()
+            if not history_df.empty:
+                history_df.index = pd.to_datetime(history_df.index, dayfirst=True, errors='coerce')
+                # Windows never overlap, but the server may repeat the boundary dates
+                history_df = history_df[~history_df.index.duplicated(keep='last')].sort_index()
+        if as_json:
+            return history_df.to_json()
+        return history_df
+
+    def parse_peer_companies(self, page, as_json=False):
+        """
+        Extracts the peer companies from the ajaxPeerCompanies.jsp response
+        :Parameters:
+        page: str
+            The response text
+        :returns: pandas DataFrame | json of the peer companies
+        """
+        import pandas as pd
+
+        with self.metrics.span('parse', kind='peer_companies'):
+            records = parse_peer_payload(page)
+        for record in records:
+            record.pop('industry', None)
+        with self.metrics.span('frame', kind='peer_companies', rows=len(records)):
+            data = pd.DataFrame.from_records(records)
+        return data.to_json() if as_json else data
+
+    def combine_peer_groups(self, groups, as_json=False):
+        """
+        Combines the peer groups of many companies, dropping the companies repeated across groups
+        :Parameters:
+        groups: dict
+            symbol requested -> DataFrame returned by get_peer_companies
+        :returns: pandas DataFrame | json with a 'group' column holding the symbol whose peers the row came from
+        """
+        import pandas as pd
+
+        frames = [frame.assign(group=code) for code, frame in groups.items() if frame is not None and not frame.empty]
+        data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if 'symbol' in data.columns:
+            data = data.drop_duplicates('symbol').reset_index(drop=True)
+        return data.to_json() if as_json else data
+
+    def parse_top_list(self, body, index_column, as_json=False):
+        """
+        Cleans one of the top lists (gainers, losers, volume, active, advances declines)
+        :Parameters:
+        body: bytes
+            The json response
+        index_column: str
+            The column identifying every row
+        :returns: pandas DataFrame indexed by index_column | json
+        """
+        with self.metrics.span('parse', kind='top_list'):
+            records = json.loads(body)['data']
+        # clean the output and make appropriate type conversions
+        if as_json:
+            return self.render_response([self.clean_server_response(item) for item in records], as_json)
+        return self.clean_records(records).set_index(index_column)
+
+    def render_index_quote(self, snapshot, code, as_json=False):
+        """
+        :returns: a dict | json quote for the given index from the snapshot, None if it is not found
+        """
+        quote = snapshot.quote(code)
+        if quote is not None:
+            # Hand out a copy, the snapshot may be cached
+            return self.render_response(dict(quote), as_json)
+
+    def render_index_quotes(self, snapshot, codes, as_json=False):
+        """
+        :returns: pandas DataFrame of the valid indices, indexed by name | list of json quotes, None for invalid codes
+        """
+        if as_json:
+            return [self.render_index_quote(snapshot, code, as_json) for code in codes]
+        names = [snapshot.quote(code)['name'] for code in codes if code in snapshot]
+        if names:
+            return snapshot.frame().loc[names]
+
+    def __cache_expiry__(self, live):
+        """
+        Decides till when a response can be served from the cache
+        :Parameters:
+        live: bool
+            Whether the data changes while the market is open
+        :returns: epoch time at which the cached response expires
+        """
+        calendar = self.trading_calendar()
+        if live and calendar.is_open():
+            return datetime.now().timestamp() + self.cache_ttl
+        return calendar.next_session().timestamp()
+
+    def trading_calendar(self):
+        """
+        :returns: trading_calendar.TradingCalendar telling the market hours, see nse.trading_calendar.
+            The holiday page is requested over the transport of this instance.
+        """
+        return trading_calendar(self.transport)
+
+    def cache_stats(self):
+        """
+        :returns: dict with the hits, misses, evictions and size of the response cache
+        """
+        return self.cache.stats()
+
+    def throttle_stats(self):
+        """
+        :returns: dict with the rate, concurrency limit, requests in flight, retries and throttled responses of the transport
+        """
+        return self.transport.throttle.stats()
 
     def nse_headers(self):
         """
@@ -541,21 +1099,17 @@ class Nse():
         :param resp_dict:
         :return: dict with all above substitution
         """
-        # change all the keys from unicode to string
-        d = {}
-        for key, value in resp_dict.items():
-            d[str(key)] = value
-        resp_dict = d
-        for key, value in resp_dict.items():
-            if type(value) is str:
-                if '-' == value:
-                    resp_dict[key] = None
-                elif re.search(r'^[-]?[0-9,.]+$', value):
-                    # replace , to '', and type cast to int
-                    resp_dict[key] = float(re.sub(',', '', value))
-                else:
-                    resp_dict[key] = str(value)
-        return resp_dict
+        with self.metrics.span('clean', kind='dict'):
+            return clean_dict(resp_dict)
+
+    def clean_records(self, records):
+        """
+        cleans a batch of server responses into a frame, see utils.clean_frame
+        :param records: list of dicts
+        :return: pandas DataFrame with numeric columns cast to float
+        """
+        with self.metrics.span('clean', kind='frame', rows=len(records)):
+            return clean_frame(records)
 
     def render_response(self, data, as_json=False):
         if as_json is True:
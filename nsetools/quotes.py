@@ -0,0 +1,217 @@
+"""
+Contains the compact storage of the quotes of many symbols
+"""
+import sys
+import json
+
+
+class QuoteBatch():
+    """
+    The quotes of many symbols held column by column, instead of a dict per symbol.
+    Fields holding only numbers are stored in float64 arrays (NaN where NSE sent '-'),
+    the other fields in lists sharing one string object per distinct value.
+    Dicts, DataFrames and json are only built when asked for.
+    """
+    def __init__(self, symbols, fields, numeric, text):
+        """
+        :Parameters:
+        symbols: list
+            The symbol of every row
+        fields: list
+            All the field names, in the order NSE sends them
+        numeric: dict
+            field -> numpy float64 array of the numeric fields
+        text: dict
+            field -> list of the values of the other fields
+        """
+        self.symbols = symbols
+        self.fields = fields
+        self.__numeric__ = numeric
+        self.__text__ = text
+        self.__rows__ = {symbol: row for row, symbol in enumerate(symbols)}
+
+    @classmethod
+    def from_quotes(cls, quotes):
+        """
+        :Parameters:
+        quotes: iterable
+            dict quotes as returned by Nse.parse_quote. Nones are skipped.
+        :returns: QuoteBatch
+        """
+        import numpy as np
+
+        quotes = [quote for quote in quotes if quote is not None]
+        fields = list(dict.fromkeys(field for quote in quotes for field in quote))
+        numeric, text = {}, {}
+        for field in fields:
+            if field == 'symbol':
+                continue
+            values = [quote.get(field) for quote in quotes]
+            if any(value is not None for value in values) and all(value is None or type(value) is float for value in values):
+                numeric[field] = np.array([np.nan if value is None else value for value in values], dtype=np.float64)
+            else:
+                text[field] = [sys.intern(value) if type(value) is str else value for value in values]
+        symbols = [sys.intern(str(quote['symbol'])) for quote in quotes]
+        return cls(symbols, fields, numeric, text)
+
+    @classmethod
+    def concat(cls, batches):
+        """
+        Joins batches, e.g. those fetched by different processes, without going through dicts.
+        A field numeric in some batches and not in others ends up in a list.
+        :Parameters:
+        batches: iterable
+            QuoteBatch to join, in order
+        :returns: QuoteBatch
+        """
+        import numpy as np
+
+        batches = [batch for batch in batches if len(batch)]
+        fields = list(dict.fromkeys(field for batch in batches for field in batch.fields))
+        numeric, text = {}, {}
+        for field in fields:
+            if field == 'symbol':
+                continue
+            if all(field in batch.__numeric__ or field not in batch.fields for batch in batches):
+                numeric[field] = np.concatenate([batch.__numeric__[field] if field in batch.__numeric__
+                                                 else np.full(len(batch), np.nan) for batch in batches])
+            else:
+                # Strings unpickled from other processes are interned again, so that they are shared once more
+                text[field] = [sys.intern(value) if type(value) is str else value
+                               for batch in batches for value in batch.__values__(field)]
+        symbols = [sys.intern(symbol) for batch in batches for symbol in batch.symbols]
+        return cls(symbols, fields, numeric, text)
+
+    def column(self, field):
+        """
+        :returns: numpy float64 array of a numeric field, list of the values of any other field
+        :raises: KeyError if there is no such field
+        """
+        if field == 'symbol':
+            return list(self.symbols)
+        if field in self.__numeric__:
+            return self.__numeric__[field]
+        return self.__text__[field]
+
+    @property
+    def numeric_fields(self):
+        """
+        list of the fields stored in float64 arrays
+        """
+        return list(self.__numeric__)
+
+    def quote(self, symbol):
+        """
+        :returns: dict quote of the symbol in the same shape as Nse.parse_quote, None if it is not in the batch
+        """
+        row = self.__rows__.get(symbol.upper())
+        if row is not None:
+            return self.__quote__(row)
+
+    def quotes(self):
+        """
+        :returns: list of the dict quotes of every symbol
+        """
+        return [self.__quote__(row) for row in range(len(self.symbols))]
+
+    def to_frame(self):
+        """
+        :returns: pandas DataFrame indexed by symbol, the same as Nse.get_quote returns
+        """
+        import pandas as pd
+
+        columns = {field: self.column(field) for field in self.fields if field != 'symbol'}
+        return pd.DataFrame(columns, index=pd.Index(self.symbols, name='symbol'))
+
+    def to_json(self):
+        """
+        :returns: list of json quotes, the same as Nse.get_quote returns with as_json
+        """
+        return [json.dumps(quote) for quote in self.quotes()]
+
+    def memory_usage(self, deep=True):
+        """
+        :returns: int approximate bytes held by the batch, counting every distinct string once
+        """
+        size = sum(array.nbytes for array in self.__numeric__.values())
+        size += sys.getsizeof(self.symbols) + sum(sys.getsizeof(values) for values in self.__text__.values())
+        if deep:
+            distinct = {id(value): value for values in [self.symbols] + list(self.__text__.values()) for value in values}
+            size += sum(sys.getsizeof(value) for value in distinct.values())
+        return size
+
+    def __values__(self, field):
+        if field in self.__numeric__:
+            return [None if value != value else value for value in self.__numeric__[field].tolist()]
+        return self.__text__.get(field, [None] * len(self.symbols))
+
+    def __quote__(self, row):
+        quote = {}
+        for field in self.fields:
+            if field == 'symbol':
+                quote[field] = self.symbols[row]
+            elif field in self.__numeric__:
+                value = float(self.__numeric__[field][row])
+                # NaN stands for the None NSE sent as '-'
+                quote[field] = None if value != value else value
+            else:
+                quote[field] = self.__text__[field][row]
+        return quote
+
+    def __contains__(self, symbol):
+        return isinstance(symbol, str) and symbol.upper() in self.__rows__
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def __iter__(self):
+        return iter(self.symbols)
+
+
+class Snapshot():
+    """
+    The quotes of a whole list of symbols taken at once, along with the error of every symbol
+    that could not be quoted, so that one failure does not cost the rest of the quotes.
+    """
+    def __init__(self, batch, errors, requested, elapsed):
+        """
+        :Parameters:
+        batch: QuoteBatch
+            The quotes fetched, in the order the symbols were asked for
+        errors: dict
+            symbol -> exception raised quoting it. TimeoutError for the symbols left out by the timeout.
+        requested: int
+            The number of symbols asked for
+        elapsed: float
+            Seconds the snapshot took
+        """
+        self.batch = batch
+        self.errors = errors
+        self.requested = requested
+        self.elapsed = elapsed
+
+    @property
+    def complete(self):
+        """
+        bool indicating whether every symbol was quoted
+        """
+        return not self.errors
+
+    @property
+    def failed(self):
+        """
+        list of the symbols that could not be quoted
+        """
+        return list(self.errors)
+
+    def to_frame(self):
+        """
+        :returns: pandas DataFrame indexed by symbol with float64 numeric columns, see QuoteBatch.to_frame
+        """
+        return self.batch.to_frame()
+
+    def __len__(self):
+        return len(self.batch)
+
+    def __repr__(self):
+        return 'Snapshot(%d of %d symbols in %.2fs, %d errors)' % (len(self.batch), self.requested, self.elapsed, len(self.errors))
@@ -0,0 +1,176 @@
+"""
+Contains the engine spreading the fetching and parsing of many symbols over worker processes
+"""
+import pickle
+import multiprocessing
+
+from math import ceil
+from time import monotonic, time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from nsetools.nse import Nse, set_trading_calendar
+from nsetools.net_utils import Transport
+from nsetools.throttle import Throttle
+from nsetools.quotes import QuoteBatch, Snapshot
+
+# The Nse of the worker process, created by __start_worker__
+__WORKER_NSE__ = None
+
+
+class ShardedNse():
+    """
+    Splits lists of symbols into shards fetched by a pool of worker processes, each with its own Nse and transport,
+    so that parsing and cleaning use every core instead of contending for one interpreter.
+    The equity list and the trading calendar are read once, here, and handed to every worker as it starts.
+    The limits on the requests apply to the whole pool: every worker gets its share of them.
+    Results travel back pickled by the pool, with the numeric columns of the quotes as numpy arrays
+    copied as raw bytes rather than rendered to text.
+    """
+    def __init__(self, processes=None, max_concurrency=16, rate=None, nse_options=None, transport_options=None,
+                 symbol_index=None, calendar=None, mp_context=None):
+        """
+        :Parameters:
+            processes: (optional) number of worker processes. Defaults to the number of cores,
+            and is cut down to max_concurrency, so that every worker can have a request in flight.
+            max_concurrency: (optional) maximum requests in flight across all the workers
+            rate: (optional) maximum requests per second across all the workers. None does not limit the rate.
+            nse_options: (optional) dict of the keyword arguments of the Nse of every worker.
+            max_workers defaults to the share of max_concurrency of a worker.
+            transport_options: (optional) dict of the keyword arguments of the net_utils.Transport of every worker,
+            other than the throttle, which is built from max_concurrency and rate
+            symbol_index: (optional) symbols.SymbolIndex of the equity list. Requested from NSE by default.
+            calendar: (optional) trading_calendar.TradingCalendar. Built from the holiday page by default.
+            mp_context: (optional) multiprocessing context starting the workers. Defaults to spawn,
+            as forking a process with live connections and threads is not safe.
+        """
+        self.processes = min(processes or multiprocessing.cpu_count(), max_concurrency)
+        self.transport_options = dict(transport_options or {})
+        # Every worker throttles its own requests, so the limits of the pool are split between them
+        self.throttle_options = {'max_concurrency': max_concurrency // self.processes,
+                                 'rate': rate / self.processes if rate else None}
+        self.nse_options = dict(nse_options or {})
+        self.nse_options.setdefault('max_workers', self.throttle_options['max_concurrency'])
+        if symbol_index is None or calendar is None:
+            with Nse(transport=Transport(**self.transport_options)) as nse:
+                symbol_index = symbol_index or nse.get_symbol_index()
+                calendar = calendar or nse.trading_calendar()
+        self.symbol_index = symbol_index
+        self.calendar = calendar
+        self.__executor__ = ProcessPoolExecutor(
+            self.processes, mp_context=mp_context or multiprocessing.get_context('spawn'),
+            initializer=__start_worker__,
+            initargs=(self.nse_options, self.transport_options, self.throttle_options, self.symbol_index,
+                      self.calendar))
+
+    def close(self):
+        """
+        Shuts down the worker processes
+        """
+        self.__executor__.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def shards(self, items, shard_size=None):
+        """
+        :returns: list of the lists the items are split into. By default every process gets about four,
+            so that a slow shard does not hold up the others.
+        """
+        items = list(items)
+        shard_size = shard_size or max(1, ceil(len(items) / (self.processes * 4)))
+        return [items[start:start + shard_size] for start in range(0, len(items), shard_size)]
+
+    def snapshot_all(self, *codes, shard_size=None, timeout=None, progress=None):
+        """
+        Quotes the whole equity list (or the given stock codes) across the worker processes. See Nse.snapshot_all
+        :Parameters:
+        shard_size: int
+            (optional) symbols per shard
+        timeout: float
+            (optional) Seconds the whole snapshot gets
+        progress: callable
+            (optional) Called after every shard with the number of symbols done, the total and the number that failed
+        :returns: quotes.Snapshot with the quotes fetched and the error of every symbol that was not
+        """
+        started = monotonic()
+        symbols, errors = Nse.snapshot_symbols(codes, self.symbol_index)
+        deadline = None if timeout is None else time() + timeout
+        futures = {self.__executor__.submit(__snapshot_shard__, shard, deadline): shard
+                   for shard in self.shards(symbols, shard_size)}
+        batches, done = {}, 0
+        for future in as_completed(futures):
+            shard = futures[future]
+            try:
+                batches[shard[0]], shard_errors = future.result()
+            except Exception as error:
+                shard_errors = dict.fromkeys(shard, error)
+            errors.update(shard_errors)
+            done += len(shard)
+            if progress is not None:
+                progress(done, len(symbols), len(errors))
+        batch = QuoteBatch.concat(batches[shard[0]] for shard in futures.values() if shard[0] in batches)
+        return Snapshot(batch, errors, len(symbols) + sum(1 for symbol in errors if symbol not in symbols),
+                        monotonic() - started)
+
+    def get_history(self, *codes_dates, shard_size=None):
+        """
+        Gets the history of many symbols across the worker processes. See Nse.get_history
+        :returns: list of pandas DataFrames, one per tuple of code and dates (None for invalid codes)
+        :raises: the first exception raised by a worker
+        """
+        results = self.__executor__.map(__history_shard__, self.shards(codes_dates, shard_size))
+        return [frame for frames in results for frame in frames]
+
+    def get_peer_companies_many(self, *codes, as_json=False, shard_size=None):
+        """
+        Gets the peer companies of many companies across the worker processes. See Nse.get_peer_companies_many
+        :returns: pandas DataFrame | json of all the peers
+        :raises: the first exception raised by a worker
+        """
+        import pandas as pd
+
+        codes = list(dict.fromkeys(code.upper() for code in codes))
+        frames = [frame for frame in self.__executor__.map(__peers_shard__, self.shards(codes, shard_size))
+                  if not frame.empty]
+        data = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+        if 'symbol' in data.columns:
+            # Companies of the same industry in different shards
+            data = data.drop_duplicates('symbol').reset_index(drop=True)
+        return data.to_json() if as_json else data
+
+
+def __start_worker__(nse_options, transport_options, throttle_options, symbol_index, calendar):
+    global __WORKER_NSE__
+    set_trading_calendar(calendar)
+    nse = Nse(transport=Transport(throttle=Throttle(**throttle_options), **transport_options), **nse_options)
+    nse.set_symbol_index(symbol_index)
+    __WORKER_NSE__ = nse
+
+
+def __picklable__(error):
+    # Some exceptions, such as an HTTPError holding its response, do not survive pickling
+    try:
+        pickle.loads(pickle.dumps(error))
+        return error
+    except Exception:
+        return Exception('%s: %s' % (type(error).__name__, error))
+
+
+def __snapshot_shard__(symbols, deadline):
+    timeout = None if deadline is None else max(0, deadline - time())
+    snapshot = __WORKER_NSE__.snapshot_all(*symbols, timeout=timeout)
+    # Returned as they are: the pool pickles them once, in-band, the arrays of the batch as their raw bytes
+    return snapshot.batch, {symbol: __picklable__(error) for symbol, error in snapshot.errors.items()}
+
+
+def __history_shard__(codes_dates):
+    history = __WORKER_NSE__.get_history(*codes_dates)
+    # A single tuple gets its frame back rather than a list
+    return [history] if len(codes_dates) == 1 else history
+
+
+def __peers_shard__(codes):
+    return __WORKER_NSE__.get_peer_companies_many(*codes)
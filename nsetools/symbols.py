@@ -0,0 +1,85 @@
+"""
+Contains the index of the symbols listed on NSE
+"""
+import csv
+import io
+
+
+class SymbolIndex():
+    """
+    Hashed lookups over the equity list by symbol and ISIN
+    """
+    def __init__(self, rows):
+        """
+        :Parameters:
+        rows: iterable
+            tuples of symbol, name and ISIN number
+        """
+        self.__by_symbol__ = {}
+        self.__by_isin__ = {}
+        for symbol, name, isin in rows:
+            symbol = symbol.strip().upper()
+            isin = isin.strip().upper()
+            self.__by_symbol__[symbol] = (name.strip(), isin)
+            if isin:
+                self.__by_isin__[isin] = symbol
+
+    @classmethod
+    def from_csv(cls, stream):
+        """
+        Builds the index from EQUITY_L.csv without going through pandas
+        :Parameters:
+        stream: binary file like object of the csv
+        :returns: SymbolIndex
+        """
+        reader = csv.reader(io.TextIOWrapper(stream, encoding='latin-1', newline=''))
+        # The first row contains the column names
+        next(reader, None)
+        return cls((row[0], row[1], row[6]) for row in reader if len(row) > 6)
+
+    def is_valid(self, code):
+        """
+        :returns: bool indicating whether the symbol is listed
+        """
+        return isinstance(code, str) and code.upper() in self.__by_symbol__
+
+    def validate(self, codes):
+        """
+        Validates many symbols in a single pass
+        :Parameters:
+        codes: iterable of symbols
+        :returns: tuple of the set of valid and the set of invalid codes, as they were passed
+        """
+        valid, invalid = set(), set()
+        for code in codes:
+            (valid if self.is_valid(code) else invalid).add(code)
+        return valid, invalid
+
+    def isin(self, symbol):
+        """
+        :returns: the ISIN number of the symbol, or None if it is not listed
+        """
+        entry = self.__by_symbol__.get(symbol.upper())
+        return entry[1] if entry else None
+
+    def name(self, symbol):
+        """
+        :returns: the name of the company listed under the symbol, or None if it is not listed
+        """
+        entry = self.__by_symbol__.get(symbol.upper())
+        return entry[0] if entry else None
+
+    def symbol(self, isin):
+        """
+        :returns: the symbol listed against the ISIN number, or None if there is none
+        """
+        return self.__by_isin__.get(isin.upper())
+
+    def __contains__(self, code):
+        return self.is_valid(code)
+
+    def __len__(self):
+        return len(self.__by_symbol__)
+
+    def __iter__(self):
+        return iter(self.__by_symbol__)
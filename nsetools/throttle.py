@@ -0,0 +1,200 @@
+"""
+Contains the pacing of the requests sent to NSE: rate limiting, adaptive concurrency and retries
+"""
+import random
+import asyncio
+import threading
+
+from email.utils import parsedate_to_datetime
+from datetime import datetime, timezone
+from http.client import HTTPException
+from time import monotonic, sleep
+from urllib.error import HTTPError
+
+
+class Throttle():
+    """
+    Paces the requests sent over a transport.
+        - A token bucket bounds the rate at which requests are sent.
+        - An adaptive limit bounds the requests in flight. It grows by one for every window of
+          successful requests and is halved when the server throttles, fails or answers too slowly (AIMD).
+        - Requests failing with a throttling status or a connection error are retried
+          with jittered exponential backoff, waiting at least as long as Retry-After asks.
+    A throttle is used either from threads or from a single event loop, not both.
+    """
+    # Statuses that signal an overloaded (or throttling) server
+    RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self, rate=None, burst=None, max_concurrency=16, min_concurrency=1, latency_target=None,
+                 retries=3, backoff=0.5, max_backoff=30):
+        """
+        :Parameters:
+        rate: float
+            (optional) Maximum requests per second. None does not limit the rate.
+        burst: int
+            (optional) Requests that can be sent at once before the rate applies. Defaults to the rate.
+        max_concurrency: int
+            Maximum requests in flight. The adaptive limit starts here. None does not limit the concurrency.
+        min_concurrency: int
+            The adaptive limit never drops below this
+        latency_target: float
+            (optional) Seconds after which a response counts as the server being overloaded
+        retries: int
+            Maximum number of times a request is retried
+        backoff: float
+            Seconds to back off before the first retry, doubled with every retry
+        max_backoff: float
+            Maximum seconds to back off before a retry, unless the server asks for longer
+        """
+        self.rate = rate
+        self.burst = burst or max(1, rate or 1)
+        self.max_concurrency = max_concurrency
+        self.min_concurrency = min_concurrency
+        self.latency_target = latency_target
+        self.retries = retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+
+        self.limit = float(max_concurrency) if max_concurrency else None
+        self.in_flight = 0
+        self.requests = 0
+        self.retried = 0
+        self.throttled = 0
+        self.decreases = 0
+        self.__tokens__ = float(self.burst)
+        self.__updated__ = monotonic()
+        self.__condition__ = threading.Condition()
+        self.__released__ = None
+
+    def acquire(self):
+        """
+        Blocks till a request may be sent. Every acquire must be followed by a release.
+        """
+        with self.__condition__:
+            self.__condition__.wait_for(self.__has_room__)
+            self.in_flight += 1
+        delay = self.__take_token__()
+        if delay:
+            sleep(delay)
+
+    async def acquire_async(self):
+        """
+        asyncio counterpart of acquire
+        """
+        if self.__released__ is None:
+            self.__released__ = asyncio.Event()
+        while True:
+            self.__released__.clear()
+            with self.__condition__:
+                if self.__has_room__():
+                    self.in_flight += 1
+                    break
+            await self.__released__.wait()
+        delay = self.__take_token__()
+        if delay:
+            await asyncio.sleep(delay)
+
+    def release(self, latency, error=None):
+        """
+        Frees the slot of a request and adapts the concurrency limit to how the request went
+        :Parameters:
+        latency: float
+            Seconds the server took to respond
+        error: Exception
+            (optional) The error the request failed with
+        """
+        with self.__condition__:
+            self.in_flight -= 1
+            self.requests += 1
+            overloaded = self.is_retryable(error)
+            if overloaded:
+                self.throttled += 1
+            if self.limit is not None:
+                if overloaded or (self.latency_target and latency > self.latency_target):
+                    self.limit = max(float(self.min_concurrency), self.limit / 2)
+                    self.decreases += 1
+                else:
+                    self.limit = min(float(self.max_concurrency), self.limit + 1 / self.limit)
+            self.__condition__.notify_all()
+        if self.__released__ is not None:
+            self.__released__.set()
+
+    def retry_delay(self, attempt, error):
+        """
+        :Parameters:
+        attempt: int
+            The number of times the request has been retried already
+        error: Exception
+            The error the request failed with
+        :returns: seconds to wait before retrying, None if the request must not be retried
+        """
+        if attempt >= self.retries or not self.is_retryable(error):
+            return None
+        self.retried += 1
+        delay = random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+        if isinstance(error, HTTPError) and error.headers is not None:
+            delay = max(delay, parse_retry_after(error.headers.get('Retry-After')))
+        return delay
+
+    def is_retryable(self, error):
+        """
+        :returns: bool indicating whether the error signals an overloaded server or a dropped connection
+        """
+        if isinstance(error, HTTPError):
+            return error.code in self.RETRY_STATUSES
+        return isinstance(error, (ConnectionError, TimeoutError, asyncio.TimeoutError, HTTPException))
+
+    def stats(self):
+        """
+        :returns: dict with the rate, tokens left, concurrency limit, requests in flight,
+            requests completed, retries and throttled responses
+        """
+        with self.__condition__:
+            return {
+                'rate': self.rate,
+                'tokens': self.__tokens__,
+                'concurrency_limit': int(self.limit) if self.limit is not None else None,
+                'in_flight': self.in_flight,
+                'requests': self.requests,
+                'retries': self.retried,
+                'throttled': self.throttled,
+                'decreases': self.decreases
+            }
+
+    def __has_room__(self):
+        return self.limit is None or self.in_flight < int(self.limit)
+
+    def __take_token__(self):
+        """
+        Reserves a token from the bucket
+        :returns: seconds to wait till the token is available
+        """
+        if not self.rate:
+            return 0
+        with self.__condition__:
+            now = monotonic()
+            self.__tokens__ = min(float(self.burst), self.__tokens__ + (now - self.__updated__) * self.rate)
+            self.__updated__ = now
+            self.__tokens__ -= 1
+            return max(0.0, -self.__tokens__ / self.rate)
+
+
+def parse_retry_after(value):
+    """
+    :Parameters:
+    value: str
+        The Retry-After header, either in seconds or an HTTP date
+    :returns: seconds to wait, 0 if the header is missing or malformed
+    """
+    if not value:
+        return 0
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return 0
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
@@ -0,0 +1,143 @@
+"""
+Contains the trading calendar of NSE, answering which days and hours the market trades in
+"""
+import json
+
+from bisect import bisect_left, bisect_right
+from datetime import date, datetime, time, timedelta
+
+# The market opens at 9:15 am
+MARKET_OPEN = time(hour=9, minute=15)
+# And ends at 3:30 = 15:30
+MARKET_CLOSE = time(hour=15, minute=30)
+
+
+class TradingCalendar():
+    """
+    Every weekday that is not a trading holiday is a trading day.
+    The holidays are kept sorted, so that ranges are answered by bisecting them
+    and single days by a set lookup, without generating the weekends.
+    Holidays are only known till valid_through. Beyond it, every weekday counts as a trading day.
+    """
+    def __init__(self, holidays, valid_through=None, market_open=MARKET_OPEN, market_close=MARKET_CLOSE):
+        """
+        :Parameters:
+        holidays: iterable
+            datetime.date of the trading holidays. Weekends are left out, they are implied.
+        valid_through: datetime.date
+            (optional) The last date the holidays are known for
+        market_open, market_close: datetime.time
+            (optional) When a session opens and closes
+        """
+        self.holidays = sorted({day for day in holidays if day.weekday() < 5})
+        self.valid_through = valid_through
+        self.market_open = market_open
+        self.market_close = market_close
+        self.__holiday_set__ = frozenset(self.holidays)
+
+    def is_trading_day(self, day):
+        """
+        :returns: bool indicating whether the market trades on the date
+        """
+        return day.weekday() < 5 and day not in self.__holiday_set__
+
+    def is_open(self, now=None):
+        """
+        :returns: bool indicating whether a session is on at the time. Defaults to the current time.
+        """
+        now = now or datetime.now()
+        return self.is_trading_day(now.date()) and self.market_open < now.time() < self.market_close
+
+    def next_trading_day(self, day, inclusive=True):
+        """
+        :returns: the first trading day on or after (or just after, if not inclusive) the date
+        """
+        if not inclusive:
+            day += timedelta(days=1)
+        while not self.is_trading_day(day):
+            day += timedelta(days=1)
+        return day
+
+    def previous_trading_day(self, day, inclusive=True):
+        """
+        :returns: the last trading day on or before (or just before, if not inclusive) the date
+        """
+        if not inclusive:
+            day -= timedelta(days=1)
+        while not self.is_trading_day(day):
+            day -= timedelta(days=1)
+        return day
+
+    def next_session(self, now=None):
+        """
+        Finds when the next trading session opens
+        :Parameters:
+        now: datetime
+            The time to start looking from. Defaults to the current time.
+        :returns: datetime at which the next session opens
+        """
+        now = now or datetime.now()
+        day = self.next_trading_day(now.date(), inclusive=now.time() < self.market_open)
+        return datetime.combine(day, self.market_open)
+
+    def session_bounds(self, day):
+        """
+        :returns: tuple of the datetimes the session of the date opens and closes at, None if the market does not trade
+        """
+        if self.is_trading_day(day):
+            return datetime.combine(day, self.market_open), datetime.combine(day, self.market_close)
+
+    def trading_days_between(self, start, end):
+        """
+        :returns: int number of trading days from start to end, inclusive of both
+        """
+        if end < start:
+            return 0
+        days = (end - start).days + 1
+        weeks, remainder = divmod(days, 7)
+        weekdays = weeks * 5 + sum(1 for offset in range(remainder) if (start.weekday() + offset) % 7 < 5)
+        return weekdays - (bisect_right(self.holidays, end) - bisect_left(self.holidays, start))
+
+    def trading_days(self, start, end):
+        """
+        :returns: list of the trading days from start to end, inclusive of both
+        """
+        days = []
+        day = start
+        while day <= end:
+            if self.is_trading_day(day):
+                days.append(day)
+            day += timedelta(days=1)
+        return days
+
+    def holidays_between(self, start, end):
+        """
+        :returns: list of the trading holidays (weekends excluded) from start to end, inclusive of both
+        """
+        return self.holidays[bisect_left(self.holidays, start):bisect_right(self.holidays, end)]
+
+    def save(self, path):
+        """
+        Writes the calendar to a JSON file, to be read back by load
+        """
+        with open(path, 'w') as calendar_file:
+            json.dump({
+                'holidays': [day.isoformat() for day in self.holidays],
+                'valid_through': self.valid_through.isoformat() if self.valid_through else None,
+                'market_open': self.market_open.isoformat(),
+                'market_close': self.market_close.isoformat()
+            }, calendar_file)
+
+    @classmethod
+    def load(cls, path):
+        """
+        :returns: TradingCalendar read from a file written by save
+        """
+        with open(path) as calendar_file:
+            stored = json.load(calendar_file)
+        return cls([date.fromisoformat(day) for day in stored['holidays']],
+                   date.fromisoformat(stored['valid_through']) if stored.get('valid_through') else None,
+                   time.fromisoformat(stored['market_open']), time.fromisoformat(stored['market_close']))
+
+    def __contains__(self, day):
+        return self.is_trading_day(day)
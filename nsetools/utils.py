@@ -5,7 +5,8 @@ import re
 import sys
 import io
 import os
-import pandas as pd
+import json
+import warnings
 
 
 def byte_adaptor(fbuffer):
@@ -26,48 +27,299 @@ def byte_adaptor(fbuffer):
 
 def js_adaptor(buffer):
     """
-    convert javascript objects like true, none, NaN etc. to
-    quoted word.
+    Deprecated, NSE payloads are json: decode them with json.loads or parse_quote_payload instead.
+
+    convert javascript objects like true, false, null and NaN to
+    python literals, without touching the text inside strings.
 
     Arguments:
         buffer: string to be converted
 
     Returns:
-        string after conversion
+        string that ast.literal_eval can read
+    """
+    warnings.warn('js_adaptor is deprecated, decode the payload with json.loads or parse_quote_payload instead',
+                  DeprecationWarning, stacklevel=2)
+    try:
+        # NaN is kept as the string it used to be replaced with
+        return repr(json.loads(buffer, parse_constant=str))
+    except ValueError:
+        # Not json, e.g. keys without quotes: only the literals outside strings are replaced
+        return __JS_LITERAL__.sub(lambda match: match.group(1) or __JS_LITERALS__[match.group(2)], buffer)
+
+
+__JS_LITERALS__ = {'true': 'True', 'false': 'False', 'none': 'None', 'null': 'None', 'NaN': '"NaN"'}
+__JS_LITERAL__ = re.compile(r'("(?:[^"\\]|\\.)*"|\'(?:[^\'\\]|\\.)*\')|\b(true|false|none|null|NaN)\b')
+
+
+def clean_value(value):
+    """
+    Converts a string sent by NSE to its proper type:
+        '-'     -> None
+        '1,000' -> 1000.0
+    Any other value is returned as is.
+    """
+    if type(value) is not str:
+        return value
+    if value == '-':
+        return None
+    number = value.replace(',', '')
+    digits = number[1:] if number[:1] == '-' else number
+    # Same as matching ^[-]?[0-9,.]+$ but without a regex
+    if digits and digits.isascii() and digits.replace('.', '').isdigit():
+        try:
+            return float(number)
+        except ValueError:
+            pass
+    return value
+
+
+def clean_dict(resp_dict):
+    """
+    :returns: a new dict with every value passed through clean_value
+    """
+    return {str(key): clean_value(value) for key, value in resp_dict.items()}
+
+
+def clean_frame(records, cleaned=None):
     """
-    buffer = re.sub('true', 'True', buffer)
-    buffer = re.sub('false', 'False', buffer)
-    buffer = re.sub('none', 'None', buffer)
-    buffer = re.sub('NaN', '"NaN"', buffer)
-    return buffer
+    Cleans a whole batch of records into a frame. Every field goes through clean_value,
+    which for the tens of rows of a top list costs far less than a pass of pandas string methods per column:
+        '-'     -> null
+        '1,000' -> 1000.0
+    A column of numbers and nulls comes out as float.
+    Columns mixing numbers and text keep their text, with '-' as None.
+
+    Arguments:
+        records: list of dicts as sent by NSE
+        cleaned: (optional) the same records already passed through clean_dict
+
+    Returns:
+        pandas DataFrame with a column per key
+    """
+    import pandas as pd
+
+    if cleaned is None:
+        cleaned = [clean_dict(record) for record in records]
+    columns = {}
+    for key in dict.fromkeys(key for record in cleaned for key in record):
+        values = [record.get(key) for record in cleaned]
+        types = set(map(type, values))
+        if str in types and float in types:
+            # Numbers among text were not meant as numbers, so the raw values are kept
+            columns[key] = pd.Series([None if record.get(key) == '-' else record.get(key) for record in records],
+                                     dtype=object)
+        elif str in types and type(None) in types:
+            # Inferring a string dtype would turn None into NaN
+            columns[key] = pd.Series(values, dtype=object)
+        else:
+            columns[key] = values
+    return pd.DataFrame(columns, index=pd.RangeIndex(len(records)))
+
+
+# Cleans every object as soon as it is decoded, so that no second pass is needed
+__QUOTE_DECODER__ = json.JSONDecoder(object_hook=clean_dict)
+
+
+def parse_quote_payload(page):
+    """
+    Decodes the object held in the responseDiv of the GetQuote.jsp page in a single pass.
+    The decoder stops at the end of the object, so the rest of the page is never scanned.
+
+    Arguments:
+        page: html of the page
+
+    Returns:
+        dict of the payload, with '-' as None and numeric strings as floats
+
+    Raises:
+        ValueError if the page does not contain a valid payload
+    """
+    marker = page.find('id="responseDiv"')
+    if marker == -1:
+        raise ValueError('responseDiv not found')
+    start = page.find('{', page.find('>', marker))
+    if start == -1:
+        raise ValueError('No payload in responseDiv')
+    return __QUOTE_DECODER__.raw_decode(page, start)[0]
+
+
+def parse_peer_payload(page):
+    """
+    Decodes the list of companies in an ajaxPeerCompanies.jsp response.
+    The outer object is javascript (unquoted keys), but the list under data is valid json.
+
+    Arguments:
+        page: the response text
+
+    Returns:
+        list of dicts, one per company
+
+    Raises:
+        ValueError if the response has no data
+    """
+    marker = page.find('data:')
+    if marker == -1:
+        raise ValueError('No data in the response')
+    start = page.find('[', marker)
+    decoder = json.JSONDecoder()
+    try:
+        return decoder.raw_decode(page, start)[0]
+    except ValueError:
+        pass
+    # Some entry is broken. Decode the companies one by one, skipping the broken ones
+    records = []
+    index = page.find('{', marker)
+    while index != -1:
+        try:
+            record, end = decoder.raw_decode(page, index)
+        except ValueError:
+            index = page.find('{', index + 1)
+        else:
+            if isinstance(record, dict):
+                records.append(record)
+            index = page.find('{', end)
+    return records
+
+
+# Rows rendered at a time by save_file
+SAVE_CHUNK_SIZE = 100000
 
 def save_file(dataframe, extension, **options):
     """
-    Saves the dataframe to the specified location
+    Saves the dataframe to the specified location, rendering it a chunk of rows at a time
     :Parameters:
-        dataframe: Pandas DataFrame, the dataframe to store
-        extension: the extension to store it as. Can be one of csv, xl
-    :Returns: A represention in the form of the extension provided. If path is specified, then it is saved to the path with apt extension
+        dataframe: Pandas DataFrame, the dataframe to store. Anything with a to_frame method, such as a quotes.QuoteBatch, is accepted too.
+        extension: the extension to store it as. Can be one of csv, ndjson, json, html, tex, hdf, parquet or feather.
+        parquet and feather need pyarrow, hdf needs pytables.
+    :Options:
+        path, name: the directory and the name (without the extension) of the file to save to
+        stream: a file object to write to instead, binary for parquet and feather and text otherwise
+        append: (csv, ndjson, hdf) add the rows to the end of an existing file instead of replacing it,
+            e.g. a new day of history. The csv header is only written to a new file.
+        index: whether to write the index. Defaults to False for csv and tex, as before, and True otherwise.
+        chunk_size: the number of rows rendered at a time
+    :Returns: The path of the file if path and name are specified, the stream if one is, and otherwise
+        a represention in the form of the extension provided (bytes for parquet and feather)
     """
+    import pandas as pd
+
+    if not isinstance(dataframe, pd.DataFrame) and hasattr(dataframe, 'to_frame'):
+        dataframe = dataframe.to_frame()
+    extension = extension.upper()
+    if extension not in __SAVERS__:
+        raise ValueError('Cannot save as %s, use one of %s' % (extension.lower(), ', '.join(__SAVERS__).lower()))
+    binary, appendable, saver = __SAVERS__[extension]
+    append = options.get('append', False)
+    if append and not appendable:
+        raise ValueError('Cannot append to %s files' % extension.lower())
+    index = options.get('index', extension not in ('CSV', 'TEX'))
+    chunk_size = options.get('chunk_size', SAVE_CHUNK_SIZE)
+
     path = options.get('path')
     file_name = options.get('name')
+    stream = options.get('stream')
     if path and file_name:
-        file_name += '.' + extension
-        file_path = os.path.join(path, file_name)
-        saving_function = {
-            'CSV': pd.DataFrame.to_csv,
-            'HDF': pd.DataFrame.to_hdf,
-            'JSON': pd.DataFrame.to_json,
-            'FEATHER': pd.DataFrame.to_feather,
-            'HTML': pd.DataFrame.to_html,
-            'TEX': pd.DataFrame.to_latex
-        }
-        function_to_call = saving_function.get(extension.upper())
-        with open(file_path, 'w', encoding='utf8') as f:
-            if function_to_call:
-                if extension.upper() in ['CSV', 'TEX']:
-                    f.write(function_to_call(dataframe, index=False))
-                else:
-                    f.write(function_to_call(dataframe))
-    if function_to_call:
-        return function_to_call(dataframe)
\ No newline at end of file
+        file_path = os.path.join(path, file_name + '.' + extension.lower())
+        if extension == 'HDF':
+            # pytables opens the file itself
+            __save_hdf__(dataframe, file_path, index, chunk_size, append, file_name)
+            return file_path
+        header = not (append and os.path.exists(file_path) and os.path.getsize(file_path) > 0)
+        mode = ('a' if append else 'w') + ('b' if binary else '')
+        with open(file_path, mode, **({} if binary else {'encoding': 'utf8', 'newline': ''})) as f:
+            saver(dataframe, f, index, chunk_size, header)
+        return file_path
+    if extension == 'HDF':
+        raise ValueError('hdf files can only be saved to a path')
+    if stream is not None:
+        saver(dataframe, stream, index, chunk_size, not append)
+        return stream
+    buffer = io.BytesIO() if binary else io.StringIO()
+    saver(dataframe, buffer, index, chunk_size, True)
+    return buffer.getvalue()
+
+
+def __chunks__(dataframe, chunk_size):
+    for start in range(0, max(len(dataframe), 1), chunk_size):
+        yield dataframe.iloc[start:start + chunk_size]
+
+
+def __save_csv__(dataframe, f, index, chunk_size, header):
+    for chunk in __chunks__(dataframe, chunk_size):
+        chunk.to_csv(f, index=index, header=header)
+        header = False
+
+
+def __save_ndjson__(dataframe, f, index, chunk_size, header):
+    for chunk in __chunks__(dataframe, chunk_size):
+        if chunk.empty:
+            continue
+        if index:
+            chunk = chunk.reset_index()
+        f.write(chunk.to_json(orient='records', lines=True, date_format='iso').rstrip('\n') + '\n')
+
+
+def __save_json__(dataframe, f, index, chunk_size, header):
+    dataframe.to_json(f)
+
+
+def __save_html__(dataframe, f, index, chunk_size, header):
+    dataframe.to_html(f, index=index)
+
+
+def __save_tex__(dataframe, f, index, chunk_size, header):
+    dataframe.to_latex(f, index=index)
+
+
+def __save_hdf__(dataframe, file_path, index, chunk_size, append, key):
+    # The table format can be appended to
+    for chunk in __chunks__(dataframe, chunk_size):
+        chunk.to_hdf(file_path, key=key, format='table', append=append)
+        append = True
+
+
+def __arrow_tables__(dataframe, index, chunk_size):
+    import pyarrow as pa
+
+    schema = None
+    for chunk in __chunks__(dataframe, chunk_size):
+        # Every chunk is cast to the schema of the first, so that a column left empty in a chunk keeps its type
+        table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=index)
+        schema = table.schema
+        yield table
+
+
+def __save_parquet__(dataframe, f, index, chunk_size, header):
+    import pyarrow.parquet as pq
+
+    writer = None
+    for table in __arrow_tables__(dataframe, index, chunk_size):
+        # Every chunk becomes a row group
+        writer = writer or pq.ParquetWriter(f, table.schema)
+        writer.write_table(table)
+    writer.close()
+
+
+def __save_feather__(dataframe, f, index, chunk_size, header):
+    import pyarrow as pa
+
+    writer = None
+    for table in __arrow_tables__(dataframe, index, chunk_size):
+        # Every chunk becomes a record batch of the Arrow IPC file
+        writer = writer or pa.ipc.new_file(f, table.schema)
+        writer.write_table(table)
+    writer.close()
+
+
+# extension -> (whether the file is binary, whether it can be appended to, function saving it)
+__SAVERS__ = {
+    'CSV': (False, True, __save_csv__),
+    'NDJSON': (False, True, __save_ndjson__),
+    'JSON': (False, False, __save_json__),
+    'HTML': (False, False, __save_html__),
+    'TEX': (False, False, __save_tex__),
+    'HDF': (True, True, None),
+    'PARQUET': (True, False, __save_parquet__),
+    'FEATHER': (True, False, __save_feather__)
+}